@@ -1,7 +1,19 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from app.api.vehicle import PREDEFINED_VEHICLES
+from app.db.persistence import db
+from app.services.circuit_breaker import get_circuit_stats
+from app.services.rate_limiter import get_rate_limiter
+from .rollups import combine, load_rollups, ratio, record_route, utc_naive
+
+# Range dashboards cover when no dates are given
+DEFAULT_WINDOW = timedelta(days=30)
+
+# CO2 a mature tree absorbs in a year
+TREE_CO2_GRAMS_PER_YEAR = 21_000
 
 router = APIRouter(
     prefix="/api/metrics",
@@ -14,14 +26,17 @@ class RouteMetrics(BaseModel):
     vehicle_type: str
     start_time: datetime
     end_time: Optional[datetime]
-    distance: float
-    duration: float
-    fuel_consumption: float
-    emissions: float
+    distance: float  # km
+    duration: float  # minutes
+    fuel_consumption: float  # liters
+    emissions: float  # g CO2
     efficiency_score: float
-    weather_conditions: Dict[str, str]
-    traffic_conditions: Dict[str, str]
-    air_quality_data: Dict[str, int]
+    weather_conditions: Dict[str, str]  # e.g. {"condition": "rain"}
+    traffic_conditions: Dict[str, str]  # e.g. {"level": "heavy"}
+    air_quality_data: Dict[str, int]  # e.g. {"aqi": 42}
+    # Emissions and fuel of the conventional (fastest) route, for savings
+    baseline_emissions: Optional[float] = None
+    baseline_fuel: Optional[float] = None
 
 class AggregateMetrics(BaseModel):
     total_routes: int
@@ -34,11 +49,42 @@ class AggregateMetrics(BaseModel):
     peak_hours: List[int]
     green_zones_impact: Dict[str, float]
 
+def _window(start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """The requested range as naive UTC datetimes, defaulting to the last ``DEFAULT_WINDOW``."""
+    end = utc_naive(end_date) if end_date else datetime.utcnow()
+    start = utc_naive(start_date) if start_date else end - DEFAULT_WINDOW
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    return start, end
+
+def _speed(totals: Dict[str, Any]) -> float:
+    """Average speed in km/h."""
+    return ratio(totals.get("distance", 0.0), totals.get("duration", 0.0) / 60)
+
+def _busiest_hours(total: Dict[str, Any], count: int = 3) -> List[int]:
+    hours = total.get("by_hour", {})
+    return [int(hour) for hour in sorted(hours, key=lambda hour: hours[hour]["routes"], reverse=True)[:count]]
+
+@router.post("/route")
+async def record_route_metrics(metrics: RouteMetrics) -> Dict:
+    """
+    Record a completed route and add it to the hourly and daily rollups
+    the dashboard endpoints read.
+    """
+    try:
+        await db["route_metrics"].insert_one(metrics.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Route metrics already recorded")
+    await record_route(db, metrics)
+    return {"route_id": metrics.route_id, "status": "recorded"}
+
 @router.get("/route/{route_id}")
 async def get_route_metrics(route_id: str) -> RouteMetrics:
     """Get metrics for a specific route."""
-    # This would typically fetch from the database
-    raise HTTPException(status_code=404, detail="Route not found")
+    document = await db["route_metrics"].find_one({"route_id": route_id}, {"_id": 0})
+    if document is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return RouteMetrics(**document)
 
 @router.get("/aggregate")
 async def get_aggregate_metrics(
@@ -50,57 +96,154 @@ async def get_aggregate_metrics(
     Get aggregate metrics for all routes.
     Can be filtered by date range and vehicle type.
     """
+    documents = await load_rollups(db, *_window(start_date, end_date), vehicle_type)
+    total, by_vehicle = combine(documents)
+    routes = total.get("routes", 0)
     return AggregateMetrics(
-        total_routes=0,
-        total_distance=0.0,
-        total_emissions=0.0,
-        average_efficiency=0.0,
-        emissions_saved=0.0,
-        fuel_saved=0.0,
-        vehicle_utilization={},
-        peak_hours=[],
-        green_zones_impact={}
+        total_routes=int(routes),
+        total_distance=total.get("distance", 0.0),
+        total_emissions=total.get("emissions", 0.0),
+        average_efficiency=ratio(total.get("efficiency_sum", 0.0), routes),
+        emissions_saved=total.get("emissions_saved", 0.0),
+        fuel_saved=total.get("fuel_saved", 0.0),
+        # Share of total driving time per vehicle type
+        vehicle_utilization={
+            name: ratio(totals.get("duration", 0.0), total.get("duration", 0.0))
+            for name, totals in by_vehicle.items()
+        },
+        peak_hours=_busiest_hours(total),
+        # Emissions by air quality band of the areas driven through
+        green_zones_impact={
+            band: totals.get("emissions", 0.0) for band, totals in total.get("by_aqi", {}).items()
+        }
     )
 
 @router.get("/environmental-impact")
-async def get_environmental_impact() -> Dict:
+async def get_environmental_impact(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
     """Get environmental impact metrics."""
+    total, _ = combine(await load_rollups(db, *_window(start_date, end_date)))
+    reduced = total.get("emissions_saved", 0.0)
+    by_aqi = total.get("by_aqi", {})
     return {
-        "total_emissions_reduced": 0.0,
-        "trees_equivalent": 0,
-        "fuel_saved": 0.0,
-        "green_zones_preserved": [],
-        "air_quality_improvement": 0.0
+        "total_emissions_reduced": reduced,
+        "trees_equivalent": int(max(reduced, 0.0) // TREE_CO2_GRAMS_PER_YEAR),
+        "fuel_saved": total.get("fuel_saved", 0.0),
+        "green_zones_preserved": [],  # no zone boundaries are recorded with routes
+        # Share of routes driven through areas with good air quality
+        "air_quality_improvement": ratio(by_aqi.get("good", {}).get("routes", 0), total.get("routes", 0))
     }
 
 @router.get("/vehicle-performance")
-async def get_vehicle_performance(vehicle_type: Optional[str] = None) -> Dict:
+async def get_vehicle_performance(
+    vehicle_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
     """Get performance metrics for vehicles."""
+    documents = await load_rollups(db, *_window(start_date, end_date), vehicle_type)
+    total, by_vehicle = combine(documents)
+    trends: Dict[str, List[Dict[str, Any]]] = {}
+    for document in sorted(documents, key=lambda document: document["bucket"]):
+        trends.setdefault(document["vehicle_type"], []).append({
+            "period": document["bucket"],
+            "km_per_liter": ratio(document.get("distance", 0.0), document.get("fuel_consumption", 0.0))
+        })
     return {
-        "efficiency_scores": {},
-        "maintenance_status": {},
-        "emissions_by_vehicle": {},
-        "utilization_rates": {},
-        "fuel_efficiency_trends": {}
+        "efficiency_scores": {
+            name: ratio(totals.get("efficiency_sum", 0.0), totals.get("routes", 0))
+            for name, totals in by_vehicle.items()
+        },
+        "maintenance_status": {
+            name: PREDEFINED_VEHICLES[name].maintenance_status
+            for name in by_vehicle if name in PREDEFINED_VEHICLES
+        },
+        "emissions_by_vehicle": {name: totals.get("emissions", 0.0) for name, totals in by_vehicle.items()},
+        "utilization_rates": {
+            name: ratio(totals.get("duration", 0.0), total.get("duration", 0.0))
+            for name, totals in by_vehicle.items()
+        },
+        "fuel_efficiency_trends": trends
     }
 
 @router.get("/traffic-patterns")
-async def get_traffic_patterns() -> Dict:
+async def get_traffic_patterns(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
     """Get traffic pattern analysis."""
+    total, by_vehicle = combine(await load_rollups(db, *_window(start_date, end_date)))
+    overall_speed = _speed(total)
+
+    def fastest_hour(totals: Dict[str, Any]) -> Optional[int]:
+        hours = totals.get("by_hour", {})
+        return int(max(hours, key=lambda hour: _speed(hours[hour]))) if hours else None
+
+    by_traffic = total.get("by_traffic", {})
     return {
-        "peak_hours": [],
-        "congestion_zones": [],
-        "average_speeds": {},
-        "delay_hotspots": [],
-        "optimal_departure_times": {}
+        "peak_hours": _busiest_hours(total),
+        # Congested traffic levels seen, most frequent first
+        "congestion_zones": sorted(
+            (level for level in by_traffic if level in ("moderate", "heavy")),
+            key=lambda level: by_traffic[level]["routes"],
+            reverse=True
+        ),
+        "average_speeds": {level: _speed(totals) for level, totals in by_traffic.items()},
+        # Hours of day whose routes run most below the average speed
+        "delay_hotspots": [
+            int(hour) for hour, totals in sorted(total.get("by_hour", {}).items(), key=lambda item: _speed(item[1]))
+            if _speed(totals) < overall_speed
+        ][:3],
+        "optimal_departure_times": {
+            "all": fastest_hour(total),
+            **{name: fastest_hour(totals) for name, totals in by_vehicle.items()}
+        }
     }
 
 @router.get("/weather-impact")
-async def get_weather_impact() -> Dict:
+async def get_weather_impact(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
     """Get analysis of weather impact on routes."""
+    documents = await load_rollups(db, *_window(start_date, end_date))
+    total, _ = combine(documents)
+    minutes_per_km = ratio(total.get("duration", 0.0), total.get("distance", 0.0))
+    average_efficiency = ratio(total.get("efficiency_sum", 0.0), total.get("routes", 0))
+    seasons: Dict[str, Dict[str, float]] = {}
+    for document in documents:
+        season = seasons.setdefault(document["bucket"].strftime("%Y-%m"), {"routes": 0, "efficiency_sum": 0.0})
+        season["routes"] += document.get("routes", 0)
+        season["efficiency_sum"] += document.get("efficiency_sum", 0.0)
+
+    by_weather = total.get("by_weather", {})
     return {
-        "weather_delays": {},
-        "seasonal_patterns": {},
-        "route_adjustments": {},
-        "efficiency_impact": {}
+        # Extra travel time per km relative to all routes, as a share
+        "weather_delays": {
+            condition: ratio(ratio(totals.get("duration", 0.0), totals.get("distance", 0.0)), minutes_per_km) - 1
+            for condition, totals in by_weather.items() if minutes_per_km
+        },
+        "seasonal_patterns": {
+            month: {"routes": season["routes"], "average_efficiency": ratio(season["efficiency_sum"], season["routes"])}
+            for month, season in sorted(seasons.items())
+        },
+        # Routes run in each condition
+        "route_adjustments": {condition: totals.get("routes", 0) for condition, totals in by_weather.items()},
+        "efficiency_impact": {
+            condition: ratio(totals.get("efficiency_sum", 0.0), totals.get("routes", 0)) - average_efficiency
+            for condition, totals in by_weather.items()
+        }
     }
+
+@router.get("/upstream-budget")
+async def get_upstream_budget() -> Dict:
+    """Get request budget remaining and queued requests per upstream provider."""
+    limiter = get_rate_limiter()
+    return {"providers": limiter.get_stats() if limiter is not None else {}}
+
+@router.get("/upstream-circuits")
+async def get_upstream_circuits() -> Dict:
+    """Get circuit breaker state and failure counts per upstream provider."""
+    return {"providers": get_circuit_stats()}
@@ -0,0 +1,123 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import asyncio
+
+# One document per bucket and vehicle type in each collection
+ROLLUP_COLLECTIONS = {
+    "hour": "metrics_rollups_hourly",
+    "day": "metrics_rollups_daily"
+}
+
+# Ranges up to this long are read from hourly buckets, longer ones from daily
+HOURLY_MAX_RANGE = timedelta(days=2)
+
+def utc_naive(timestamp: datetime) -> datetime:
+    """``timestamp`` as a naive UTC datetime, the form buckets are stored in."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+def bucket_start(timestamp: datetime, period: str) -> datetime:
+    """Start of the hour or day (UTC) containing ``timestamp``."""
+    timestamp = utc_naive(timestamp)
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _field(value: Any) -> str:
+    """A label usable as a Mongo field name."""
+    return str(value or "unknown").strip().lower().replace(".", "_").replace("$", "_") or "unknown"
+
+def aqi_band(aqi: Optional[int]) -> str:
+    if aqi is None:
+        return "unknown"
+    if aqi <= 50:
+        return "good"
+    if aqi <= 100:
+        return "moderate"
+    return "unhealthy"
+
+def rollup_increments(metrics) -> Dict[str, float]:
+    """``$inc`` document for one completed route (a ``RouteMetrics``)."""
+    hour = utc_naive(metrics.end_time or metrics.start_time).hour
+    weather = _field(metrics.weather_conditions.get("condition"))
+    traffic = _field(metrics.traffic_conditions.get("level"))
+    aqi = aqi_band(metrics.air_quality_data.get("aqi"))
+    increments = {
+        "routes": 1,
+        "distance": metrics.distance,
+        "duration": metrics.duration,
+        "fuel_consumption": metrics.fuel_consumption,
+        "emissions": metrics.emissions,
+        "efficiency_sum": metrics.efficiency_score,
+        f"by_hour.{hour}.routes": 1,
+        f"by_hour.{hour}.distance": metrics.distance,
+        f"by_hour.{hour}.duration": metrics.duration,
+        f"by_weather.{weather}.routes": 1,
+        f"by_weather.{weather}.distance": metrics.distance,
+        f"by_weather.{weather}.duration": metrics.duration,
+        f"by_weather.{weather}.efficiency_sum": metrics.efficiency_score,
+        f"by_traffic.{traffic}.routes": 1,
+        f"by_traffic.{traffic}.distance": metrics.distance,
+        f"by_traffic.{traffic}.duration": metrics.duration,
+        f"by_aqi.{aqi}.routes": 1,
+        f"by_aqi.{aqi}.emissions": metrics.emissions
+    }
+    if metrics.baseline_emissions is not None:
+        increments["emissions_saved"] = metrics.baseline_emissions - metrics.emissions
+    if metrics.baseline_fuel is not None:
+        increments["fuel_saved"] = metrics.baseline_fuel - metrics.fuel_consumption
+    return increments
+
+async def record_route(db, metrics):
+    """Add a completed route to its hourly and daily buckets with ``$inc`` upserts."""
+    timestamp = metrics.end_time or metrics.start_time
+    increments = rollup_increments(metrics)
+    await asyncio.gather(*[
+        db[collection].update_one(
+            {"bucket": bucket_start(timestamp, period), "vehicle_type": metrics.vehicle_type},
+            {"$inc": increments},
+            upsert=True
+        )
+        for period, collection in ROLLUP_COLLECTIONS.items()
+    ])
+
+async def create_rollup_indexes(db):
+    for collection in ROLLUP_COLLECTIONS.values():
+        await db[collection].create_index([("bucket", 1), ("vehicle_type", 1)], unique=True)
+
+async def load_rollups(
+    db,
+    start: datetime,
+    end: datetime,
+    vehicle_type: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Buckets overlapping ``[start, end)``: hourly for short ranges, daily
+    otherwise (whole days, so the ends of the range are rounded out).
+    """
+    period = "hour" if end - start <= HOURLY_MAX_RANGE else "day"
+    query: Dict[str, Any] = {"bucket": {"$gte": bucket_start(start, period), "$lt": end}}
+    if vehicle_type:
+        query["vehicle_type"] = vehicle_type
+    return await db[ROLLUP_COLLECTIONS[period]].find(query, {"_id": 0}).to_list(None)
+
+def _add(total: Dict[str, Any], document: Dict[str, Any]):
+    for name, value in document.items():
+        if isinstance(value, dict):
+            _add(total.setdefault(name, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[name] = total.get(name, 0) + value
+
+def combine(documents: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Totals over all buckets, and per vehicle type."""
+    total: Dict[str, Any] = {}
+    by_vehicle: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    for document in documents:
+        _add(total, document)
+        _add(by_vehicle[document.get("vehicle_type", "unknown")], document)
+    return total, dict(by_vehicle)
+
+def ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
@@ -3,6 +3,8 @@ from datetime import datetime
 from typing import Dict, Any
 from security.auth import verify_api_key
 from monitoring.metrics_collector import MetricsCollector
+from app.core.settings import settings
+from app.db.persistence import TOP_N_MONGODB_VERSION, db, server_version
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 metrics_collector = MetricsCollector()
@@ -22,28 +24,46 @@ async def get_errors(
     end_time: datetime,
     _: str = Depends(verify_api_key)
 ) -> Dict[str, Any]:
-    """Get error metrics for a specific time period."""
-    pipeline = [
-        {
-            "$match": {
-                "timestamp": {"$gte": start_time, "$lte": end_time}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$status_code",
-                "count": {"$sum": 1},
-                "errors": {
-                    "$push": {
-                        "message": "$error_message",
-                        "timestamp": "$timestamp"
+    """
+    Get error counts per status code for a specific time period, each with
+    its most recent messages (at most ``ERROR_SAMPLES_PER_STATUS``), so the
+    response and the group stage stay bounded however many errors occurred.
+    ``$topN`` needs MongoDB 5.2; older servers collect every message per
+    status code and cut the list afterwards.
+    """
+    match = {
+        "$match": {
+            "timestamp": {"$gte": start_time, "$lte": end_time}
+        }
+    }
+    sample = {"message": "$error_message", "timestamp": "$timestamp"}
+    if await server_version() >= TOP_N_MONGODB_VERSION:
+        pipeline = [
+            match,
+            {
+                "$group": {
+                    "_id": "$status_code",
+                    "count": {"$sum": 1},
+                    "errors": {
+                        "$topN": {
+                            "n": settings.ERROR_SAMPLES_PER_STATUS,
+                            "sortBy": {"timestamp": -1},
+                            "output": sample
+                        }
                     }
                 }
             }
-        }
-    ]
+        ]
+    else:
+        pipeline = [
+            match,
+            {"$sort": {"timestamp": -1}},
+            {"$group": {"_id": "$status_code", "count": {"$sum": 1}, "errors": {"$push": sample}}},
+            {"$project": {"count": 1, "errors": {"$slice": ["$errors", settings.ERROR_SAMPLES_PER_STATUS]}}}
+        ]
+    pipeline.append({"$sort": {"_id": 1}})
     
-    results = await metrics_collector.db.errors.aggregate(pipeline).to_list(None)
+    results = await db.errors.aggregate(pipeline).to_list(None)
     return {
         "errors": results,
         "period": {
@@ -1,8 +1,29 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from pydantic import BaseModel
-from app.utils.error_handling.exceptions import ValidationError
+import asyncio
+import json
+import numpy as np
+from app.utils.error_handling.exceptions import FedExGreenRouterError, ValidationError
 from app.db.persistence import db
+from app.api.vehicle import PREDEFINED_VEHICLES, estimate_emissions
+from app.core.location import Location
+from app.core.settings import settings
+from app.services.collectors import collect_all
+from app.services.emissions_calculator import EmissionsCalculator
+from app.services.rate_limiter import Priority
+from app.services.user_preferences import PreferenceHandler, UserPreferences
+from app.utils.telemetry import get_metrics_registry
+from .contraction import ContractionHierarchy, get_contraction_hierarchy
+from .costs import CRITERIA, edge_criteria, edge_emissions
+from .fleet import plan_fleet_in_pool
+from .graph import RoadGraph, get_road_graph
+from .matrix import MATRIX_STREAM_THRESHOLD, TravelMatrix, emissions_matrices
+from .pareto import ParetoRoute, pareto_routes, rank_routes
+from .search import ShortestPath, route_through, snap_to_graph
+from .traffic import EdgeTraffic, get_edge_traffic
 
 router = APIRouter(
     prefix="/api/routes",
@@ -22,6 +43,7 @@ class RouteRequest(BaseModel):
     cargo_weight: float
     departure_time: Optional[str] = None
     avoid_zones: Optional[List[str]] = None
+    user_id: Optional[str] = None  # enables preference-ranked alternatives
 
 class RouteSegment(BaseModel):
     distance: float  # km
@@ -32,6 +54,7 @@ class RouteSegment(BaseModel):
     traffic_level: str
     weather_condition: str
     air_quality_index: int
+    emissions: Optional[float] = None  # g CO2
 
 class OptimizedRoute(BaseModel):
     total_distance: float  # km
@@ -42,6 +65,222 @@ class OptimizedRoute(BaseModel):
     segments: List[RouteSegment]
     alternative_routes: Optional[List[Dict]] = None
 
+def traffic_level(congestion: float) -> str:
+    """Traffic label for a congestion share, on the bands EmissionsCalculator uses."""
+    if congestion > 0.8:
+        return "heavy"
+    if congestion > 0.5:
+        return "moderate"
+    if congestion > 0.2:
+        return "light"
+    return "free_flow"
+
+def weather_condition(weather: Optional[Dict[str, Any]]) -> str:
+    """Condition label for collected weather (an OpenWeather response or the collector default)."""
+    if not weather:
+        return "clear"
+    if weather.get("weather"):
+        return str(weather["weather"][0].get("main", "clear")).lower()
+    if weather.get("snow"):
+        return "snow"
+    if weather.get("rain") or weather.get("precipitation"):
+        return "rain"
+    return "clear"
+
+def air_quality_index(air_quality: Optional[Dict[str, Any]]) -> int:
+    """AQI of collected air quality data; AQICN reports "-" when a station has none."""
+    try:
+        return int(((air_quality or {}).get("data") or {}).get("aqi", 50))
+    except (TypeError, ValueError):
+        return 50
+
+async def route_environment(route_request: RouteRequest) -> List[Dict[str, Any]]:
+    """
+    Traffic, weather and air quality at the origin and the destination.
+    Collectors answer from the cache the prefetch scheduler keeps warm and
+    only go upstream (at optimize priority) on a miss.
+    """
+    return await asyncio.gather(*[
+        collect_all(Location(lat=point.lat, lon=point.lon), priority=Priority.OPTIMIZE)
+        for point in (route_request.origin, route_request.destination)
+    ])
+
+def live_traffic(graph: RoadGraph) -> Optional[EdgeTraffic]:
+    """Live edge traffic for the graph when routing on it is enabled and readings are fresh."""
+    if not settings.LIVE_TRAFFIC_ROUTING:
+        return None
+    traffic = get_edge_traffic()
+    if traffic.graph is not graph or not traffic.has_live_data():
+        return None
+    return traffic
+
+def fastest_path(
+    graph: RoadGraph,
+    points: List[Tuple[float, float]],
+    traffic: Optional[EdgeTraffic] = None
+) -> Optional[ShortestPath]:
+    """
+    Fastest path through ``(lat, lon)`` points, at live speeds when given
+    traffic. The free-flow path from the contraction hierarchy is kept
+    when its live travel time is within ``LIVE_TRAFFIC_CH_TOLERANCE`` of
+    its free-flow time: live durations are never below free flow, so the
+    free-flow time bounds the live optimum from below and the path is
+    within that tolerance of it. Otherwise the legs are searched again on
+    the live durations.
+    """
+    hierarchy = get_contraction_hierarchy()
+    if traffic is None or hierarchy is None or hierarchy.weight != "duration":
+        return route_through(
+            graph, points, weight="duration" if traffic is None else traffic.live_durations(), hierarchy=hierarchy
+        )
+    
+    path = route_through(graph, points, weight="duration", hierarchy=hierarchy)
+    if path is None:
+        return None
+    durations = traffic.live_durations()
+    live_cost = float(durations[np.asarray(path.edges, dtype=np.int64)].sum())
+    if live_cost <= path.cost * (1 + settings.LIVE_TRAFFIC_CH_TOLERANCE):
+        return ShortestPath(live_cost, path.nodes, path.edges)
+    return route_through(graph, points, weight=durations)
+
+def build_segments(
+    graph: RoadGraph,
+    path: Union[ShortestPath, ParetoRoute],
+    traffic: Optional[EdgeTraffic] = None,
+    route_request: Optional[RouteRequest] = None,
+    environment: Optional[List[Dict[str, Any]]] = None
+) -> List[RouteSegment]:
+    """
+    Turn the edges of a graph path into route segments, at live speeds when
+    given traffic. With a request for a known vehicle type each segment
+    carries its emissions at that speed (see ``costs.edge_emissions``).
+    ``environment`` (see ``route_environment``) labels each segment with
+    the conditions at the nearer end of the route, and its traffic when
+    there is no live edge traffic.
+    """
+    durations = graph.durations if traffic is None else traffic.live_durations()
+    congestion = None if traffic is None else traffic.congestion()
+    emissions = [None] * len(path.edges)
+    if route_request is not None and route_request.vehicle_type in PREDEFINED_VEHICLES:
+        emissions = edge_emissions(
+            graph,
+            PREDEFINED_VEHICLES[route_request.vehicle_type],
+            route_request.cargo_weight,
+            durations,
+            np.asarray(path.edges, dtype=np.int64)
+        ).tolist()
+    conditions = [
+        (
+            weather_condition(data.get("weather")),
+            air_quality_index(data.get("air_quality")),
+            traffic_level(float((data.get("traffic") or {}).get("congestion_level", 0)) / 100)
+        )
+        for data in environment or ()
+    ] or [("clear", 50, "free_flow")]
+    ends = [path.nodes[0], path.nodes[-1]] if path.nodes else []
+    
+    segments = []
+    for u, v, edge, segment_emissions in zip(path.nodes, path.nodes[1:], path.edges, emissions):
+        nearest = 0
+        if len(conditions) > 1:
+            distances = [(graph.lat[u] - graph.lat[end]) ** 2 + (graph.lon[u] - graph.lon[end]) ** 2 for end in ends]
+            nearest = int(np.argmin(distances))
+        weather, aqi, point_traffic = conditions[nearest]
+        segments.append(RouteSegment(
+            distance=float(graph.distances[edge]) / 1000,
+            duration=float(durations[edge]) / 60,
+            start_point=RoutePoint(lat=float(graph.lat[u]), lon=float(graph.lon[u])),
+            end_point=RoutePoint(lat=float(graph.lat[v]), lon=float(graph.lon[v])),
+            gradient=float(graph.gradients[edge]),
+            traffic_level=point_traffic if congestion is None else traffic_level(float(congestion[edge])),
+            weather_condition=weather,
+            air_quality_index=aqi,
+            emissions=segment_emissions
+        ))
+    return segments
+
+async def summarize_route(
+    graph: RoadGraph,
+    path: Union[ShortestPath, ParetoRoute],
+    route_request: RouteRequest,
+    traffic: Optional[EdgeTraffic] = None,
+    environment: Optional[List[Dict[str, Any]]] = None
+) -> OptimizedRoute:
+    """
+    Build the response model for a path. Total emissions are the sum of the
+    per-segment curve emissions; fuel and the efficiency score come from
+    the emissions estimate.
+    """
+    segments = build_segments(graph, path, traffic, route_request, environment)
+    total_distance = sum(segment.distance for segment in segments)
+    total_duration = sum(segment.duration for segment in segments)
+    average_gradient = (
+        sum(abs(segment.gradient) * segment.distance for segment in segments) / total_distance
+        if total_distance > 0 else 0.0
+    )
+    
+    estimate = await estimate_emissions(
+        vehicle_type=route_request.vehicle_type,
+        distance=total_distance,
+        cargo_weight=route_request.cargo_weight,
+        route_gradient=average_gradient
+    )
+    
+    return OptimizedRoute(
+        total_distance=total_distance,
+        total_duration=total_duration,
+        total_emissions=sum(segment.emissions for segment in segments),
+        fuel_consumption=estimate.fuel_consumption,
+        efficiency_score=estimate.route_efficiency_score,
+        segments=segments,
+        alternative_routes=[]
+    )
+
+async def get_user_preferences(user_id: str) -> UserPreferences:
+    """Stored preferences for a user, or the defaults if none were saved."""
+    stored = await db["user_preferences"].find_one({"user_id": user_id})
+    return UserPreferences(**stored) if stored else UserPreferences(user_id=user_id)
+
+def preferred_routes(
+    graph: RoadGraph,
+    route_request: RouteRequest,
+    preferences: UserPreferences,
+    traffic: Optional[EdgeTraffic] = None
+) -> List[ParetoRoute]:
+    """
+    Pareto frontier over time, emissions and cost from a single
+    multi-criteria search, ranked by the user's routing weight factors and
+    cut to ``max_route_options``.
+    """
+    if route_request.vehicle_type not in PREDEFINED_VEHICLES:
+        raise HTTPException(status_code=404, detail="Vehicle type not found")
+    
+    criteria = edge_criteria(
+        graph,
+        PREDEFINED_VEHICLES[route_request.vehicle_type],
+        route_request.cargo_weight,
+        None if traffic is None else traffic.live_durations()
+    )
+    routes = pareto_routes(
+        graph,
+        snap_to_graph(graph, route_request.origin.lat, route_request.origin.lon),
+        snap_to_graph(graph, route_request.destination.lat, route_request.destination.lon),
+        criteria,
+        dominance=[CRITERIA.index(name) for name in ("time", "emissions", "cost")]
+    )
+    
+    # Honour the emissions cap (kg CO2) when at least one route meets it
+    if preferences.max_emissions_threshold is not None:
+        emissions = CRITERIA.index("emissions")
+        within = [
+            route for route in routes
+            if route.totals[emissions] / 1000 <= preferences.max_emissions_threshold
+        ]
+        routes = within or routes
+    
+    factors = PreferenceHandler.get_routing_factors(preferences)
+    return rank_routes(routes, CRITERIA, factors["weight_factors"], preferences.max_route_options)
+
 @router.post("/optimize")
 async def optimize_route(route_request: RouteRequest) -> OptimizedRoute:
     """
@@ -51,39 +290,258 @@ async def optimize_route(route_request: RouteRequest) -> OptimizedRoute:
     - Weather conditions
     - Air quality
     - Green zones
+    
+    Without a ``user_id`` the fastest path is returned. With one, the
+    user's preferences rank a Pareto set of routes and the runners-up are
+    returned as ``alternative_routes``. Travel times use live edge speeds
+    when fresh traffic readings are loaded; the fastest path comes from the
+    contraction hierarchy unless live traffic slows it by more than
+    ``LIVE_TRAFFIC_CH_TOLERANCE`` (see ``fastest_path``). Conditions at
+    both ends are collected while the route is searched.
     """
+    telemetry = get_metrics_registry()
+    environment = asyncio.ensure_future(route_environment(route_request))
     try:
-        # Placeholder for route optimization logic
-        # In a real implementation, this would:
-        # 1. Call TomTom/Google Maps API for route options
-        # 2. Get weather data from weather API
-        # 3. Get air quality data from AQICN
-        # 4. Calculate emissions using vehicle data
-        # 5. Optimize considering all factors
+        graph = get_road_graph()
+        traffic = live_traffic(graph)
+        if route_request.user_id:
+            with telemetry.time_stage("user_preferences"):
+                preferences = await get_user_preferences(route_request.user_id)
+            with telemetry.time_stage("route_search"):
+                # Thousands of Python-level labels: keep them off the event loop
+                paths = await run_in_threadpool(preferred_routes, graph, route_request, preferences, traffic)
+        else:
+            with telemetry.time_stage("route_search"):
+                path = fastest_path(
+                    graph,
+                    [
+                        (route_request.origin.lat, route_request.origin.lon),
+                        (route_request.destination.lat, route_request.destination.lon)
+                    ],
+                    traffic
+                )
+            paths = [path] if path is not None else []
         
-        sample_segment = RouteSegment(
-            distance=10.0,
-            duration=15.0,
-            start_point=route_request.origin,
-            end_point=route_request.destination,
-            gradient=0.0,
-            traffic_level="moderate",
-            weather_condition="clear",
-            air_quality_index=50
-        )
+        if not paths:
+            raise ValidationError("No route found between origin and destination")
         
-        return OptimizedRoute(
-            total_distance=10.0,
-            total_duration=15.0,
-            total_emissions=2000.0,
-            fuel_consumption=1.5,
-            efficiency_score=85.0,
-            segments=[sample_segment],
-            alternative_routes=[]
-        )
+        with telemetry.time_stage("environment"):
+            conditions = await environment
         
+        with telemetry.time_stage("route_summary"):
+            optimized = await summarize_route(graph, paths[0], route_request, traffic, conditions)
+            for path in paths[1:]:
+                alternative = await summarize_route(graph, path, route_request, traffic, conditions)
+                optimized.alternative_routes.append(
+                    alternative.dict(exclude={"segments", "alternative_routes"})
+                )
+        return optimized
+        
+    except (HTTPException, ValidationError):
+        raise
+    except FileNotFoundError as e:
+        raise FedExGreenRouterError(str(e))
     except Exception as e:
         raise ValidationError(str(e))
+    finally:
+        environment.cancel()
+
+class FleetStop(BaseModel):
+    id: str
+    location: RoutePoint
+    demand: float = 0.0  # kg
+    earliest_arrival: float = 0.0  # minutes after the plan starts
+    latest_arrival: float = 24 * 60  # minutes after the plan starts
+    service_time: float = 0.0  # minutes
+
+class FleetPlanRequest(BaseModel):
+    depot: RoutePoint
+    stops: List[FleetStop]
+    vehicle_ids: Optional[List[str]] = None  # defaults to every vehicle in the fleet
+    horizon: float = 24 * 60  # minutes
+    time_limit_seconds: Optional[int] = None
+
+class FleetVehicleRoute(BaseModel):
+    vehicle_id: str
+    stop_ids: List[str]
+    arrival_times: List[float]  # minutes after the plan starts
+    total_distance: float  # km
+    total_duration: float  # minutes
+    total_emissions: float  # g CO2
+    load: float  # kg
+
+class FleetPlan(BaseModel):
+    status: str
+    routes: List[FleetVehicleRoute]
+    unassigned_stop_ids: List[str]
+    total_distance: float  # km
+    total_emissions: float  # g CO2
+
+def _fleet_vehicle(vehicle: Dict, emission_factors: Dict[str, float]) -> Tuple[float, float]:
+    """
+    Capacity (kg) and emission factor (g CO2/km) of a ``vehicles`` document.
+    Documents follow either the ``Vehicle`` model (``max_load``,
+    ``vehicle_type``, ``emissions_factor``) or the migration schema
+    (``cargo_capacity``, ``type``).
+    """
+    capacity = vehicle.get("cargo_capacity", vehicle.get("max_load"))
+    if capacity is None:
+        raise ValidationError(f"Vehicle {vehicle.get('id')} has no cargo_capacity or max_load")
+    factor = vehicle.get("emissions_factor")
+    if factor is None:
+        vehicle_class = vehicle.get("vehicle_type", vehicle.get("type"))
+        factor = emission_factors.get(vehicle_class, emission_factors["medium_duty"])
+    return float(capacity), float(factor)
+
+@router.post("/plan-fleet")
+async def plan_fleet(plan_request: FleetPlanRequest) -> FleetPlan:
+    """
+    Assign delivery stops to fleet vehicles as a capacitated VRP with time
+    windows, minimizing emissions. Vehicle capacity and the per-km emission
+    factor come from the ``vehicles`` collection (see ``_fleet_vehicle``).
+    The solve runs in a process pool.
+    """
+    query = {"id": {"$in": plan_request.vehicle_ids}} if plan_request.vehicle_ids else {}
+    vehicles = await db["vehicles"].find(query).to_list(None)
+    if not vehicles:
+        raise ValidationError("No vehicles available for planning")
+    if not plan_request.stops:
+        raise ValidationError("At least one stop is required")
+    
+    emission_factors = EmissionsCalculator().emission_factors
+    capacities, factors = zip(*[_fleet_vehicle(vehicle, emission_factors) for vehicle in vehicles])
+    problem = {
+        "locations": [(plan_request.depot.lat, plan_request.depot.lon)] + [
+            (stop.location.lat, stop.location.lon) for stop in plan_request.stops
+        ],
+        "demands": [0.0] + [stop.demand for stop in plan_request.stops],
+        "time_windows": [(0.0, plan_request.horizon * 60)] + [
+            (stop.earliest_arrival * 60, stop.latest_arrival * 60) for stop in plan_request.stops
+        ],
+        "service_times": [0.0] + [stop.service_time * 60 for stop in plan_request.stops],
+        "capacities": list(capacities),
+        "emission_factors": list(factors),
+        "time_limit_seconds": plan_request.time_limit_seconds or settings.FLEET_SOLVER_TIME_LIMIT,
+        "horizon": plan_request.horizon * 60
+    }
+    
+    try:
+        solution = await plan_fleet_in_pool(problem, settings.FLEET_SOLVER_WORKERS)
+    except FileNotFoundError as e:
+        raise FedExGreenRouterError(str(e))
+    except ValueError as e:
+        raise ValidationError(str(e))
+    
+    routes = [
+        FleetVehicleRoute(
+            vehicle_id=vehicles[route["vehicle"]]["id"],
+            stop_ids=[plan_request.stops[node - 1].id for node in route["stops"]],
+            arrival_times=[arrival / 60 for arrival in route["arrival_times"]],
+            total_distance=route["distance"] / 1000,
+            total_duration=route["duration"] / 60,
+            total_emissions=route["emissions"],
+            load=route["load"]
+        )
+        for route in solution["routes"]
+    ]
+    return FleetPlan(
+        status=solution["status"],
+        routes=routes,
+        unassigned_stop_ids=[plan_request.stops[node - 1].id for node in solution["unassigned"]],
+        total_distance=sum(route.total_distance for route in routes),
+        total_emissions=sum(route.total_emissions for route in routes)
+    )
+
+class MatrixRequest(BaseModel):
+    sources: List[RoutePoint]
+    destinations: Optional[List[RoutePoint]] = None  # defaults to the sources
+    vehicle_types: Optional[List[str]] = None  # emission factor keys; defaults to all
+
+class TravelMatrixResponse(BaseModel):
+    durations: List[List[Optional[float]]]  # minutes, None when unreachable
+    distances: List[List[Optional[float]]]  # km, None when unreachable
+    emissions: Dict[str, List[List[Optional[float]]]]  # g CO2 per vehicle type
+
+def _matrix_cells(values: np.ndarray) -> List[List[Optional[float]]]:
+    """Nested lists for JSON, with unreachable (infinite) cells as None."""
+    return [[float(v) if np.isfinite(v) else None for v in row] for row in values.tolist()]
+
+def _matrix_block(durations: np.ndarray, distances: np.ndarray, factors: Dict[str, float]) -> Dict:
+    """One block of matrix rows converted to response units."""
+    return {
+        "durations": _matrix_cells(durations / 60),
+        "distances": _matrix_cells(distances / 1000),
+        "emissions": {
+            name: _matrix_cells(values)
+            for name, values in emissions_matrices(distances, factors).items()
+        }
+    }
+
+def _solve_matrix(
+    graph: RoadGraph,
+    source_points: List[RoutePoint],
+    destination_points: List[RoutePoint],
+    hierarchy: Optional[ContractionHierarchy]
+) -> Tuple[TravelMatrix, List[int], Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Snap the request points (an O(nodes) scan each) and prepare the matrix
+    towards the destinations, then compute it unless it is large enough to
+    be streamed; run in the threadpool so none of it blocks the event loop.
+    """
+    sources = [snap_to_graph(graph, point.lat, point.lon) for point in source_points]
+    targets = [snap_to_graph(graph, point.lat, point.lon) for point in destination_points]
+    matrix = TravelMatrix(graph, targets, hierarchy)
+    if len(sources) * len(targets) > MATRIX_STREAM_THRESHOLD:
+        return matrix, sources, None
+    return matrix, sources, matrix.compute(sources)
+
+def _stream_matrix(
+    matrix: TravelMatrix,
+    sources: List[int],
+    factors: Dict[str, float]
+) -> Iterator[bytes]:
+    """NDJSON lines of row blocks, each tagged with the index of its first row."""
+    for first, durations, distances in matrix.rows(sources):
+        block = _matrix_block(durations, distances, factors)
+        block["first_row"] = first
+        yield (json.dumps(block) + "\n").encode()
+
+@router.post("/matrix")
+async def travel_matrix(matrix_request: MatrixRequest):
+    """
+    Many-to-many durations, distances and per-vehicle-type emissions between
+    every source and destination. Uses the duration contraction hierarchy
+    when one is built. Matrices larger than ``MATRIX_STREAM_THRESHOLD``
+    cells are streamed as newline-delimited JSON row blocks.
+    """
+    destinations = matrix_request.destinations or matrix_request.sources
+    if not matrix_request.sources or not destinations:
+        raise ValidationError("At least one source and one destination are required")
+    
+    emission_factors = EmissionsCalculator().emission_factors
+    vehicle_types = matrix_request.vehicle_types or list(emission_factors)
+    unknown = [name for name in vehicle_types if name not in emission_factors]
+    if unknown:
+        raise ValidationError(f"Unknown vehicle types: {', '.join(unknown)}")
+    factors = {name: emission_factors[name] for name in vehicle_types}
+    
+    try:
+        graph = get_road_graph()
+        matrix, sources, computed = await run_in_threadpool(
+            _solve_matrix, graph, matrix_request.sources, destinations, get_contraction_hierarchy()
+        )
+    except FileNotFoundError as e:
+        raise FedExGreenRouterError(str(e))
+    except ValueError as e:
+        raise ValidationError(str(e))
+    
+    if computed is None:
+        return StreamingResponse(
+            _stream_matrix(matrix, sources, factors), media_type="application/x-ndjson"
+        )
+    
+    durations, distances = computed
+    return TravelMatrixResponse(**_matrix_block(durations, distances, factors))
 
 @router.get("/history")
 async def get_route_history() -> List[OptimizedRoute]:
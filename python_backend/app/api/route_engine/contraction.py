@@ -0,0 +1,416 @@
+from typing import Dict, List, Optional, Tuple
+import argparse
+import heapq
+import os
+import time
+import zlib
+import numpy as np
+from .graph import RoadGraph, get_road_graph
+from .search import ShortestPath
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over a :class:`RoadGraph` for one edge weight.
+
+    Every edge (original or shortcut) lives in one edge table. Shortcuts
+    record the two edges they replace so query paths can be unpacked back
+    into original graph edge ids. ``up`` lists the edges leaving a node
+    towards higher-ranked nodes; ``down`` lists the edges entering a node
+    from higher-ranked nodes, so both query directions only climb.
+
+    ``graph_signature`` identifies the graph the hierarchy was built from
+    (see :func:`graph_signature`); edge ids are only valid for that graph.
+    """
+
+    def __init__(
+        self,
+        weight: str,
+        rank: np.ndarray,
+        tails: np.ndarray,
+        heads: np.ndarray,
+        weights: np.ndarray,
+        originals: np.ndarray,
+        children: np.ndarray,
+        up_offsets: np.ndarray,
+        up_edges: np.ndarray,
+        down_offsets: np.ndarray,
+        down_edges: np.ndarray,
+        graph_signature: Optional[np.ndarray] = None
+    ):
+        self.weight = weight
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.tails = np.asarray(tails, dtype=np.int32)
+        self.heads = np.asarray(heads, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.originals = np.asarray(originals, dtype=np.int64)  # -1 for shortcuts
+        self.children = np.asarray(children, dtype=np.int64).reshape(-1, 2)
+        self.up_offsets = np.asarray(up_offsets, dtype=np.int64)
+        self.up_edges = np.asarray(up_edges, dtype=np.int64)
+        self.down_offsets = np.asarray(down_offsets, dtype=np.int64)
+        self.down_edges = np.asarray(down_edges, dtype=np.int64)
+        self.graph_signature = None if graph_signature is None else np.asarray(graph_signature, dtype=np.int64)
+
+        # Materialized neighbor/weight arrays so queries avoid double indexing
+        self._up_heads = self.heads[self.up_edges]
+        self._up_weights = self.weights[self.up_edges]
+        self._down_tails = self.tails[self.down_edges]
+        self._down_weights = self.weights[self.down_edges]
+        self._distance_totals: Optional[np.ndarray] = None  # filled by the matrix service
+
+    @property
+    def node_count(self) -> int:
+        return len(self.rank)
+
+    @property
+    def shortcut_count(self) -> int:
+        return int(np.count_nonzero(self.originals < 0))
+
+    def matches(self, graph: RoadGraph) -> bool:
+        """Whether the hierarchy was built from ``graph`` (False when unrecorded)."""
+        return self.graph_signature is not None and np.array_equal(
+            self.graph_signature, graph_signature(graph, self.weight)
+        )
+
+    def save(self, path: str):
+        """Save the hierarchy to an ``.npz`` file."""
+        signature = {} if self.graph_signature is None else {"graph_signature": self.graph_signature}
+        np.savez(
+            path,
+            weight=np.array(self.weight),
+            rank=self.rank,
+            tails=self.tails,
+            heads=self.heads,
+            weights=self.weights,
+            originals=self.originals,
+            children=self.children,
+            up_offsets=self.up_offsets,
+            up_edges=self.up_edges,
+            down_offsets=self.down_offsets,
+            down_edges=self.down_edges,
+            **signature
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        """Load a hierarchy written by :meth:`save`."""
+        with np.load(path) as data:
+            return cls(
+                str(data["weight"]),
+                data["rank"],
+                data["tails"],
+                data["heads"],
+                data["weights"],
+                data["originals"],
+                data["children"],
+                data["up_offsets"],
+                data["up_edges"],
+                data["down_offsets"],
+                data["down_edges"],
+                data["graph_signature"] if "graph_signature" in data.files else None
+            )
+
+    def query(self, source: int, target: int) -> Optional[ShortestPath]:
+        """Point-to-point shortest path via bidirectional upward Dijkstra with stall-on-demand."""
+        if source == target:
+            return ShortestPath(0.0, [source], [])
+
+        sides = (
+            (self.up_offsets, self._up_heads, self._up_weights, self.up_edges),
+            (self.down_offsets, self._down_tails, self._down_weights, self.down_edges),
+        )
+        # Edges in the opposite direction, used for stall-on-demand
+        stall_sides = (
+            (self.down_offsets, self._down_tails, self._down_weights),
+            (self.up_offsets, self._up_heads, self._up_weights),
+        )
+        dist: Tuple[Dict[int, float], Dict[int, float]] = ({source: 0.0}, {target: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = np.inf
+        meeting = -1
+
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                if heap[0][0] >= best:
+                    heap.clear()
+                    continue
+                d, u = heapq.heappop(heap)
+                if d > dist[side][u]:
+                    continue
+                if u in dist[1 - side] and d + dist[1 - side][u] < best:
+                    best = d + dist[1 - side][u]
+                    meeting = u
+
+                # Stall u if a higher-ranked node already reaches it more cheaply
+                side_dist = dist[side]
+                offsets, neighbors, weights = stall_sides[side]
+                start, end = offsets[u], offsets[u + 1]
+                if any(
+                    side_dist.get(x, np.inf) + w < d
+                    for x, w in zip(neighbors[start:end].tolist(), weights[start:end].tolist())
+                ):
+                    continue
+
+                offsets, neighbors, weights, edge_ids = sides[side]
+                start, end = offsets[u], offsets[u + 1]
+                for v, w, edge in zip(
+                    neighbors[start:end].tolist(),
+                    weights[start:end].tolist(),
+                    edge_ids[start:end].tolist()
+                ):
+                    nd = d + w
+                    if nd < dist[side].get(v, np.inf):
+                        dist[side][v] = nd
+                        parent[side][v] = edge
+                        heapq.heappush(heap, (nd, v))
+
+        if meeting < 0:
+            return None
+
+        ch_edges: List[int] = []
+        v = meeting
+        while v != source:
+            edge = parent[0][v]
+            ch_edges.append(edge)
+            v = int(self.tails[edge])
+        ch_edges.reverse()
+        v = meeting
+        while v != target:
+            edge = parent[1][v]
+            ch_edges.append(edge)
+            v = int(self.heads[edge])
+
+        edges = self._unpack(ch_edges)
+        nodes = [source] + [int(self.heads[edge]) for edge in edges]
+        return ShortestPath(float(best), nodes, [int(self.originals[edge]) for edge in edges])
+
+    def edge_totals(self, edge_values: np.ndarray) -> np.ndarray:
+        """
+        Sum a per-edge metric of the original graph (e.g. distance) over every
+        hierarchy edge; a shortcut gets the total of the two edges it replaces.
+        """
+        totals = np.zeros(len(self.tails))
+        original = self.originals >= 0
+        totals[original] = np.asarray(edge_values)[self.originals[original]]
+        # Shortcuts are always added after the edges they replace
+        for edge in np.flatnonzero(~original).tolist():
+            first, second = self.children[edge]
+            totals[edge] = totals[first] + totals[second]
+        return totals
+
+    def _unpack(self, ch_edges: List[int]) -> List[int]:
+        """Expand shortcuts into the original edges they stand for (table indices)."""
+        result = []
+        stack = list(reversed(ch_edges))
+        while stack:
+            edge = stack.pop()
+            if self.originals[edge] >= 0:
+                result.append(edge)
+            else:
+                first, second = self.children[edge]
+                stack.append(int(second))
+                stack.append(int(first))
+        return result
+
+def graph_signature(graph: RoadGraph, weight: str) -> np.ndarray:
+    """Node count, edge count and a CRC32 of the topology and ``weight`` of ``graph``."""
+    checksum = 0
+    for array in (graph.offsets, graph.targets, graph.edge_weights(weight)):
+        checksum = zlib.crc32(np.ascontiguousarray(array).view(np.uint8), checksum)
+    return np.array([graph.node_count, graph.edge_count, checksum], dtype=np.int64)
+
+def build_contraction_hierarchy(
+    graph: RoadGraph,
+    weight: str = "duration",
+    witness_settle_limit: int = 500
+) -> ContractionHierarchy:
+    """
+    Contract every node of ``graph`` in order of edge difference plus
+    contracted-neighbor count and hierarchy level (with lazy priority
+    updates), adding shortcuts wherever a bounded witness search
+    cannot find a path at least as short around the contracted node.
+    """
+    n = graph.node_count
+    edge_weights = graph.edge_weights(weight).astype(np.float64)
+
+    tails: List[int] = []
+    heads: List[int] = []
+    weights: List[float] = []
+    originals: List[int] = []
+    children: List[Tuple[int, int]] = []
+
+    # out_adj[u][v] / in_adj[v][u] -> edge table index of the best u->v edge
+    out_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+    in_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+
+    def add_edge(u: int, v: int, w: float, original: int, pair: Tuple[int, int]) -> int:
+        tails.append(u)
+        heads.append(v)
+        weights.append(w)
+        originals.append(original)
+        children.append(pair)
+        return len(tails) - 1
+
+    for edge, (u, v, w) in enumerate(zip(
+        graph.sources.tolist(), graph.targets.tolist(), edge_weights.tolist()
+    )):
+        if u == v:
+            continue
+        current = out_adj[u].get(v)
+        if current is None or w < weights[current]:
+            index = add_edge(u, v, w, edge, (-1, -1))
+            out_adj[u][v] = index
+            in_adj[v][u] = index
+
+    contracted = np.zeros(n, dtype=bool)
+    deleted_neighbors = np.zeros(n, dtype=np.int64)
+    levels = np.zeros(n, dtype=np.int64)
+
+    def witness_distances(source: int, skip: int, max_cost: float) -> Dict[int, float]:
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < witness_settle_limit:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > max_cost:
+                break
+            settled += 1
+            for v, index in out_adj[u].items():
+                if v == skip:
+                    continue
+                nd = d + weights[index]
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def needed_shortcuts(v: int) -> List[Tuple[int, int, float, int, int]]:
+        shortcuts = []
+        outs = list(out_adj[v].items())
+        for u, in_index in in_adj[v].items():
+            w_in = weights[in_index]
+            candidates = [
+                (w, w_in + weights[out_index], out_index)
+                for w, out_index in outs if w != u
+            ]
+            if not candidates:
+                continue
+            dist = witness_distances(u, v, max(cost for _, cost, _ in candidates))
+            for w, cost, out_index in candidates:
+                if dist.get(w, np.inf) > cost:
+                    shortcuts.append((u, w, cost, in_index, out_index))
+        return shortcuts
+
+    def priority(v: int) -> int:
+        edge_difference = len(needed_shortcuts(v)) - len(in_adj[v]) - len(out_adj[v])
+        return edge_difference + int(deleted_neighbors[v]) + int(levels[v])
+
+    rank = np.zeros(n, dtype=np.int32)
+    up: List[List[int]] = [[] for _ in range(n)]
+    down: List[List[int]] = [[] for _ in range(n)]
+
+    queue = [(priority(v), v) for v in range(n)]
+    heapq.heapify(queue)
+    order = 0
+    while queue:
+        _, v = heapq.heappop(queue)
+        if contracted[v]:
+            continue
+        current = priority(v)
+        if queue and current > queue[0][0]:
+            heapq.heappush(queue, (current, v))
+            continue
+
+        shortcuts = needed_shortcuts(v)
+        contracted[v] = True
+        rank[v] = order
+        order += 1
+
+        up[v] = list(out_adj[v].values())
+        down[v] = list(in_adj[v].values())
+        for w in out_adj[v]:
+            del in_adj[w][v]
+            deleted_neighbors[w] += 1
+            levels[w] = max(levels[w], levels[v] + 1)
+        for u in in_adj[v]:
+            del out_adj[u][v]
+            deleted_neighbors[u] += 1
+            levels[u] = max(levels[u], levels[v] + 1)
+        out_adj[v] = {}
+        in_adj[v] = {}
+
+        for u, w, cost, in_index, out_index in shortcuts:
+            current_index = out_adj[u].get(w)
+            if current_index is None or cost < weights[current_index]:
+                index = add_edge(u, w, cost, -1, (in_index, out_index))
+                out_adj[u][w] = index
+                in_adj[w][u] = index
+
+    up_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(edges) for edges in up], out=up_offsets[1:])
+    down_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(edges) for edges in down], out=down_offsets[1:])
+
+    return ContractionHierarchy(
+        weight,
+        rank,
+        np.array(tails),
+        np.array(heads),
+        np.array(weights),
+        np.array(originals),
+        np.array(children).reshape(-1, 2),
+        up_offsets,
+        np.array([e for edges in up for e in edges], dtype=np.int64),
+        down_offsets,
+        np.array([e for edges in down for e in edges], dtype=np.int64),
+        graph_signature(graph, weight)
+    )
+
+_contraction_hierarchy: Optional[ContractionHierarchy] = None
+_contraction_hierarchy_loaded = False
+
+def get_contraction_hierarchy() -> Optional[ContractionHierarchy]:
+    """
+    Load (once per process) the hierarchy at ``ROAD_CH_PATH``, if one was
+    built for the current road graph. A hierarchy built from another graph
+    (e.g. before the graph was rebuilt) is ignored, so routing falls back
+    to the plain searches until it is rebuilt.
+    """
+    global _contraction_hierarchy, _contraction_hierarchy_loaded
+    if not _contraction_hierarchy_loaded:
+        from app.core.settings import settings
+
+        if settings.ROAD_CH_PATH and os.path.exists(settings.ROAD_CH_PATH):
+            hierarchy = ContractionHierarchy.load(settings.ROAD_CH_PATH)
+            if hierarchy.matches(get_road_graph()):
+                _contraction_hierarchy = hierarchy
+            else:
+                print(f"Contraction hierarchy at {settings.ROAD_CH_PATH} does not match the road graph, ignoring it")
+        _contraction_hierarchy_loaded = True
+    return _contraction_hierarchy
+
+def main():
+    """Offline build step: ``python -m app.api.route_engine.contraction graph.npz graph.ch.npz``."""
+    parser = argparse.ArgumentParser(description="Build a contraction hierarchy for a road graph")
+    parser.add_argument("graph", help="Road graph file (.npz or .json)")
+    parser.add_argument("output", help="Where to write the hierarchy (.npz)")
+    parser.add_argument("--weight", default="duration", choices=RoadGraph.EDGE_WEIGHTS)
+    parser.add_argument("--witness-limit", type=int, default=500, help="Max nodes settled per witness search")
+    args = parser.parse_args()
+
+    graph = RoadGraph.load(args.graph)
+    start = time.perf_counter()
+    hierarchy = build_contraction_hierarchy(graph, args.weight, args.witness_limit)
+    hierarchy.save(args.output)
+    print(
+        f"Contracted {graph.node_count} nodes in {time.perf_counter() - start:.1f}s "
+        f"({hierarchy.shortcut_count} shortcuts) -> {args.output}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from typing import Dict, Optional, Tuple, Union
+import numpy as np
+from app.api.vehicle import VehicleType
+from app.services.emission_curves import REFERENCE_SPEED, EmissionCurveModel
+from .graph import RoadGraph
+
+# Criteria columns produced by edge_criteria, named like the
+# weight_factors returned by PreferenceHandler.get_routing_factors
+CRITERIA: Tuple[str, ...] = ("distance", "time", "emissions", "cost")
+
+DRIVER_COST_PER_HOUR = 25.0      # currency units per hour
+FUEL_PRICE_PER_LITER = 1.6       # diesel/gasoline
+ELECTRICITY_PRICE_PER_KWH = 0.25
+EV_ENERGY_PER_KM = 0.25          # kWh/km for vans without a km/L rating
+
+# Emission curve shape (see emission_curves.CURVE_PARAMETERS) per vehicle
+# category; electric vehicles use the electric curve whatever their category
+CURVE_CLASSES = {"van": "light_duty", "truck": "medium_duty", "bike": "light_duty"}
+
+# Curve tables per (curve class, emission factor), built once per process
+_curve_models: Dict[Tuple[str, float], EmissionCurveModel] = {}
+
+def energy_cost_per_km(vehicle: VehicleType) -> float:
+    """Fuel or electricity cost of driving one km."""
+    if vehicle.fuel_type == "electric":
+        return ELECTRICITY_PRICE_PER_KWH * EV_ENERGY_PER_KM
+    if vehicle.fuel_efficiency > 0:
+        return FUEL_PRICE_PER_LITER / vehicle.fuel_efficiency
+    return 0.0
+
+def curve_class(vehicle: VehicleType) -> str:
+    if vehicle.fuel_type == "electric":
+        return "electric"
+    return CURVE_CLASSES.get(vehicle.category, "medium_duty")
+
+def vehicle_curve_model(vehicle: VehicleType) -> Tuple[EmissionCurveModel, str]:
+    """Emission curve tables scaled to the vehicle's own emission factor, and their class."""
+    key = (curve_class(vehicle), float(vehicle.emission_factor))
+    model = _curve_models.get(key)
+    if model is None:
+        model = _curve_models[key] = EmissionCurveModel({key[0]: key[1]})
+    return model, key[0]
+
+def edge_speeds(
+    graph: RoadGraph,
+    durations: Optional[np.ndarray] = None,
+    edges: Union[slice, np.ndarray] = slice(None)
+) -> np.ndarray:
+    """Average speed (km/h) of ``edges`` from ``durations`` (seconds), else the free-flow ones."""
+    seconds = (graph.durations if durations is None else durations)[edges].astype(np.float64)
+    return np.divide(
+        graph.distances[edges].astype(np.float64) * 3.6,
+        seconds,
+        out=np.full(len(seconds), REFERENCE_SPEED),
+        where=seconds > 0
+    )
+
+def edge_emissions(
+    graph: RoadGraph,
+    vehicle: VehicleType,
+    cargo_weight: float,
+    durations: Optional[np.ndarray] = None,
+    edges: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Per-edge g CO2 from the vehicle's speed/load/gradient emission curve,
+    at the speeds implied by ``durations`` (seconds; e.g. live traffic,
+    else free flow), so congested edges cost more. ``edges`` limits the
+    result to those edges.
+    """
+    edges = slice(None) if edges is None else np.asarray(edges, dtype=np.int64)
+    model, vehicle_class = vehicle_curve_model(vehicle)
+    return model.segment_emissions(
+        vehicle_class,
+        graph.distances[edges].astype(np.float64) / 1000,
+        edge_speeds(graph, durations, edges),
+        min(cargo_weight / vehicle.cargo_capacity, 1.0) if vehicle.cargo_capacity > 0 else 0.0,
+        graph.gradients[edges].astype(np.float64)
+    )
+
+def edge_criteria(
+    graph: RoadGraph,
+    vehicle: VehicleType,
+    cargo_weight: float,
+    durations: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Per-edge (distance km, time min, emissions g CO2, cost) matrix in
+    ``CRITERIA`` order. ``durations`` (seconds) replaces the graph's
+    free-flow durations, e.g. with live traffic.
+    """
+    km = graph.distances.astype(np.float64) / 1000
+    minutes = (graph.durations if durations is None else durations).astype(np.float64) / 60
+    cost = km * energy_cost_per_km(vehicle) + minutes / 60 * DRIVER_COST_PER_HOUR
+    emissions = edge_emissions(graph, vehicle, cargo_weight, durations)
+    return np.column_stack([km, minutes, emissions, cost])
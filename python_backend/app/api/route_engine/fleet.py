@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from .contraction import get_contraction_hierarchy
+from .graph import get_road_graph
+from .matrix import travel_matrices
+from .search import snap_to_graph
+
+# Penalty (in arc-cost units, i.e. grams CO2) for leaving a stop unserved
+DROP_PENALTY = 10_000_000
+
+def solve_vrptw(
+    durations: np.ndarray,
+    distances: np.ndarray,
+    demands: List[float],
+    time_windows: List[Tuple[float, float]],
+    service_times: List[float],
+    capacities: List[float],
+    emission_factors: List[float],
+    time_limit_seconds: int,
+    horizon: float
+) -> Dict[str, Any]:
+    """
+    Capacitated VRP with time windows on OR-Tools' routing solver.
+
+    Node 0 is the depot. Durations, time windows, service times and the
+    horizon are in seconds, distances in meters, demands and capacities in
+    kg. Each vehicle's arc cost is its emissions in grams CO2 (plus one unit
+    per km so zero-emission vehicles still prefer short routes). Stops that
+    cannot be served are dropped at ``DROP_PENALTY`` each.
+    """
+    node_count, vehicle_count = len(demands), len(capacities)
+    unreachable = ~np.isfinite(durations)
+    durations = np.where(unreachable, horizon, durations)
+    distances = np.where(unreachable, 0, distances)
+
+    manager = pywrapcp.RoutingIndexManager(node_count, vehicle_count, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    km = distances / 1000
+    for vehicle, factor in enumerate(emission_factors):
+        arc_costs = np.rint(km * factor + km).astype(np.int64)
+        arc_costs[unreachable] = DROP_PENALTY
+        callback = routing.RegisterTransitMatrix(arc_costs.tolist())
+        routing.SetArcCostEvaluatorOfVehicle(callback, vehicle)
+
+    demand_callback = routing.RegisterUnaryTransitVector([int(round(d)) for d in demands])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback, 0, [int(c) for c in capacities], True, "Capacity"
+    )
+
+    # Travel time from i to j includes the service time spent at i
+    transit = np.rint(durations + np.asarray(service_times)[:, None]).astype(np.int64)
+    time_callback = routing.RegisterTransitMatrix(transit.tolist())
+    routing.AddDimension(time_callback, int(horizon), int(horizon), False, "Time")
+    time_dimension = routing.GetDimensionOrDie("Time")
+
+    for node in range(1, node_count):
+        index = manager.NodeToIndex(node)
+        start, end = time_windows[node]
+        time_dimension.CumulVar(index).SetRange(int(start), int(end))
+        routing.AddDisjunction([index], DROP_PENALTY)
+    depot_start, depot_end = time_windows[0]
+    for vehicle in range(vehicle_count):
+        time_dimension.CumulVar(routing.Start(vehicle)).SetRange(int(depot_start), int(depot_end))
+        time_dimension.CumulVar(routing.End(vehicle)).SetRange(int(depot_start), int(depot_end))
+
+    parameters = pywrapcp.DefaultRoutingSearchParameters()
+    parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    parameters.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    parameters.time_limit.FromSeconds(int(time_limit_seconds))
+
+    solution = routing.SolveWithParameters(parameters)
+    if solution is None:
+        return {"status": "no_solution", "routes": [], "unassigned": list(range(1, node_count))}
+
+    routes, served = [], set()
+    for vehicle in range(vehicle_count):
+        index = routing.Start(vehicle)
+        stops, arrivals, distance, duration, emissions, load = [], [], 0.0, 0.0, 0.0, 0.0
+        while not routing.IsEnd(index):
+            node = manager.IndexToNode(index)
+            next_index = solution.Value(routing.NextVar(index))
+            next_node = manager.IndexToNode(next_index)
+            distance += distances[node, next_node]
+            emissions += km[node, next_node] * emission_factors[vehicle]
+            if node != 0:
+                stops.append(node)
+                arrivals.append(solution.Min(time_dimension.CumulVar(index)))
+                load += demands[node]
+                served.add(node)
+            index = next_index
+        if stops:
+            duration = solution.Min(time_dimension.CumulVar(index)) - solution.Min(
+                time_dimension.CumulVar(routing.Start(vehicle))
+            )
+            routes.append({
+                "vehicle": vehicle,
+                "stops": stops,
+                "arrival_times": arrivals,
+                "distance": float(distance),
+                "duration": float(duration),
+                "emissions": float(emissions),
+                "load": float(load)
+            })
+
+    return {
+        "status": "success",
+        "routes": routes,
+        "unassigned": [node for node in range(1, node_count) if node not in served]
+    }
+
+def plan_fleet(problem: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process-pool entry point: snap the depot and stops to the road graph
+    (loaded once per worker), build the travel matrices and solve.
+    """
+    graph = get_road_graph()
+    nodes = [snap_to_graph(graph, lat, lon) for lat, lon in problem["locations"]]
+    durations, distances = travel_matrices(graph, nodes, hierarchy=get_contraction_hierarchy())
+    return solve_vrptw(
+        durations,
+        distances,
+        problem["demands"],
+        problem["time_windows"],
+        problem["service_times"],
+        problem["capacities"],
+        problem["emission_factors"],
+        problem["time_limit_seconds"],
+        problem["horizon"]
+    )
+
+_solver_pool: Optional[ProcessPoolExecutor] = None
+
+async def plan_fleet_in_pool(problem: Dict[str, Any], max_workers: int = 2) -> Dict[str, Any]:
+    """Run :func:`plan_fleet` in the solver process pool without blocking the event loop."""
+    global _solver_pool
+    if _solver_pool is None:
+        _solver_pool = ProcessPoolExecutor(max_workers=max_workers)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_solver_pool, plan_fleet, problem)
+
+def shutdown_solver_pool():
+    """Stop the solver worker processes (called on application shutdown)."""
+    global _solver_pool
+    if _solver_pool is not None:
+        _solver_pool.shutdown(wait=False, cancel_futures=True)
+        _solver_pool = None
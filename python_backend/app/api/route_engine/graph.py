@@ -0,0 +1,271 @@
+from typing import Dict, Optional, Tuple, Union
+import json
+import math
+import os
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+def haversine_m(
+    lat1: Union[float, np.ndarray],
+    lon1: Union[float, np.ndarray],
+    lat2: Union[float, np.ndarray],
+    lon2: Union[float, np.ndarray]
+) -> Union[float, np.ndarray]:
+    """Great-circle distance in meters (vectorized over NumPy arrays)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_m_scalar(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Scalar great-circle distance in meters, for use inside search loops."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+def _read_only(weight) -> bool:
+    """Whether a weight is an array that cannot change, so results for it can be cached."""
+    return isinstance(weight, np.ndarray) and not weight.flags.writeable
+
+class RoadGraph:
+    """
+    Directed road network stored as compressed sparse row (CSR) arrays.
+
+    Outgoing edges of node ``u`` occupy ``offsets[u]:offsets[u + 1]`` in the
+    edge arrays, so the CSR position of an edge doubles as its edge id.
+    """
+
+    EDGE_WEIGHTS = ("distance", "duration")
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        distances: np.ndarray,
+        durations: np.ndarray,
+        gradients: Optional[np.ndarray] = None
+    ):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.distances = np.asarray(distances, dtype=np.float32)  # meters
+        self.durations = np.asarray(durations, dtype=np.float32)  # seconds
+        if gradients is None:
+            gradients = np.zeros(len(self.targets), dtype=np.float32)
+        self.gradients = np.asarray(gradients, dtype=np.float32)  # degrees
+
+        if len(self.offsets) != self.node_count + 1:
+            raise ValueError("offsets must have one entry per node plus one")
+        if not (
+            len(self.distances) == len(self.durations) == len(self.gradients) == self.edge_count
+        ):
+            raise ValueError("edge arrays must all have the same length")
+
+        self._reverse: Optional["RoadGraph"] = None
+        self._edge_ids: Optional[np.ndarray] = None
+        self._sources: Optional[np.ndarray] = None
+        self._straight_lengths: Optional[np.ndarray] = None
+        self._bound_scales: Dict[str, float] = {}
+        # Last read-only weight array seen (e.g. live durations) and its
+        # bound scale / reversed layout, reused while the same array is passed
+        self._array_scale: Optional[Tuple[np.ndarray, float]] = None
+        self._array_reverse: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    @classmethod
+    def from_edges(
+        cls,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        distances: np.ndarray,
+        durations: np.ndarray,
+        gradients: Optional[np.ndarray] = None
+    ) -> "RoadGraph":
+        """Build a graph from an unordered edge list."""
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(lat))
+        offsets = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            lat,
+            lon,
+            offsets,
+            np.asarray(targets)[order],
+            np.asarray(distances)[order],
+            np.asarray(durations)[order],
+            None if gradients is None else np.asarray(gradients)[order]
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """
+        Load a graph from disk.
+
+        ``.npz`` files hold the CSR arrays written by :meth:`save`; ``.json``
+        files hold ``{"nodes": [[lat, lon], ...], "edges": [[u, v, meters,
+        seconds, gradient?], ...]}`` and are convenient for small fixtures.
+        """
+        if path.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+            nodes = np.asarray(data["nodes"], dtype=np.float64).reshape(-1, 2)
+            edges = np.asarray(data["edges"], dtype=np.float64).reshape(len(data["edges"]), -1)
+            return cls.from_edges(
+                nodes[:, 0],
+                nodes[:, 1],
+                edges[:, 0].astype(np.int64),
+                edges[:, 1].astype(np.int64),
+                edges[:, 2],
+                edges[:, 3],
+                edges[:, 4] if edges.shape[1] > 4 else None
+            )
+
+        with np.load(path) as data:
+            return cls(
+                data["lat"],
+                data["lon"],
+                data["offsets"],
+                data["targets"],
+                data["distances"],
+                data["durations"],
+                data["gradients"] if "gradients" in data else None
+            )
+
+    def save(self, path: str):
+        """Save the CSR arrays to an ``.npz`` file."""
+        np.savez(
+            path,
+            lat=self.lat,
+            lon=self.lon,
+            offsets=self.offsets,
+            targets=self.targets,
+            distances=self.distances,
+            durations=self.durations,
+            gradients=self.gradients
+        )
+
+    def edge_weights(self, weight: Union[str, np.ndarray]) -> np.ndarray:
+        """Resolve a weight name (or an explicit per-edge array) to an edge array."""
+        if isinstance(weight, str):
+            if weight not in self.EDGE_WEIGHTS:
+                raise ValueError(f"Unknown edge weight: {weight}")
+            return self.distances if weight == "distance" else self.durations
+        weight = np.asarray(weight)
+        if len(weight) != self.edge_count:
+            raise ValueError("weight array must have one entry per edge")
+        return weight
+
+    @property
+    def sources(self) -> np.ndarray:
+        """Source node of every edge (expanded from the CSR offsets)."""
+        if self._sources is None:
+            self._sources = np.repeat(
+                np.arange(self.node_count, dtype=np.int32), np.diff(self.offsets)
+            )
+        return self._sources
+
+    def lower_bound_scale(self, weight: Union[str, np.ndarray]) -> float:
+        """
+        Largest factor ``k`` such that ``k * straight_line_meters`` never
+        exceeds the edge weight, which makes it an admissible and consistent
+        A* potential for that weight.
+        """
+        key = weight if isinstance(weight, str) else None
+        if key is not None and key in self._bound_scales:
+            return self._bound_scales[key]
+        if key is None and self._array_scale is not None and self._array_scale[0] is weight:
+            return self._array_scale[1]
+
+        if self._straight_lengths is None:
+            self._straight_lengths = haversine_m(
+                self.lat[self.sources], self.lon[self.sources],
+                self.lat[self.targets], self.lon[self.targets]
+            )
+        weights = self.edge_weights(weight).astype(np.float64)
+        straight = self._straight_lengths
+        mask = straight > 0
+        scale = float(np.min(weights[mask] / straight[mask])) if mask.any() else 0.0
+        # Guard against float32 rounding pushing the bound above an edge weight
+        scale = max(scale * (1 - 1e-6), 0.0)
+
+        if key is not None:
+            self._bound_scales[key] = scale
+        elif _read_only(weight):
+            self._array_scale = (weight, scale)
+        return scale
+
+    def reverse(self) -> "RoadGraph":
+        """Graph with every edge reversed, used by backward searches."""
+        if self._reverse is None:
+            order = np.argsort(self.targets, kind="stable")
+            counts = np.bincount(self.targets, minlength=self.node_count)
+            offsets = np.zeros(self.node_count + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            reverse = RoadGraph(
+                self.lat,
+                self.lon,
+                offsets,
+                self.sources[order],
+                self.distances[order],
+                self.durations[order],
+                self.gradients[order]
+            )
+            # Map each reversed edge back to its forward edge id
+            reverse._edge_ids = order.astype(np.int64)
+            reverse._reverse = self
+            self._reverse = reverse
+        return self._reverse
+
+    def reverse_weights(self, weight: Union[str, np.ndarray]) -> np.ndarray:
+        """Edge weights laid out in the CSR order of :meth:`reverse`."""
+        reverse = self.reverse()
+        if isinstance(weight, str):
+            return reverse.edge_weights(weight)
+        if self._array_reverse is not None and self._array_reverse[0] is weight:
+            return self._array_reverse[1]
+        reversed_weights = self.edge_weights(weight)[reverse._edge_ids]
+        if _read_only(weight):
+            self._array_reverse = (weight, reversed_weights)
+        return reversed_weights
+
+    def edge_id(self, position: int) -> int:
+        """Forward edge id for a CSR position in this (possibly reversed) graph."""
+        if self._edge_ids is None:
+            return position
+        return int(self._edge_ids[position])
+
+    def nearest_node(self, lat: float, lon: float) -> int:
+        """Index of the node closest to the given coordinate."""
+        return int(np.argmin(haversine_m(lat, lon, self.lat, self.lon)))
+
+_road_graph: Optional[RoadGraph] = None
+
+def get_road_graph() -> RoadGraph:
+    """Load (once per process) the road graph configured by ``ROAD_GRAPH_PATH``."""
+    global _road_graph
+    if _road_graph is None:
+        from app.core.settings import settings
+
+        if not os.path.exists(settings.ROAD_GRAPH_PATH):
+            raise FileNotFoundError(f"Road graph not found at {settings.ROAD_GRAPH_PATH}")
+        _road_graph = RoadGraph.load(settings.ROAD_GRAPH_PATH)
+    return _road_graph
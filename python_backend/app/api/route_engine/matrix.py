@@ -0,0 +1,146 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import heapq
+import numpy as np
+from .contraction import ContractionHierarchy
+from .graph import RoadGraph
+from .search import one_to_many
+
+# Matrices with more cells than this are streamed row block by row block
+MATRIX_STREAM_THRESHOLD = 10_000
+
+def _upward_search(
+    offsets: np.ndarray,
+    neighbors: np.ndarray,
+    weights: np.ndarray,
+    carried: np.ndarray,
+    source: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Full Dijkstra over one direction of the hierarchy; returns (nodes, costs, carried totals)."""
+    dist: Dict[int, float] = {source: 0.0}
+    extra: Dict[int, float] = {source: 0.0}
+    settled: Dict[int, None] = {}
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled[u] = None
+        start, end = offsets[u], offsets[u + 1]
+        for v, w, c in zip(
+            neighbors[start:end].tolist(), weights[start:end].tolist(), carried[start:end].tolist()
+        ):
+            nd = d + w
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                extra[v] = extra[u] + c
+                heapq.heappush(heap, (nd, v))
+    nodes = np.fromiter(settled, dtype=np.int64, count=len(settled))
+    return (
+        nodes,
+        np.array([dist[u] for u in settled]),
+        np.array([extra[u] for u in settled])
+    )
+
+class TravelMatrix:
+    """
+    Many-to-many fastest-path durations (seconds) and distances (meters).
+
+    With a duration contraction hierarchy this is the bucket algorithm:
+    one backward upward search per target fills per-node buckets, then each
+    source runs one forward upward search and joins its search space
+    against the buckets with vectorized NumPy operations. Without a
+    hierarchy every source runs one one-to-many Dijkstra.
+    """
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        targets: List[int],
+        hierarchy: Optional[ContractionHierarchy] = None
+    ):
+        self.graph = graph
+        self.targets = list(targets)
+        self.hierarchy = hierarchy if hierarchy is not None and hierarchy.weight == "duration" else None
+
+        if self.hierarchy is not None:
+            h = self.hierarchy
+            if h._distance_totals is None:
+                h._distance_totals = h.edge_totals(graph.distances)
+            distance_totals = h._distance_totals
+            self._up = (h.up_offsets, h._up_heads, h._up_weights, distance_totals[h.up_edges])
+            down = (h.down_offsets, h._down_tails, h._down_weights, distance_totals[h.down_edges])
+
+            bucket_nodes, bucket_targets, bucket_costs, bucket_carried = [], [], [], []
+            for column, target in enumerate(self.targets):
+                nodes, costs, carried = _upward_search(*down, target)
+                bucket_nodes.append(nodes)
+                bucket_targets.append(np.full(len(nodes), column))
+                bucket_costs.append(costs)
+                bucket_carried.append(carried)
+            nodes = np.concatenate(bucket_nodes)
+            order = np.argsort(nodes, kind="stable")
+            self._bucket_nodes = nodes[order]
+            self._bucket_targets = np.concatenate(bucket_targets)[order]
+            self._bucket_costs = np.concatenate(bucket_costs)[order]
+            self._bucket_carried = np.concatenate(bucket_carried)[order]
+
+    def row(self, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Durations and distances from one source node to every target."""
+        if self.hierarchy is None:
+            return one_to_many(self.graph, source, self.targets)
+
+        nodes, costs, carried = _upward_search(*self._up, source)
+        starts = np.searchsorted(self._bucket_nodes, nodes, side="left")
+        counts = np.searchsorted(self._bucket_nodes, nodes, side="right") - starts
+        total = int(counts.sum())
+
+        durations = np.full(len(self.targets), np.inf)
+        distances = np.full(len(self.targets), np.inf)
+        if total == 0:
+            return durations, distances
+
+        # Expand every (forward node, bucket entry) match into flat arrays
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        candidate = np.repeat(costs, counts) + self._bucket_costs[offsets]
+        columns = self._bucket_targets[offsets]
+        candidate_carried = np.repeat(carried, counts) + self._bucket_carried[offsets]
+
+        # Keep the cheapest candidate per target column
+        order = np.lexsort((candidate, columns))
+        first = np.ones(total, dtype=bool)
+        first[1:] = columns[order][1:] != columns[order][:-1]
+        best = order[first]
+        durations[columns[best]] = candidate[best]
+        distances[columns[best]] = candidate_carried[best]
+        return durations, distances
+
+    def rows(self, sources: List[int], block_size: int = 64) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Yield ``(first_row, durations, distances)`` blocks of up to ``block_size`` sources."""
+        for first in range(0, len(sources), block_size):
+            block = [self.row(source) for source in sources[first:first + block_size]]
+            yield first, np.array([d for d, _ in block]), np.array([m for _, m in block])
+
+    def compute(self, sources: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Full ``len(sources) x len(targets)`` duration and distance matrices."""
+        durations = np.empty((len(sources), len(self.targets)))
+        distances = np.empty((len(sources), len(self.targets)))
+        for first, block_durations, block_distances in self.rows(sources):
+            durations[first:first + len(block_durations)] = block_durations
+            distances[first:first + len(block_distances)] = block_distances
+        return durations, distances
+
+def emissions_matrices(distances: np.ndarray, emission_factors: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """g CO2 per cell for each vehicle type, from a distance matrix in meters."""
+    names = list(emission_factors)
+    factors = np.array([emission_factors[name] for name in names], dtype=np.float64)
+    stacked = (distances / 1000)[None, ...] * factors.reshape(-1, *([1] * distances.ndim))
+    return dict(zip(names, stacked))
+
+def travel_matrices(
+    graph: RoadGraph,
+    sources: List[int],
+    targets: Optional[List[int]] = None,
+    hierarchy: Optional[ContractionHierarchy] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Duration (seconds) and distance (meters) of the fastest path between every source/target pair."""
+    return TravelMatrix(graph, sources if targets is None else targets, hierarchy).compute(sources)
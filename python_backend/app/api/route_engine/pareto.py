@@ -0,0 +1,134 @@
+from typing import Dict, List, NamedTuple, Sequence
+import heapq
+import numpy as np
+from .graph import RoadGraph, haversine_m_scalar
+
+class ParetoRoute(NamedTuple):
+    """One non-dominated route of a multi-criteria search."""
+    totals: np.ndarray  # summed edge criteria, one entry per criteria column
+    nodes: List[int]
+    edges: List[int]
+
+def _dominated(values: Sequence[float], bag: List[Sequence[float]], dims: Sequence[int], epsilon: float) -> bool:
+    """True if some label in ``bag`` (epsilon-)dominates ``values`` on ``dims``."""
+    for other in bag:
+        if all(other[i] <= values[i] * (1 + epsilon) for i in dims):
+            return True
+    return False
+
+def pareto_routes(
+    graph: RoadGraph,
+    source: int,
+    target: int,
+    criteria: np.ndarray,
+    dominance: Sequence[int],
+    max_labels_per_node: int = 6,
+    max_labels: int = 50000,
+    epsilon: float = 0.01
+) -> List[ParetoRoute]:
+    """
+    Multi-criteria label-setting search from ``source`` to ``target``.
+
+    ``criteria`` holds one row per edge; labels are compared on the
+    ``dominance`` columns only (the others are carried along). Labels are
+    settled in order of the first dominance column plus its straight-line
+    lower bound, and are pruned when they are epsilon-dominated at their
+    node, when their lower-bounded totals are dominated by a route already
+    found at the target, or when the node already holds
+    ``max_labels_per_node`` labels. ``max_labels`` caps the settled labels
+    so latency stays bounded on large graphs.
+    """
+    criteria = np.asarray(criteria, dtype=np.float64)
+    dims = list(dominance)
+    k = criteria.shape[1]
+    scales = [graph.lower_bound_scale(criteria[:, i]) if i in dims else 0.0 for i in range(k)]
+    t_lat, t_lon = float(graph.lat[target]), float(graph.lon[target])
+
+    bounds: Dict[int, float] = {}
+
+    def bounded(node: int, values: Sequence[float]) -> List[float]:
+        straight = bounds.get(node)
+        if straight is None:
+            straight = bounds[node] = haversine_m_scalar(
+                float(graph.lat[node]), float(graph.lon[node]), t_lat, t_lon
+            )
+        return [value + scale * straight for value, scale in zip(values, scales)]
+
+    label_values: List[List[float]] = [[0.0] * k]
+    label_nodes: List[int] = [source]
+    label_parents: List[int] = [-1]
+    label_edges: List[int] = [-1]
+    primary = dims[0]
+    heap = [(bounded(source, label_values[0])[primary], 0)]
+
+    bags: Dict[int, List[List[float]]] = {}
+    found: List[int] = []
+    found_values: List[List[float]] = []
+    settled = 0
+    offsets, targets = graph.offsets, graph.targets
+
+    while heap and settled < max_labels:
+        _, label = heapq.heappop(heap)
+        node, values = label_nodes[label], label_values[label]
+        bag = bags.setdefault(node, [])
+        if len(bag) >= max_labels_per_node or _dominated(values, bag, dims, epsilon):
+            continue
+        if node != target and _dominated(bounded(node, values), found_values, dims, epsilon):
+            continue
+        bag.append(values)
+        settled += 1
+        if node == target:
+            found.append(label)
+            found_values.append(values)
+            continue
+
+        start, end = offsets[node], offsets[node + 1]
+        for edge, v, edge_values in zip(
+            range(start, end), targets[start:end].tolist(), criteria[start:end].tolist()
+        ):
+            new_values = [a + b for a, b in zip(values, edge_values)]
+            if _dominated(new_values, bags.get(v, []), dims, epsilon):
+                continue
+            estimate = bounded(v, new_values)
+            if _dominated(estimate, found_values, dims, epsilon):
+                continue
+            label_values.append(new_values)
+            label_nodes.append(v)
+            label_parents.append(label)
+            label_edges.append(edge)
+            heapq.heappush(heap, (estimate[primary], len(label_nodes) - 1))
+
+    routes = []
+    for label in found:
+        nodes, edges = [], []
+        current = label
+        while current >= 0:
+            nodes.append(label_nodes[current])
+            if label_edges[current] >= 0:
+                edges.append(label_edges[current])
+            current = label_parents[current]
+        nodes.reverse()
+        edges.reverse()
+        routes.append(ParetoRoute(np.array(label_values[label]), nodes, edges))
+    return routes
+
+def rank_routes(
+    routes: List[ParetoRoute],
+    criteria_names: Sequence[str],
+    weight_factors: Dict[str, float],
+    limit: int
+) -> List[ParetoRoute]:
+    """
+    Order routes by their weighted sum of min-max normalized totals (lower is
+    better) and keep the best ``limit``. Criteria missing from
+    ``weight_factors`` are ignored.
+    """
+    if not routes:
+        return []
+    totals = np.array([route.totals for route in routes])
+    low, high = totals.min(axis=0), totals.max(axis=0)
+    spread = np.where(high > low, high - low, 1.0)
+    weights = np.array([weight_factors.get(name, 0.0) for name in criteria_names])
+    scores = ((totals - low) / spread) @ weights
+    order = np.lexsort((totals[:, 0], scores))
+    return [routes[i] for i in order[:max(limit, 1)]]
@@ -0,0 +1,229 @@
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple, Union
+import heapq
+import numpy as np
+from .graph import RoadGraph, haversine_m_scalar
+
+if TYPE_CHECKING:
+    from .contraction import ContractionHierarchy
+
+class ShortestPath(NamedTuple):
+    """Result of a point-to-point search."""
+    cost: float
+    nodes: List[int]
+    edges: List[int]  # forward edge ids, in travel order
+
+def dijkstra(
+    graph: RoadGraph,
+    source: int,
+    target: int,
+    weight: Union[str, np.ndarray] = "duration"
+) -> Optional[ShortestPath]:
+    """Plain unidirectional Dijkstra, kept as a reference for the faster searches."""
+    weights = graph.edge_weights(weight)
+    offsets, targets = graph.offsets, graph.targets
+
+    dist: Dict[int, float] = {source: 0.0}
+    parent: Dict[int, Tuple[int, int]] = {}
+    settled = set()
+    heap = [(0.0, source)]
+
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        if u == target:
+            break
+        settled.add(u)
+        start, end = offsets[u], offsets[u + 1]
+        for pos, v, w in zip(
+            range(start, end), targets[start:end].tolist(), weights[start:end].tolist()
+        ):
+            nd = d + w
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                parent[v] = (u, pos)
+                heapq.heappush(heap, (nd, v))
+
+    if target not in dist:
+        return None
+
+    nodes, edges = [target], []
+    while nodes[-1] != source:
+        u, pos = parent[nodes[-1]]
+        nodes.append(u)
+        edges.append(pos)
+    nodes.reverse()
+    edges.reverse()
+    return ShortestPath(dist[target], nodes, edges)
+
+def one_to_many(
+    graph: RoadGraph,
+    source: int,
+    targets: List[int],
+    weight: Union[str, np.ndarray] = "duration",
+    carry: Union[str, np.ndarray] = "distance"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Single Dijkstra from ``source`` that stops once every target is settled.
+
+    Returns the ``weight`` cost to each target and the ``carry`` total along
+    the same shortest paths (e.g. distance of the fastest route); unreachable
+    targets get ``inf`` for both.
+    """
+    weights = graph.edge_weights(weight)
+    carried = graph.edge_weights(carry)
+    offsets, graph_targets = graph.offsets, graph.targets
+
+    remaining = set(targets)
+    dist: Dict[int, float] = {source: 0.0}
+    extra: Dict[int, float] = {source: 0.0}
+    settled = set()
+    heap = [(0.0, source)]
+
+    while heap and remaining:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        remaining.discard(u)
+        start, end = offsets[u], offsets[u + 1]
+        for v, w, c in zip(
+            graph_targets[start:end].tolist(),
+            weights[start:end].tolist(),
+            carried[start:end].tolist()
+        ):
+            nd = d + w
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                extra[v] = extra[u] + c
+                heapq.heappush(heap, (nd, v))
+
+    costs = np.array([dist[t] if t in settled else np.inf for t in targets])
+    carried_totals = np.array([extra[t] if t in settled else np.inf for t in targets])
+    return costs, carried_totals
+
+def bidirectional_astar(
+    graph: RoadGraph,
+    source: int,
+    target: int,
+    weight: Union[str, np.ndarray] = "duration"
+) -> Optional[ShortestPath]:
+    """
+    Bidirectional A* using the average of the forward and backward
+    straight-line potentials, which keeps both searches consistent so the
+    usual ``top_f + top_r >= best`` stopping rule stays exact.
+    """
+    if source == target:
+        return ShortestPath(0.0, [source], [])
+
+    weights = graph.edge_weights(weight)
+    reverse = graph.reverse()
+    reverse_weights = graph.reverse_weights(weight)
+    scale = graph.lower_bound_scale(weight)
+    lat, lon = graph.lat, graph.lon
+    s_lat, s_lon = float(lat[source]), float(lon[source])
+    t_lat, t_lon = float(lat[target]), float(lon[target])
+
+    potentials: Dict[int, float] = {}
+
+    def potential(v: int) -> float:
+        p = potentials.get(v)
+        if p is None:
+            v_lat, v_lon = float(lat[v]), float(lon[v])
+            to_target = haversine_m_scalar(v_lat, v_lon, t_lat, t_lon)
+            from_source = haversine_m_scalar(s_lat, s_lon, v_lat, v_lon)
+            p = potentials[v] = scale * (to_target - from_source) / 2
+        return p
+
+    sides = (
+        (graph.offsets, graph.targets, weights, 1.0),
+        (reverse.offsets, reverse.targets, reverse_weights, -1.0),
+    )
+    dist: Tuple[Dict[int, float], Dict[int, float]] = ({source: 0.0}, {target: 0.0})
+    parent: Tuple[Dict[int, Tuple[int, int]], Dict[int, Tuple[int, int]]] = ({}, {})
+    settled = (set(), set())
+    heaps = ([(potential(source), source)], [(-potential(target), target)])
+
+    best = np.inf
+    meeting = -1
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        other = 1 - side
+        offsets, targets, side_weights, sign = sides[side]
+
+        _, u = heapq.heappop(heaps[side])
+        if u in settled[side]:
+            continue
+        settled[side].add(u)
+
+        d = dist[side][u]
+        start, end = offsets[u], offsets[u + 1]
+        for pos, v, w in zip(
+            range(start, end), targets[start:end].tolist(), side_weights[start:end].tolist()
+        ):
+            nd = d + w
+            if nd < dist[side].get(v, np.inf):
+                dist[side][v] = nd
+                parent[side][v] = (u, pos)
+                heapq.heappush(heaps[side], (nd + sign * potential(v), v))
+                if v in dist[other] and nd + dist[other][v] < best:
+                    best = nd + dist[other][v]
+                    meeting = v
+
+    if meeting < 0:
+        return None
+
+    nodes, edges = [meeting], []
+    while nodes[-1] != source:
+        u, pos = parent[0][nodes[-1]]
+        nodes.append(u)
+        edges.append(pos)
+    nodes.reverse()
+    edges.reverse()
+
+    v = meeting
+    while v != target:
+        w, pos = parent[1][v]
+        nodes.append(w)
+        edges.append(reverse.edge_id(pos))
+        v = w
+
+    return ShortestPath(float(best), nodes, edges)
+
+def snap_to_graph(graph: RoadGraph, lat: float, lon: float, max_snap_m: float = 5000.0) -> int:
+    """Nearest graph node to a coordinate, rejecting points off the road network."""
+    node = graph.nearest_node(lat, lon)
+    if haversine_m_scalar(lat, lon, float(graph.lat[node]), float(graph.lon[node])) > max_snap_m:
+        raise ValueError(f"Point ({lat}, {lon}) is too far from the road network")
+    return node
+
+def route_through(
+    graph: RoadGraph,
+    points: List[Tuple[float, float]],
+    weight: Union[str, np.ndarray] = "duration",
+    max_snap_m: float = 5000.0,
+    hierarchy: Optional["ContractionHierarchy"] = None
+) -> Optional[ShortestPath]:
+    """
+    Snap ``(lat, lon)`` points to the graph and chain the shortest legs
+    between them. Legs are answered from ``hierarchy`` when it was built for
+    the requested weight, and by bidirectional A* otherwise.
+    """
+    use_hierarchy = hierarchy is not None and isinstance(weight, str) and hierarchy.weight == weight
+    snapped = [snap_to_graph(graph, lat, lon, max_snap_m) for lat, lon in points]
+    cost, nodes, edges = 0.0, snapped[:1], []
+    for source, target in zip(snapped, snapped[1:]):
+        if use_hierarchy:
+            leg = hierarchy.query(source, target)
+        else:
+            leg = bidirectional_astar(graph, source, target, weight)
+        if leg is None:
+            return None
+        cost += leg.cost
+        nodes.extend(leg.nodes[1:])
+        edges.extend(leg.edges)
+    return ShortestPath(cost, nodes, edges)
@@ -0,0 +1,206 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import math
+import time
+import numpy as np
+from .graph import RoadGraph, haversine_m
+
+# Live speeds below this share of free flow are clamped, so closed or
+# stop-and-go edges get a large but finite duration
+MIN_SPEED_RATIO = 0.05
+
+# Flow coordinates farther than this from every graph node are ignored
+MAX_MATCH_DISTANCE_M = 50.0
+
+# Points snapped per block, bounding the points x nodes distance matrix
+MATCH_BLOCK = 512
+
+METERS_PER_DEGREE = 111_320.0
+
+def tile_bbox(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a Web Mercator (slippy map) tile."""
+    n = 2 ** z
+    west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+def tiles_covering(south: float, west: float, north: float, east: float, zoom: int) -> List[Tuple[int, int, int]]:
+    """(z, x, y) of every tile at ``zoom`` intersecting a bounding box."""
+    n = 2 ** zoom
+
+    def tile_x(lon: float) -> int:
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def tile_y(lat: float) -> int:
+        lat = math.radians(max(min(lat, 85.0511), -85.0511))
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)))
+
+    return [
+        (zoom, x, y)
+        for x in range(tile_x(west), tile_x(east) + 1)
+        for y in range(tile_y(north), tile_y(south) + 1)
+    ]
+
+class LiveArrays(NamedTuple):
+    """Per-edge live traffic at one point in time, valid until a reading ages out."""
+    version: int
+    computed_at: float
+    valid_until: float
+    has_live_data: bool
+    durations: np.ndarray
+    congestion: np.ndarray
+
+class EdgeTraffic:
+    """
+    Live traffic for a road graph as per-edge arrays indexed by edge id.
+
+    ``speed_ratio`` is current over free-flow speed (1 = free flow) and
+    ``updated`` the time each edge was last observed. Readings older than
+    ``max_age_seconds`` fall back to free flow.
+
+    Flow tiles hold polylines with a current and a free-flow speed::
+
+        {"segments": [{"currentSpeed": 18, "freeFlowSpeed": 45,
+                       "coordinates": [{"latitude": .., "longitude": ..}, ..]}]}
+
+    Each polyline point is snapped to its nearest graph node, and every
+    consecutive pair of distinct nodes joined by a graph edge takes the
+    segment's speed ratio.
+
+    The per-edge arrays served to routing (``live_durations``,
+    ``congestion``) are computed once and reused, read-only, until a tile
+    is ingested or a fresh reading ages out.
+    """
+
+    def __init__(self, graph: RoadGraph, max_age_seconds: float = 900.0):
+        self.graph = graph
+        self.max_age_seconds = max_age_seconds
+        self.speed_ratio = np.ones(graph.edge_count, dtype=np.float32)
+        self.updated = np.zeros(graph.edge_count, dtype=np.float64)  # epoch seconds, 0 = never
+        self._edge_keys: Optional[np.ndarray] = None
+        self._edge_order: Optional[np.ndarray] = None
+        self.version = 0  # bumped on every ingest
+        self._live: Optional[LiveArrays] = None
+
+    def _find_edges(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """Edge id of ``u -> v`` for each pair, or -1 where there is none."""
+        graph = self.graph
+        if self._edge_keys is None:
+            keys = graph.sources.astype(np.int64) * graph.node_count + graph.targets
+            self._edge_order = np.argsort(keys, kind="stable")
+            self._edge_keys = keys[self._edge_order]
+        wanted = u.astype(np.int64) * graph.node_count + v
+        found = np.minimum(np.searchsorted(self._edge_keys, wanted), len(self._edge_keys) - 1)
+        hit = self._edge_keys[found] == wanted if len(self._edge_keys) else np.zeros(len(wanted), dtype=bool)
+        return np.where(hit, self._edge_order[found], -1)
+
+    def _snap(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Nearest node to each point, or -1 beyond ``MAX_MATCH_DISTANCE_M``."""
+        graph = self.graph
+        margin = MAX_MATCH_DISTANCE_M / METERS_PER_DEGREE * 2
+        cos_lat = max(math.cos(math.radians(float(np.mean(lat)))), 1e-6)
+        candidates = np.flatnonzero(
+            (graph.lat >= lat.min() - margin) & (graph.lat <= lat.max() + margin)
+            & (graph.lon >= lon.min() - margin / cos_lat) & (graph.lon <= lon.max() + margin / cos_lat)
+        )
+        nodes = np.full(len(lat), -1, dtype=np.int64)
+        if len(candidates) == 0:
+            return nodes
+
+        # Nearest by equirectangular distance, which is exact enough at tile scale
+        node_y = graph.lat[candidates] * METERS_PER_DEGREE
+        node_x = graph.lon[candidates] * METERS_PER_DEGREE * cos_lat
+        for start in range(0, len(lat), MATCH_BLOCK):
+            y = lat[start:start + MATCH_BLOCK, None] * METERS_PER_DEGREE
+            x = lon[start:start + MATCH_BLOCK, None] * METERS_PER_DEGREE * cos_lat
+            nearest = candidates[np.argmin((y - node_y) ** 2 + (x - node_x) ** 2, axis=1)]
+            distance = haversine_m(
+                lat[start:start + MATCH_BLOCK], lon[start:start + MATCH_BLOCK],
+                graph.lat[nearest], graph.lon[nearest]
+            )
+            nodes[start:start + MATCH_BLOCK] = np.where(distance <= MAX_MATCH_DISTANCE_M, nearest, -1)
+        return nodes
+
+    def decode_tile(self, tile: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """(edge ids, speed ratios) observed in a flow tile."""
+        lat, lon, segment, ratios = [], [], [], []
+        for segment_id, flow in enumerate(tile.get("segments", [])):
+            free_flow = flow.get("freeFlowSpeed") or 0
+            if free_flow <= 0:
+                continue
+            ratios.append(flow.get("currentSpeed", free_flow) / free_flow)
+            for point in flow.get("coordinates", []):
+                lat.append(point["latitude"])
+                lon.append(point["longitude"])
+                segment.append(len(ratios) - 1)
+        if len(lat) < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        nodes = self._snap(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+        segment = np.asarray(segment)
+        u, v = nodes[:-1], nodes[1:]
+        pairs = (segment[:-1] == segment[1:]) & (u >= 0) & (v >= 0) & (u != v)
+        edges = self._find_edges(u[pairs], v[pairs])
+        matched = edges >= 0
+        ratios = np.clip(np.asarray(ratios, dtype=np.float32), MIN_SPEED_RATIO, 1.0)
+        return edges[matched], ratios[segment[:-1][pairs][matched]]
+
+    def ingest_tile(self, tile: Dict[str, Any], now: Optional[float] = None) -> int:
+        """
+        Apply a flow tile observed at ``now`` (epoch seconds, default the
+        current time); returns the number of edges updated. Edges with a
+        newer reading from another tile keep it.
+        """
+        now = time.time() if now is None else now
+        edges, ratios = self.decode_tile(tile)
+        if len(edges) == 0:
+            return 0
+        # An edge covered by several segments keeps the slowest reading
+        observed = np.ones(self.graph.edge_count, dtype=np.float32)
+        np.minimum.at(observed, edges, ratios)
+        edges = np.unique(edges)
+        edges = edges[self.updated[edges] <= now]
+        self.speed_ratio[edges] = observed[edges]
+        self.updated[edges] = now
+        self.version += 1
+        return len(edges)
+
+    def _current(self, now: Optional[float]) -> LiveArrays:
+        """The live arrays at ``now``, recomputed only when they changed since the last call."""
+        now = time.time() if now is None else now
+        live = self._live
+        if live is not None and live.version == self.version and live.computed_at <= now <= live.valid_until:
+            return live
+
+        fresh = now - self.updated <= self.max_age_seconds
+        ratio = np.where(fresh, self.speed_ratio, 1.0)
+        durations = (self.graph.durations / ratio).astype(np.float32)
+        congestion = (1.0 - ratio).astype(np.float32)
+        durations.flags.writeable = congestion.flags.writeable = False
+        # Valid until the oldest fresh reading ages out
+        valid_until = float(self.updated[fresh].min()) + self.max_age_seconds if fresh.any() else np.inf
+        self._live = LiveArrays(self.version, now, valid_until, bool(np.any(ratio < 1.0)), durations, congestion)
+        return self._live
+
+    def has_live_data(self, now: Optional[float] = None) -> bool:
+        return self._current(now).has_live_data
+
+    def congestion(self, now: Optional[float] = None) -> np.ndarray:
+        """Per-edge congestion in [0, 1): 0 at free flow or without a fresh reading (read-only)."""
+        return self._current(now).congestion
+
+    def live_durations(self, now: Optional[float] = None) -> np.ndarray:
+        """Edge durations (seconds) at the observed speeds (read-only)."""
+        return self._current(now).durations
+
+_edge_traffic: Optional[EdgeTraffic] = None
+
+def get_edge_traffic() -> EdgeTraffic:
+    """Live traffic arrays for the road graph (created once per process)."""
+    global _edge_traffic
+    if _edge_traffic is None:
+        from app.core.settings import settings
+        from .graph import get_road_graph
+
+        _edge_traffic = EdgeTraffic(get_road_graph(), settings.LIVE_TRAFFIC_MAX_AGE)
+    return _edge_traffic
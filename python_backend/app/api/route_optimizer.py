@@ -2,6 +2,9 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 import uuid
 from persistence.db_handler import db
+from app.api.route_engine.contraction import get_contraction_hierarchy
+from app.api.route_engine.graph import get_road_graph
+from app.api.route_engine.search import route_through
 
 class RouteOptimizer:
     """Handles route optimization logic."""
@@ -16,8 +19,16 @@ class RouteOptimizer:
         waypoints: Optional[List[Dict[str, float]]] = None
     ) -> Dict[str, Any]:
         """Optimize a route based on given parameters."""
-        # For now, we'll return a simple route
-        # In a real implementation, this would use OR-Tools and external APIs
+        graph = get_road_graph()
+        points = [start_location, *(waypoints or []), end_location]
+        path = route_through(
+            graph,
+            [(p["lat"], p["lon"]) for p in points],
+            hierarchy=get_contraction_hierarchy()
+        )
+        if path is None:
+            raise ValueError("No route found between the requested locations")
+        
         route_id = str(uuid.uuid4())
         
         route = {
@@ -28,8 +39,9 @@ class RouteOptimizer:
             "vehicle_id": vehicle_id,
             "load_weight": load_weight,
             "departure_time": departure_time,
-            "total_distance": 50.0,  # Example value in km
-            "total_duration": 3600,  # Example value in seconds
+            "total_distance": float(graph.distances[path.edges].sum()) / 1000,  # km
+            "total_duration": float(graph.durations[path.edges].sum()),  # seconds
+            "path_nodes": path.nodes,
             "created_at": datetime.utcnow()
         }
         
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from app.services.emissions_calculator import EmissionsCalculator
 
 router = APIRouter(
     prefix="/api/vehicles",
@@ -135,3 +136,40 @@ async def estimate_emissions(
         fuel_consumption=fuel_consumption,
         route_efficiency_score=efficiency_score
     )
+
+class BatchEmissionsRequest(BaseModel):
+    """Column-oriented route legs; optional columns default to no impact."""
+    distance: List[float]  # km
+    vehicle_type: List[str]  # EmissionsCalculator emission factor keys
+    temperature: Optional[List[float]] = None  # Celsius
+    rain: Optional[List[float]] = None  # mm
+    snow: Optional[List[float]] = None  # mm
+    congestion_level: Optional[List[float]] = None  # 0-100
+    gradient: Optional[List[float]] = None  # degrees
+    load_ratio: Optional[List[float]] = None  # cargo weight / capacity
+
+class BatchEmissionEstimate(BaseModel):
+    total_emissions_kg: List[float]
+    base_emissions_kg: List[float]
+    weather_factor: List[float]
+    traffic_factor: List[float]
+    weight_factor: List[float]
+    gradient_factor: List[float]
+    batch_total_emissions_kg: float
+
+@router.post("/estimate-emissions/batch")
+async def estimate_emissions_batch(batch: BatchEmissionsRequest) -> BatchEmissionEstimate:
+    """
+    Estimate emissions for many route legs at once with the vectorized
+    ``EmissionsCalculator.calculate_batch``. Every provided column must have
+    one entry per leg.
+    """
+    try:
+        results = EmissionsCalculator().calculate_batch(**batch.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return BatchEmissionEstimate(
+        **{name: values.tolist() for name, values in results.items()},
+        batch_total_emissions_kg=float(results["total_emissions_kg"].sum())
+    )
@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     
     # Redis settings
     REDIS_URL: str
+    CACHE_L1_MAX_ENTRIES: int = 10000  # per-worker in-process cache size
+    CACHE_GEOHASH_PRECISION: int = 6  # ~1.2 x 0.6 km cells for environmental keys
+    CACHE_SERIALIZER: str = "msgpack"  # msgpack, orjson or json
+    CACHE_COMPRESSION: str = "zlib"  # zlib, zstd, lz4 or none (zstd/lz4 need their optional package)
+    CACHE_COMPRESS_THRESHOLD: int = 1024  # bytes; smaller values are stored uncompressed
     
     # API Keys
     TOMTOM_API_KEY: str
@@ -20,8 +25,56 @@ class Settings(BaseSettings):
     OPENWEATHER_BASE_URL: str = "https://api.openweathermap.org/data/2.5"
     AQICN_BASE_URL: str = "https://api.waqi.info"
     
+    # Shared HTTP client for data collectors
+    HTTP_CLIENT_HTTP2: bool = True  # used when the h2 package is installed
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    COLLECTOR_TIMEOUT: float = 5.0  # seconds, per source
+    
+    # Upstream request budgets (requests per second, shared by all workers)
+    TOMTOM_RATE_LIMIT: float = 5.0
+    OPENWEATHER_RATE_LIMIT: float = 1.0
+    AQICN_RATE_LIMIT: float = 1.0
+    UPSTREAM_BURST_SECONDS: float = 10.0  # bucket size, in seconds of refill
+    
+    # Upstream circuit breakers
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures before opening
+    CIRCUIT_LATENCY_THRESHOLD: float = 2.0  # seconds; slower calls count as failures
+    CIRCUIT_RESET_TIMEOUT: float = 30.0  # seconds open before a probe call
+    
+    # Background prefetch of environmental data for active areas
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_ROUTE_LIMIT: int = 500  # most recent routes whose cells are kept warm
+    PREFETCH_MAX_CELLS: int = 2000
+    PREFETCH_CONCURRENCY: int = 8
+    PREFETCH_REFRESH_FRACTION: float = 0.8  # of each data type's cache TTL
+    
+    # Request metrics, written to Mongo in batches
+    METRICS_BATCH_SIZE: int = 500
+    METRICS_FLUSH_INTERVAL: float = 1.0  # seconds a record may wait for its batch
+    METRICS_QUEUE_SIZE: int = 10000  # records buffered before new ones are dropped
+    METRICS_MAX_IN_FLIGHT: int = 10000  # started requests remembered per collector
+    METRICS_MULTIPROC_DIR: Optional[str] = None  # per-worker snapshots merged on scrape
+    METRICS_SNAPSHOT_INTERVAL: float = 5.0  # seconds between snapshot writes
+    METRICS_RETENTION_DAYS: float = 30  # request metrics expire after this
+    ERRORS_RETENTION_DAYS: float = 90  # error events expire after this
+    ERROR_SAMPLES_PER_STATUS: int = 10  # most recent messages returned per status code
+    FEEDBACK_ANALYTICS_CACHE_TTL: float = 300.0  # seconds; 0 disables caching
+    
     # Security
     SECRET_KEY: str
+    API_KEY: Optional[str] = None  # documented in the README and set in .env
+    
+    # Route engine
+    ROAD_GRAPH_PATH: str = "data/road_graph.npz"
+    ROAD_CH_PATH: Optional[str] = "data/road_graph.ch.npz"
+    FLEET_SOLVER_WORKERS: int = 2
+    FLEET_SOLVER_TIME_LIMIT: int = 10  # seconds
+    LIVE_TRAFFIC_ROUTING: bool = True  # route on live edge speeds when fresh
+    LIVE_TRAFFIC_MAX_AGE: float = 900.0  # seconds before an edge reading falls back to free flow
+    LIVE_TRAFFIC_CH_TOLERANCE: float = 0.05  # keep the CH route while its live time is within this share of optimal
+    TRAFFIC_TILE_ZOOM: int = 12  # flow tiles of ~10 km across
     
     # Application Settings
     DEBUG: bool = False
@@ -1,16 +1,60 @@
-from typing import Any, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import asyncio
 import json
+import time
+import uuid
 from datetime import datetime, timedelta
 import aioredis
-from config.settings import Settings
+from app.core.settings import Settings
+from app.db.codec import CacheCodec
+from app.db.geocells import cell_count, cells_covering, geohash_encode
+from app.db.local_cache import LocalCache
+
+# Pub/sub channel that tells every worker to drop keys from its L1 cache
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# L1 entries live for a fraction of the Redis TTL, capped, so a worker that
+# misses an invalidation message serves stale data only briefly
+L1_TTL_FRACTION = 0.25
+L1_MAX_TTL = timedelta(minutes=10)
+
+# Above this many cells an area invalidation falls back to the coarse index
+MAX_AREA_CELLS = 256
+
+# Keys deleted per DEL call when clearing by pattern
+CLEAR_BATCH_SIZE = 500
+
+# Cross-worker refresh lock: how long it is held at most, and how often a
+# worker waiting on another worker's refresh checks for the new value
+REFRESH_LOCK_TIMEOUT = timedelta(seconds=10)
+REFRESH_POLL_INTERVAL = 0.05
+
+# Deletes the refresh lock only if it still holds this worker's token, in
+# one step, so a lock that expired and was taken by another worker is kept
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
 class CacheManager:
     def __init__(self, settings: Settings):
-        self.redis = aioredis.from_url(
-            settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True
+        # Values are binary (see CacheCodec), so responses are not decoded
+        self.redis = aioredis.from_url(settings.REDIS_URL)
+        self.codec = CacheCodec(
+            settings.CACHE_SERIALIZER,
+            settings.CACHE_COMPRESSION,
+            settings.CACHE_COMPRESS_THRESHOLD
         )
+        self.instance_id = uuid.uuid4().hex
+        self.local = LocalCache(settings.CACHE_L1_MAX_ENTRIES)
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "l1": {"hits": 0, "misses": 0},
+            "l2": {"hits": 0, "misses": 0}
+        }
         
         # Default TTLs for different types of data
         self.ttls = {
@@ -22,17 +66,127 @@ class CacheManager:
             "vehicle": timedelta(hours=12),
             "ml_prediction": timedelta(minutes=10)
         }
+        
+        # Stale-while-revalidate: for these types ``ttls`` is the soft TTL
+        # (fresh) and entries are kept this much longer in Redis (hard TTL)
+        # so get_or_refresh can serve them stale while one task refreshes.
+        # Plain getters treat entries past the soft TTL as misses.
+        self.stale_ttls = {
+            "weather": timedelta(minutes=30),
+            "traffic": timedelta(minutes=5),
+            "air_quality": timedelta(minutes=15)
+        }
+        
+        # Environmental keys are grouped into geohash cells. Each key is listed
+        # in the index of its fine cell and of the enclosing coarse cell (the
+        # same geohash, two characters shorter) so area invalidation deletes
+        # a bounded number of cells without scanning the keyspace. Indexes
+        # are sorted sets scored by each key's expiry time, so members whose
+        # key has expired are trimmed on every write and skipped on reads.
+        self.geohash_precision = settings.CACHE_GEOHASH_PRECISION
+        self.coarse_precision = max(1, self.geohash_precision - 2)
+        self.cell_index_ttl = max(
+            self._storage_ttl(data_type) for data_type in ("route", "weather", "traffic", "air_quality")
+        )
+        
+        # In-process (L1) TTLs per data type; untyped keys skip L1
+        self.local_ttls = {
+            data_type: min(ttl * L1_TTL_FRACTION, L1_MAX_TTL)
+            for data_type, ttl in self.ttls.items()
+        }
+    
+    async def start(self):
+        """Start listening for L1 invalidations published by other workers."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+    
+    async def close(self):
+        """Stop the invalidation listener and close the Redis connection."""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.redis.close()
+    
+    async def _listen_for_invalidations(self):
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self._apply_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+        finally:
+            await pubsub.close()
+    
+    def _apply_invalidation(self, data: str):
+        """Drop L1 entries named by an invalidation message from another worker."""
+        message = json.loads(data)
+        if message.get("origin") == self.instance_id:
+            return
+        if "key" in message:
+            self.local.delete(message["key"])
+        elif "keys" in message:
+            for key in message["keys"]:
+                self.local.delete(key)
+        else:
+            self.local.delete_pattern(message["pattern"])
+    
+    async def _publish_invalidation(
+        self,
+        key: Optional[str] = None,
+        pattern: Optional[str] = None,
+        keys: Optional[List[str]] = None
+    ):
+        message = {"origin": self.instance_id}
+        if key is not None:
+            message["key"] = key
+        elif keys is not None:
+            message["keys"] = keys
+        else:
+            message["pattern"] = pattern
+        try:
+            await self.redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            print(f"Cache invalidation publish error: {e}")
     
     async def get(
         self,
         key: str,
-        data_type: str = None
+        data_type: str = None,
+        allow_stale: bool = False
     ) -> Optional[Union[dict, list, str, int, float]]:
-        """Get value from cache."""
+        """
+        Get value from cache, trying the in-process tier before Redis.
+        Entries past their soft TTL (see ``stale_ttls``) are misses unless
+        ``allow_stale``, e.g. for a last known value when a provider is down.
+        """
+        local_ttl = self.local_ttls.get(data_type)
+        if local_ttl is not None:
+            hit, value = self.local.get(key)
+            if hit:
+                self.stats["l1"]["hits"] += 1
+                return self.codec.decode(value)
+            self.stats["l1"]["misses"] += 1
+        
         try:
-            value = await self.redis.get(key)
-            if value:
-                return json.loads(value)
+            if data_type in self.stale_ttls:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                    value, remaining_ms = await pipe.execute()
+            else:
+                value, remaining_ms = await self.redis.get(key), -1
+            fresh_seconds = self._fresh_seconds(data_type, remaining_ms)
+            fresh = fresh_seconds is None or fresh_seconds > 0
+            if value and (fresh or allow_stale):
+                self.stats["l2"]["hits"] += 1
+                if local_ttl is not None and fresh:
+                    self.local.set(key, value, self._local_seconds(local_ttl, fresh_seconds))
+                return self.codec.decode(value)
+            self.stats["l2"]["misses"] += 1
             return None
         except Exception as e:
             print(f"Cache get error: {e}")
@@ -43,44 +197,302 @@ class CacheManager:
         key: str,
         value: Union[dict, list, str, int, float],
         data_type: str = None,
-        ttl: Optional[timedelta] = None
+        ttl: Optional[timedelta] = None,
+        cell_indexes: Sequence[str] = ()
     ):
-        """Set value in cache with optional TTL."""
+        """Set value in cache with optional TTL, listing it in the given cell indexes."""
         try:
             # Use type-specific TTL if not provided
-            if ttl is None and data_type in self.ttls:
-                ttl = self.ttls[data_type]
+            if ttl is None:
+                ttl = self._storage_ttl(data_type)
             
-            # Convert value to JSON string
-            json_value = json.dumps(value)
+            data = self.codec.encode(value)
+            
+            if cell_indexes:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    if ttl:
+                        pipe.set(key, data, ex=int(ttl.total_seconds()))
+                    else:
+                        pipe.set(key, data)
+                    self._add_to_cell_indexes(pipe, {key: cell_indexes}, {key: ttl})
+                    await pipe.execute()
+            elif ttl:
+                await self.redis.set(key, data, ex=int(ttl.total_seconds()))
+            else:
+                await self.redis.set(key, data)
             
-            if ttl:
-                await self.redis.set(key, json_value, ex=int(ttl.total_seconds()))
+            local_ttl = self.local_ttls.get(data_type)
+            if local_ttl is not None:
+                self.local.set(key, data, local_ttl.total_seconds())
             else:
-                await self.redis.set(key, json_value)
+                self.local.delete(key)
+            await self._publish_invalidation(key=key)
         except Exception as e:
             print(f"Cache set error: {e}")
     
+    def _storage_ttl(self, data_type: Optional[str]) -> Optional[timedelta]:
+        """Redis TTL for a data type: its TTL plus any stale-while-revalidate window."""
+        if data_type not in self.ttls:
+            return None
+        return self.ttls[data_type] + self.stale_ttls.get(data_type, timedelta(0))
+    
+    def _fresh_seconds(self, data_type: Optional[str], remaining_ms: int) -> Optional[float]:
+        """
+        Seconds until an entry with ``remaining_ms`` left in Redis passes its
+        soft TTL (zero or less once stale); None when it does not expire.
+        """
+        if remaining_ms < 0:
+            return None
+        return remaining_ms / 1000 - self.stale_ttls.get(data_type, timedelta(0)).total_seconds()
+    
+    @staticmethod
+    def _local_seconds(local_ttl: timedelta, fresh_seconds: Optional[float]) -> float:
+        """L1 TTL for an entry, never past its soft TTL."""
+        if fresh_seconds is None:
+            return local_ttl.total_seconds()
+        return min(local_ttl.total_seconds(), fresh_seconds)
+    
+    async def get_or_refresh(
+        self,
+        key: str,
+        data_type: str,
+        loader: Callable[[], Awaitable[Any]],
+        cell_indexes: Sequence[str] = ()
+    ) -> Any:
+        """
+        Get a value, loading it on a miss, with stampede protection.
+        
+        Fresh values are returned as is. Values past their soft TTL but
+        within the stale window are returned immediately while a background
+        task refreshes them. Concurrent misses on one key share a single
+        load in this worker, and a short Redis lock lets only one worker
+        call ``loader`` while the others wait for its result.
+        """
+        local_ttl = self.local_ttls.get(data_type)
+        if local_ttl is not None:
+            hit, value = self.local.get(key)
+            if hit:
+                self.stats["l1"]["hits"] += 1
+                return self.codec.decode(value)
+            self.stats["l1"]["misses"] += 1
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, remaining_ms = await pipe.execute()
+        except Exception as e:
+            print(f"Cache get error: {e}")
+            value, remaining_ms = None, -2
+        
+        if value:
+            self.stats["l2"]["hits"] += 1
+            fresh_seconds = self._fresh_seconds(data_type, remaining_ms)
+            if fresh_seconds is None or fresh_seconds > 0:
+                if local_ttl is not None:
+                    self.local.set(key, value, self._local_seconds(local_ttl, fresh_seconds))
+                return self.codec.decode(value)
+            # Stale: serve it now, refresh once in the background
+            self._single_flight(key, data_type, loader, cell_indexes, wait_for_peer=False)
+            return self.codec.decode(value)
+        
+        self.stats["l2"]["misses"] += 1
+        return await asyncio.shield(
+            self._single_flight(key, data_type, loader, cell_indexes, wait_for_peer=True)
+        )
+    
+    def _single_flight(
+        self,
+        key: str,
+        data_type: str,
+        loader: Callable[[], Awaitable[Any]],
+        cell_indexes: Sequence[str],
+        wait_for_peer: bool
+    ) -> asyncio.Task:
+        """The in-flight refresh task for a key, starting one if needed."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._refresh(key, data_type, loader, cell_indexes, wait_for_peer)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            if not wait_for_peer:
+                # Nobody awaits background refreshes; report their failures here
+                task.add_done_callback(self._log_refresh_failure)
+        return task
+    
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Cache refresh error: {task.exception()}")
+    
+    async def _refresh(
+        self,
+        key: str,
+        data_type: str,
+        loader: Callable[[], Awaitable[Any]],
+        cell_indexes: Sequence[str],
+        wait_for_peer: bool
+    ) -> Any:
+        """Load and store a value while holding the key's cross-worker lock."""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex.encode()
+        timeout_ms = int(REFRESH_LOCK_TIMEOUT.total_seconds() * 1000)
+        try:
+            acquired = await self.redis.set(lock_key, token, nx=True, px=timeout_ms)
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            acquired = True  # Redis unavailable: load without coordination
+        
+        if not acquired:
+            if not wait_for_peer:
+                return None  # another worker is refreshing the stale value
+            # Wait for the lock holder to store the value, then fall back to loading
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + REFRESH_LOCK_TIMEOUT.total_seconds()
+            while loop.time() < deadline:
+                await asyncio.sleep(REFRESH_POLL_INTERVAL)
+                value = await self.redis.get(key)
+                if value:
+                    return self.codec.decode(value)
+        
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, data_type, cell_indexes=cell_indexes)
+            return value
+        finally:
+            if acquired:
+                try:
+                    await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    print(f"Cache unlock error: {e}")
+    
+    async def get_many(
+        self,
+        keys: Sequence[str],
+        data_type: str = None
+    ) -> List[Optional[Union[dict, list, str, int, float]]]:
+        """
+        Get several values (None for misses) with one round trip for the keys
+        not in L1: an MGET, or GET/PTTL pairs for types with a stale window,
+        whose entries past the soft TTL are misses as in ``get``.
+        """
+        local_ttl = self.local_ttls.get(data_type)
+        values: List[Any] = [None] * len(keys)
+        remote: List[int] = []
+        for i, key in enumerate(keys):
+            if local_ttl is not None:
+                hit, value = self.local.get(key)
+                if hit:
+                    self.stats["l1"]["hits"] += 1
+                    values[i] = self.codec.decode(value)
+                    continue
+                self.stats["l1"]["misses"] += 1
+            remote.append(i)
+        
+        if not remote:
+            return values
+        try:
+            if data_type in self.stale_ttls:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for i in remote:
+                        pipe.get(keys[i])
+                        pipe.pttl(keys[i])
+                    results = await pipe.execute()
+                fetched, remaining = results[::2], results[1::2]
+            else:
+                fetched = await self.redis.mget([keys[i] for i in remote])
+                remaining = [-1] * len(remote)
+        except Exception as e:
+            print(f"Cache get many error: {e}")
+            return values
+        for i, value, remaining_ms in zip(remote, fetched, remaining):
+            fresh_seconds = self._fresh_seconds(data_type, remaining_ms)
+            if value and (fresh_seconds is None or fresh_seconds > 0):
+                self.stats["l2"]["hits"] += 1
+                if local_ttl is not None:
+                    self.local.set(keys[i], value, self._local_seconds(local_ttl, fresh_seconds))
+                values[i] = self.codec.decode(value)
+            else:
+                self.stats["l2"]["misses"] += 1
+        return values
+    
+    async def set_many(
+        self,
+        items: Dict[str, Union[dict, list, str, int, float]],
+        data_type: str = None,
+        ttl: Optional[timedelta] = None,
+        key_ttls: Optional[Dict[str, timedelta]] = None,
+        key_cell_indexes: Optional[Dict[str, Sequence[str]]] = None
+    ):
+        """
+        Set several values in one pipelined round trip. Each key uses its
+        entry in ``key_ttls``, else ``ttl``, else the data type's TTL, and
+        is listed in its ``key_cell_indexes``.
+        """
+        if not items:
+            return
+        if ttl is None:
+            ttl = self._storage_ttl(data_type)
+        key_ttls = key_ttls or {}
+        local_ttl = self.local_ttls.get(data_type)
+        try:
+            encoded = {key: self.codec.encode(value) for key, value in items.items()}
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    key_ttl = key_ttls.get(key, ttl)
+                    if key_ttl:
+                        pipe.setex(key, int(key_ttl.total_seconds()), data)
+                    else:
+                        pipe.set(key, data)
+                if key_cell_indexes:
+                    self._add_to_cell_indexes(
+                        pipe, key_cell_indexes, {key: key_ttls.get(key, ttl) for key in key_cell_indexes}
+                    )
+                await pipe.execute()
+            
+            for key, data in encoded.items():
+                if local_ttl is not None:
+                    self.local.set(key, data, local_ttl.total_seconds())
+                else:
+                    self.local.delete(key)
+            await self._publish_invalidation(keys=list(encoded))
+        except Exception as e:
+            print(f"Cache set many error: {e}")
+    
     async def delete(self, key: str):
         """Delete value from cache."""
+        self.local.delete(key)
         try:
             await self.redis.delete(key)
+            await self._publish_invalidation(key=key)
         except Exception as e:
             print(f"Cache delete error: {e}")
     
     async def clear_pattern(self, pattern: str):
-        """Clear all keys matching pattern."""
+        """
+        Clear all keys matching pattern. Uses incremental SCAN rather than
+        KEYS so a large keyspace never blocks Redis.
+        """
+        self.local.delete_pattern(pattern)
         try:
-            keys = await self.redis.keys(pattern)
-            if keys:
-                await self.redis.delete(*keys)
+            batch = []
+            async for key in self.redis.scan_iter(match=pattern, count=CLEAR_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= CLEAR_BATCH_SIZE:
+                    await self.redis.delete(*batch)
+                    batch = []
+            if batch:
+                await self.redis.delete(*batch)
+            await self._publish_invalidation(pattern=pattern)
         except Exception as e:
             print(f"Cache clear pattern error: {e}")
     
     async def get_route_cache(self, start_point: tuple, end_point: tuple) -> Optional[dict]:
         """Get cached route data."""
-        key = f"route:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
-        return await self.get(key, "route")
+        return await self.get(self._route_key(start_point, end_point), "route")
     
     async def set_route_cache(
         self,
@@ -89,23 +501,107 @@ class CacheManager:
         route_data: dict
     ):
         """Cache route data."""
-        key = f"route:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
-        await self.set(key, route_data, "route")
+        await self.set(
+            self._route_key(start_point, end_point),
+            route_data,
+            "route",
+            cell_indexes=self._cell_indexes(start_point[:2], end_point[:2])
+        )
+    
+    @staticmethod
+    def _route_key(start_point: tuple, end_point: tuple) -> str:
+        # Routes stay keyed by their exact end points; only the index is per cell
+        return f"route:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
+    
+    def _cell(self, lat: float, lon: float) -> str:
+        return geohash_encode(lat, lon, self.geohash_precision)
+    
+    @staticmethod
+    def _cell_index_key(cell: str) -> str:
+        return f"cells:{cell}"
     
-    async def get_weather_cache(self, lat: float, lon: float) -> Optional[dict]:
+    def _cell_indexes(self, *points: tuple) -> List[str]:
+        """Fine and coarse cell index keys covering the given (lat, lon) points."""
+        indexes = []
+        for lat, lon in points:
+            cell = self._cell(lat, lon)
+            for index in (self._cell_index_key(cell), self._cell_index_key(cell[:self.coarse_precision])):
+                if index not in indexes:
+                    indexes.append(index)
+        return indexes
+    
+    def _add_to_cell_indexes(
+        self,
+        pipe,
+        key_cell_indexes: Dict[str, Sequence[str]],
+        key_ttls: Dict[str, Optional[timedelta]]
+    ):
+        """
+        Queue commands listing keys in their cell indexes, scored by when
+        each key expires, and dropping members that have already expired.
+        """
+        now = time.time()
+        members: Dict[str, Dict[str, float]] = {}
+        for key, indexes in key_cell_indexes.items():
+            ttl = key_ttls.get(key)
+            expires_at = now + ttl.total_seconds() if ttl else float("inf")
+            for index in indexes:
+                members.setdefault(index, {})[key] = expires_at
+        for index, scores in members.items():
+            pipe.zremrangebyscore(index, "-inf", now)
+            pipe.zadd(index, scores)
+            pipe.expire(index, int(self.cell_index_ttl.total_seconds()))
+    
+    def _weather_key(self, lat: float, lon: float) -> str:
+        return f"weather:{self._cell(lat, lon)}"
+    
+    def _air_quality_key(self, lat: float, lon: float) -> str:
+        return f"aqi:{self._cell(lat, lon)}"
+    
+    def _traffic_key(self, start_point: tuple, end_point: tuple) -> str:
+        return f"traffic:{self._cell(*start_point[:2])}:{self._cell(*end_point[:2])}"
+    
+    async def get_weather_cache(self, lat: float, lon: float, allow_stale: bool = False) -> Optional[dict]:
         """Get cached weather data."""
-        key = f"weather:{lat},{lon}"
-        return await self.get(key, "weather")
+        return await self.get(self._weather_key(lat, lon), "weather", allow_stale)
     
     async def set_weather_cache(self, lat: float, lon: float, weather_data: dict):
         """Cache weather data."""
-        key = f"weather:{lat},{lon}"
-        await self.set(key, weather_data, "weather")
+        await self.set(
+            self._weather_key(lat, lon), weather_data, "weather", cell_indexes=self._cell_indexes((lat, lon))
+        )
     
-    async def get_traffic_cache(self, start_point: tuple, end_point: tuple) -> Optional[dict]:
+    async def get_weather_or_refresh(
+        self,
+        lat: float,
+        lon: float,
+        loader: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        """Get weather data, calling ``loader`` at most once on a miss or stale entry."""
+        return await self.get_or_refresh(
+            self._weather_key(lat, lon), "weather", loader, self._cell_indexes((lat, lon))
+        )
+    
+    async def get_weather_cache_bulk(self, points: Sequence[Tuple[float, float]]) -> List[Optional[dict]]:
+        """Get cached weather data for many (lat, lon) points in one round trip."""
+        return await self.get_many([self._weather_key(lat, lon) for lat, lon in points], "weather")
+    
+    async def set_weather_cache_bulk(self, points: Sequence[Tuple[float, float]], weather_data: Sequence[dict]):
+        """Cache weather data for many (lat, lon) points in one round trip."""
+        await self.set_many(
+            {self._weather_key(lat, lon): data for (lat, lon), data in zip(points, weather_data)},
+            "weather",
+            key_cell_indexes={self._weather_key(lat, lon): self._cell_indexes((lat, lon)) for lat, lon in points}
+        )
+    
+    async def get_traffic_cache(
+        self,
+        start_point: tuple,
+        end_point: tuple,
+        allow_stale: bool = False
+    ) -> Optional[dict]:
         """Get cached traffic data."""
-        key = f"traffic:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
-        return await self.get(key, "traffic")
+        return await self.get(self._traffic_key(start_point, end_point), "traffic", allow_stale)
     
     async def set_traffic_cache(
         self,
@@ -114,18 +610,80 @@ class CacheManager:
         traffic_data: dict
     ):
         """Cache traffic data."""
-        key = f"traffic:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
-        await self.set(key, traffic_data, "traffic")
+        await self.set(
+            self._traffic_key(start_point, end_point),
+            traffic_data,
+            "traffic",
+            cell_indexes=self._cell_indexes(start_point[:2], end_point[:2])
+        )
+    
+    async def get_traffic_or_refresh(
+        self,
+        start_point: tuple,
+        end_point: tuple,
+        loader: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        """Get traffic data, calling ``loader`` at most once on a miss or stale entry."""
+        return await self.get_or_refresh(
+            self._traffic_key(start_point, end_point),
+            "traffic",
+            loader,
+            self._cell_indexes(start_point[:2], end_point[:2])
+        )
+    
+    async def get_traffic_cache_bulk(self, segments: Sequence[Tuple[tuple, tuple]]) -> List[Optional[dict]]:
+        """Get cached traffic data for many (start_point, end_point) segments in one round trip."""
+        return await self.get_many(
+            [self._traffic_key(start, end) for start, end in segments], "traffic"
+        )
     
-    async def get_air_quality_cache(self, lat: float, lon: float) -> Optional[dict]:
+    async def set_traffic_cache_bulk(self, segments: Sequence[Tuple[tuple, tuple]], traffic_data: Sequence[dict]):
+        """Cache traffic data for many (start_point, end_point) segments in one round trip."""
+        await self.set_many(
+            {self._traffic_key(start, end): data for (start, end), data in zip(segments, traffic_data)},
+            "traffic",
+            key_cell_indexes={
+                self._traffic_key(start, end): self._cell_indexes(start[:2], end[:2])
+                for start, end in segments
+            }
+        )
+    
+    async def get_air_quality_cache(self, lat: float, lon: float, allow_stale: bool = False) -> Optional[dict]:
         """Get cached air quality data."""
-        key = f"aqi:{lat},{lon}"
-        return await self.get(key, "air_quality")
+        return await self.get(self._air_quality_key(lat, lon), "air_quality", allow_stale)
     
     async def set_air_quality_cache(self, lat: float, lon: float, aqi_data: dict):
         """Cache air quality data."""
-        key = f"aqi:{lat},{lon}"
-        await self.set(key, aqi_data, "air_quality")
+        await self.set(
+            self._air_quality_key(lat, lon), aqi_data, "air_quality", cell_indexes=self._cell_indexes((lat, lon))
+        )
+    
+    async def get_air_quality_or_refresh(
+        self,
+        lat: float,
+        lon: float,
+        loader: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        """Get air quality data, calling ``loader`` at most once on a miss or stale entry."""
+        return await self.get_or_refresh(
+            self._air_quality_key(lat, lon), "air_quality", loader, self._cell_indexes((lat, lon))
+        )
+    
+    async def get_air_quality_cache_bulk(self, points: Sequence[Tuple[float, float]]) -> List[Optional[dict]]:
+        """Get cached air quality data for many (lat, lon) points in one round trip."""
+        return await self.get_many(
+            [self._air_quality_key(lat, lon) for lat, lon in points], "air_quality"
+        )
+    
+    async def set_air_quality_cache_bulk(self, points: Sequence[Tuple[float, float]], aqi_data: Sequence[dict]):
+        """Cache air quality data for many (lat, lon) points in one round trip."""
+        await self.set_many(
+            {self._air_quality_key(lat, lon): data for (lat, lon), data in zip(points, aqi_data)},
+            "air_quality",
+            key_cell_indexes={
+                self._air_quality_key(lat, lon): self._cell_indexes((lat, lon)) for lat, lon in points
+            }
+        )
     
     async def get_user_preferences_cache(self, user_id: str) -> Optional[dict]:
         """Get cached user preferences."""
@@ -168,29 +726,60 @@ class CacheManager:
     
     async def invalidate_route_cache(self, start_point: tuple, end_point: tuple):
         """Invalidate route cache."""
-        key = f"route:{start_point[0]},{start_point[1]}:{end_point[0]},{end_point[1]}"
-        await self.delete(key)
+        await self.delete(self._route_key(start_point, end_point))
     
     async def invalidate_area_cache(self, lat: float, lon: float, radius: float):
-        """Invalidate all cache entries in a geographical area."""
-        # This is a simplified version. In a real system, you'd need more
-        # sophisticated geospatial indexing.
-        patterns = [
-            f"weather:{lat}*",
-            f"aqi:{lat}*",
-            f"traffic:*{lat}*",
-            f"route:*{lat}*"
-        ]
-        for pattern in patterns:
-            await self.clear_pattern(pattern)
+        """
+        Invalidate all weather, AQI, traffic and route entries within
+        ``radius`` km of a point by deleting every key listed in the
+        covering cell indexes. Large areas use the coarse cells, which may
+        also drop some entries just outside the radius.
+        """
+        precision = self.geohash_precision
+        if cell_count(lat, radius, precision) > MAX_AREA_CELLS:
+            precision = self.coarse_precision
+        indexes = [self._cell_index_key(cell) for cell in cells_covering(lat, lon, radius, precision)]
+        
+        try:
+            now = time.time()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for index in indexes:
+                    pipe.zrangebyscore(index, now, "+inf")
+                members = await pipe.execute()
+            keys = sorted(
+                member.decode() if isinstance(member, bytes) else member
+                for member in set().union(*members)
+            )
+            await self.redis.delete(*keys, *indexes)
+            
+            for key in keys:
+                self.local.delete(key)
+            if keys:
+                await self._publish_invalidation(keys=keys)
+        except Exception as e:
+            print(f"Cache area invalidation error: {e}")
     
     async def clear_all_cache(self):
         """Clear all cache entries."""
+        self.local.clear()
         try:
             await self.redis.flushdb()
+            await self._publish_invalidation(pattern="*")
         except Exception as e:
             print(f"Clear all cache error: {e}")
     
+    def get_tier_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counters of this worker per cache tier (l1 in-process, l2 Redis)."""
+        tiers = {}
+        for tier, counts in self.stats.items():
+            lookups = counts["hits"] + counts["misses"]
+            tiers[tier] = {
+                **counts,
+                "hit_rate": counts["hits"] / lookups * 100 if lookups else 0.0
+            }
+        tiers["l1"]["entries"] = len(self.local)
+        return tiers
+    
     async def get_cache_stats(self) -> dict:
         """Get cache statistics."""
         try:
@@ -201,8 +790,9 @@ class CacheManager:
                 "total_keys": await self.redis.dbsize(),
                 "hit_rate": info.get("keyspace_hits", 0) / (
                     info.get("keyspace_hits", 0) + info.get("keyspace_misses", 1)
-                ) * 100
+                ) * 100,
+                "tiers": self.get_tier_stats()
             }
         except Exception as e:
             print(f"Get cache stats error: {e}")
-            return {} 
\ No newline at end of file
+            return {"tiers": self.get_tier_stats()} 
\ No newline at end of file
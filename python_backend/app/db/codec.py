@@ -0,0 +1,117 @@
+from typing import Any, Callable, Dict, Tuple, Union
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional: falls back to JSON
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to JSON
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # optional: falls back to zlib
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional: falls back to zlib
+    lz4_frame = None
+
+# First byte of every encoded value. Entries written before the codec layer
+# are plain JSON text, which never starts with a control byte, so anything
+# else is read as legacy JSON.
+CODEC_VERSION = 1
+
+# Encoded value layout: version byte, serializer id, compression id, payload
+HEADER_SIZE = 3
+
+SERIALIZER_IDS = {"json": 0, "orjson": 1, "msgpack": 2}
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+def _serializers() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    available = {
+        "json": (
+            lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8"),
+            json.loads
+        )
+    }
+    if orjson is not None:
+        available["orjson"] = (orjson.dumps, orjson.loads)
+    if msgpack is not None:
+        available["msgpack"] = (
+            lambda value: msgpack.packb(value, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+        )
+    return available
+
+def _compressors(level: int) -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    available = {
+        "none": (lambda data: data, lambda data: data),
+        "zlib": (lambda data: zlib.compress(data, level), zlib.decompress)
+    }
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=level)
+        decompressor = zstandard.ZstdDecompressor()
+        available["zstd"] = (compressor.compress, decompressor.decompress)
+    if lz4_frame is not None:
+        available["lz4"] = (lz4_frame.compress, lz4_frame.decompress)
+    return available
+
+class CacheCodec:
+    """
+    Encodes cache values as a small versioned header plus a binary payload.
+    Payloads above ``compress_threshold`` bytes are compressed. Serializers
+    and compressors whose library is not installed fall back to JSON and
+    zlib, and values written by any configuration decode with any other as
+    long as the library they used is installed.
+    """
+
+    def __init__(
+        self,
+        serializer: str = "msgpack",
+        compression: str = "zlib",
+        compress_threshold: int = 1024,
+        level: int = 3
+    ):
+        if serializer not in SERIALIZER_IDS:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+
+        self._serializers = _serializers()
+        self._compressors = _compressors(level)
+        self.serializer = serializer if serializer in self._serializers else "json"
+        self.compression = compression if compression in self._compressors else "zlib"
+        self.compress_threshold = compress_threshold
+
+        self._serializer_names = {code: name for name, code in SERIALIZER_IDS.items()}
+        self._compression_names = {code: name for name, code in COMPRESSION_IDS.items()}
+
+    def encode(self, value: Any) -> bytes:
+        payload = self._serializers[self.serializer][0](value)
+        compression = "none"
+        if self.compression != "none" and len(payload) > self.compress_threshold:
+            compressed = self._compressors[self.compression][0](payload)
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compression
+        header = bytes((CODEC_VERSION, SERIALIZER_IDS[self.serializer], COMPRESSION_IDS[compression]))
+        return header + payload
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        if isinstance(data, str) or not data or data[0] != CODEC_VERSION:
+            return json.loads(data)  # legacy JSON text entry
+
+        serializer = self._serializer_names.get(data[1])
+        compression = self._compression_names.get(data[2])
+        if serializer not in self._serializers or compression not in self._compressors:
+            raise ValueError(
+                f"Cannot decode cache value (serializer {serializer or data[1]}, "
+                f"compression {compression or data[2]}): library not installed"
+            )
+        payload = self._compressors[compression][1](data[HEADER_SIZE:])
+        return self._serializers[serializer][1](payload)
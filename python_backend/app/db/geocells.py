@@ -0,0 +1,74 @@
+from typing import Set, Tuple
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+KM_PER_DEGREE_LAT = 111.32
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Standard base32 geohash of a point; nearby points share the cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(latitude, longitude) extent in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def cells_covering(lat: float, lon: float, radius_km: float, precision: int) -> Set[str]:
+    """Geohash cells that intersect the bounding box of a circle."""
+    lat_step, lon_step = cell_size(precision)
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    d_lon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    south, north = max(lat - d_lat, -90.0), min(lat + d_lat, 90.0)
+    west, east = max(lon - d_lon, -180.0), min(lon + d_lon, 180.0)
+
+    rows = int(math.ceil((north - south) / lat_step)) + 1
+    columns = int(math.ceil((east - west) / lon_step)) + 1
+    cells = set()
+    for row in range(rows):
+        cell_lat = min(south + row * lat_step, north)
+        for column in range(columns):
+            cell_lon = min(west + column * lon_step, east)
+            cells.add(geohash_encode(cell_lat, cell_lon, precision))
+    return cells
+
+def cell_count(lat: float, radius_km: float, precision: int) -> int:
+    """Upper bound on ``len(cells_covering(...))`` without building the set."""
+    lat_step, lon_step = cell_size(precision)
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    d_lon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return (int(math.ceil(2 * d_lat / lat_step)) + 1) * (int(math.ceil(2 * d_lon / lon_step)) + 1)
+
+def cell_center(cell: str) -> Tuple[float, float]:
+    """(lat, lon) of the centre of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            span = lon_range if even else lat_range
+            middle = (span[0] + span[1]) / 2
+            if value >> shift & 1:
+                span[0] = middle
+            else:
+                span[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
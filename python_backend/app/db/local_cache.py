@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+import time
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-entry expiry. Used as the L1
+    tier in front of Redis; values are stored exactly as read from Redis.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(hit, value)``; expired entries count as misses."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl_seconds: float):
+        """Store a value for ``ttl_seconds``, evicting the least recently used entries."""
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def delete_pattern(self, pattern: str):
+        """Drop every key matching a Redis-style glob pattern."""
+        for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
@@ -1,6 +1,9 @@
 import os
+from typing import Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from pymongo.errors import CollectionInvalid, OperationFailure
+from app.core.settings import settings
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +18,61 @@ client = AsyncIOMotorClient(MONGODB_URI)
 # Get database
 db = client.fedex_green_router
 
+# Oldest supported server: secondary indexes on time-series collections need
+# 6.0 (and the $topN error samples of the metrics API 5.2)
+MIN_MONGODB_VERSION = (6, 0)
+TOP_N_MONGODB_VERSION = (5, 2)
+
+_server_version: Optional[Tuple[int, ...]] = None
+
+async def server_version() -> Tuple[int, ...]:
+    """(major, minor, patch) of the connected MongoDB server, queried once."""
+    global _server_version
+    if _server_version is None:
+        info = await db.command("buildInfo")
+        _server_version = tuple(int(part) for part in info["versionArray"][:3])
+    return _server_version
+
+# Append-only telemetry stored as time-series collections that expire old
+# measurements: (time field, meta field, granularity, retention in days)
+TIME_SERIES_COLLECTIONS = {
+    "metrics": ("start_time", "endpoint", "seconds", settings.METRICS_RETENTION_DAYS),
+    "errors": ("timestamp", "status_code", "minutes", settings.ERRORS_RETENTION_DAYS)
+}
+
+async def ensure_time_series(name: str, existing_collections):
+    """
+    Create a time-series collection with TTL expiry, or update the expiry of
+    an existing one. Plain collections (created before, or on servers
+    without time-series support) get a TTL index on the time field instead.
+    """
+    time_field, meta_field, granularity, retention_days = TIME_SERIES_COLLECTIONS[name]
+    expire_after = int(retention_days * 24 * 3600)
+    if name not in existing_collections:
+        try:
+            await db.create_collection(
+                name,
+                timeseries={"timeField": time_field, "metaField": meta_field, "granularity": granularity},
+                expireAfterSeconds=expire_after
+            )
+            return
+        except CollectionInvalid:
+            pass  # another worker created it first
+        except OperationFailure as e:
+            print(f"Time-series collection {name} unavailable, using a TTL index: {e}")
+            await db.create_collection(name)
+    
+    options = await db[name].options()
+    if "timeseries" in options:
+        await db.command("collMod", name, expireAfterSeconds=expire_after)
+    elif f"{time_field}_1" in await db[name].index_information():
+        await db.command({
+            "collMod": name,
+            "index": {"keyPattern": {time_field: 1}, "expireAfterSeconds": expire_after}
+        })
+    else:
+        await db[name].create_index(time_field, expireAfterSeconds=expire_after)
+
 async def init_db():
     """Initialize the database by creating necessary collections."""
     collections = [
@@ -27,10 +85,19 @@ async def init_db():
         "maintenance_records"
     ]
     
+    version = await server_version()
+    if version < MIN_MONGODB_VERSION:
+        print(
+            f"MongoDB {'.'.join(map(str, version))} is older than "
+            f"{'.'.join(map(str, MIN_MONGODB_VERSION))}: telemetry indexes and error samples are reduced"
+        )
+    
     existing_collections = await db.list_collection_names()
     
     for collection in collections:
-        if collection not in existing_collections:
+        if collection in TIME_SERIES_COLLECTIONS:
+            await ensure_time_series(collection, existing_collections)
+        elif collection not in existing_collections:
             await db.create_collection(collection)
 
 # Add the init_db method to the db object
@@ -0,0 +1,100 @@
+from typing import Any, Callable, Dict, Optional
+from enum import Enum
+import time
+from app.core.settings import settings
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"  # calls go to the provider
+    OPEN = "open"  # calls are short-circuited to the fallback
+    HALF_OPEN = "half_open"  # one probe call decides whether to close again
+
+class CircuitBreaker:
+    """
+    Tracks one upstream provider's health. Errors and calls slower than
+    ``latency_threshold`` seconds count as failures; ``failure_threshold``
+    consecutive failures open the circuit. After ``reset_timeout`` seconds
+    a single probe is let through: success closes the circuit, failure
+    opens it for another ``reset_timeout``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        latency_threshold: float = 2.0,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"failures": 0, "short_circuited": 0, "opened": 0}
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to the provider now; in half-open state only one probe may."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def record_success(self, latency: float):
+        if latency > self.latency_threshold:
+            self.record_failure()
+            return
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self._probe_in_flight or self._failures >= self.failure_threshold:
+            if self._state != CircuitState.OPEN or self._probe_in_flight:
+                self.stats["opened"] += 1
+            self._state = CircuitState.OPEN
+            self._opened_at = self._clock()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give up a probe that ended without a verdict (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._failures,
+            **self.stats
+        }
+
+# One breaker per provider, shared by every collector in the worker
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(
+            provider,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            latency_threshold=settings.CIRCUIT_LATENCY_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+        )
+    return breaker
+
+def get_circuit_stats() -> Dict[str, Dict[str, Any]]:
+    return {provider: breaker.get_stats() for provider, breaker in _breakers.items()}
@@ -1,45 +1,355 @@
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, Optional
 from abc import ABC, abstractmethod
+import asyncio
+import importlib.util
+import time
 import httpx
-from config.settings import settings
+from app.core.location import Location
+from app.core.settings import settings
+from app.services.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from app.services.rate_limiter import Priority, RateLimiter, get_rate_limiter
+from app.utils.telemetry import get_metrics_registry
+from app.utils.error_handling.exceptions import RateLimitExceededError
+
+# One pooled client for the app's lifetime, so collectors reuse keep-alive
+# connections instead of paying a TCP+TLS handshake on every call
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared HTTP client, created on first use with the configured pool limits."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            # HTTP/2 needs the optional h2 package (httpx[http2])
+            http2=settings.HTTP_CLIENT_HTTP2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+            ),
+            timeout=settings.COLLECTOR_TIMEOUT
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# CacheManager holding the last known values collectors fall back to; set
+# on application startup
+_fallback_cache = None
+
+def set_fallback_cache(cache):
+    global _fallback_cache
+    _fallback_cache = cache
 
 class BaseDataCollector(ABC):
-    """Base class for all data collectors."""
+    """
+    Base class for all data collectors.
+    
+    ``collect_data`` serves cached values (kept warm by the prefetch
+    scheduler) to user-facing callers through ``CacheManager.get_or_refresh``:
+    fresh values as they are, values past their soft TTL while one
+    background call refreshes them, and on a miss one provider call shared
+    by every concurrent caller of the key. Provider calls are guarded by
+    the circuit breaker. When the circuit is open, the call fails, or the
+    request budget is exhausted, it returns the last value cached for the
+    location, else the collector's climatological ``default_data``, marked
+    ``"degraded": True``.
+    
+    ``base_url``, ``client``, ``rate_limiter``, ``circuit_breaker`` and
+    ``cache`` default to the configured provider URL and the shared
+    instances; tests and benchmarks pass a local stub server's URL instead.
+    """
+    
+    default_base_url: str = ""
+    provider: str = ""
+    default_data: Dict[str, Any] = {}
+    
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        cache=None
+    ):
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+        self._client = client
+        self._rate_limiter = rate_limiter
+        self._circuit_breaker = circuit_breaker
+        self._cache = cache
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+    
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self._rate_limiter or get_rate_limiter()
+    
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        return self._circuit_breaker or get_circuit_breaker(self.provider)
+    
+    @property
+    def cache(self):
+        return self._cache or _fallback_cache
+    
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.client.get(f"{self.base_url}{path}", params=params)
+        response.raise_for_status()
+        return response.json()
+    
+    async def collect_data(
+        self,
+        location: Optional[Location] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Collect data from the source, for a location when given. ``timeout``
+        (seconds) bounds the wait for request budget and the call together.
+        Except at prefetch priority, which is there to refresh the cache,
+        the location's cached value is used as described above.
+        """
+        timeout = settings.COLLECTOR_TIMEOUT if timeout is None else timeout
+        
+        async def fetch() -> Optional[Dict[str, Any]]:
+            return await self._guarded(lambda: self._fetch(location), priority, timeout)
+        
+        if self.cache is None or location is None:
+            data = await fetch()
+        elif priority != Priority.PREFETCH:
+            try:
+                # Also bounds the wait for another worker's refresh of the key
+                data = await asyncio.wait_for(self._refreshed(self.cache, location, fetch), timeout)
+            except asyncio.TimeoutError:
+                data = None
+            except Exception as e:
+                data = None
+                print(f"{self.provider} collector cache error: {e}")
+        else:
+            data = await fetch()
+            if data is not None:
+                try:
+                    await self._store(self.cache, location, data)
+                except Exception as e:
+                    print(f"{self.provider} collector cache error: {e}")
+        
+        if data is None:
+            return await self._fallback(location)
+        return data
+    
+    async def _guarded(
+        self,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        priority: Priority,
+        timeout: Optional[float]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Run a provider call through the circuit breaker and rate limiter;
+        None when the circuit is open, the budget is exhausted or the call
+        fails or times out. ``timeout`` covers the budget wait and the call,
+        and a half-open probe is released if the caller is cancelled.
+        """
+        timeout = settings.COLLECTOR_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        breaker = self.circuit_breaker
+        if not breaker.allow_request():
+            return None
+        
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(self.provider, priority, timeout=timeout)
+        except RateLimitExceededError:
+            breaker.release_probe()
+            return None
+        except BaseException:
+            breaker.release_probe()
+            raise
+        
+        start = time.monotonic()
+        if start >= deadline:
+            breaker.release_probe()
+            return None
+        try:
+            data = await asyncio.wait_for(fetch(), deadline - start)
+        except Exception as e:
+            breaker.record_failure()
+            print(f"{self.provider} collector error: {e!r}")
+            return None
+        except BaseException:
+            breaker.release_probe()
+            raise
+        latency = time.monotonic() - start
+        breaker.record_success(latency)
+        get_metrics_registry().observe(
+            "pipeline_stage_duration_seconds", latency, stage=f"upstream_{self.provider}"
+        )
+        return data
+    
+    async def _fallback(self, location: Optional[Location]) -> Dict[str, Any]:
+        data = None
+        if self.cache is not None and location is not None:
+            try:
+                data = await self._cached(self.cache, location, allow_stale=True)
+            except Exception as e:
+                print(f"{self.provider} collector cache error: {e}")
+        return {**(data if data is not None else self.default_data), "degraded": True}
     
     @abstractmethod
-    async def collect_data(self) -> Dict[str, Any]:
-        """Collect data from the source."""
+    async def _fetch(self, location: Optional[Location]) -> Dict[str, Any]:
+        """Call the provider, for a location when given."""
+        pass
+    
+    @abstractmethod
+    async def _cached(self, cache, location: Location, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """Value stored in ``cache`` for a location; past its soft TTL only with ``allow_stale``."""
+        pass
+    
+    @abstractmethod
+    async def _store(self, cache, location: Location, data: Dict[str, Any]):
+        """Store a fresh value in ``cache`` for a location."""
+        pass
+    
+    @abstractmethod
+    async def _refreshed(
+        self,
+        cache,
+        location: Location,
+        loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Value in ``cache`` for a location, loaded with ``loader`` (single-flight) when missing or stale."""
         pass
 
 class TrafficDataCollector(BaseDataCollector):
     """Collector for traffic data from TomTom API."""
     
-    async def collect_data(self) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.TOMTOM_BASE_URL}/traffic",
-                params={"key": settings.TOMTOM_API_KEY}
-            )
-            return response.json()
+    default_base_url = settings.TOMTOM_BASE_URL
+    provider = "tomtom"
+    default_data = {"congestion_level": 0}
+    
+    async def _fetch(self, location: Optional[Location]) -> Dict[str, Any]:
+        params = {"key": settings.TOMTOM_API_KEY}
+        if location is not None:
+            params["point"] = f"{location.lat},{location.lon}"
+        return await self._get("/traffic", params)
+    
+    async def _cached(self, cache, location: Location, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        point = (location.lat, location.lon)
+        return await cache.get_traffic_cache(point, point, allow_stale)
+    
+    async def _store(self, cache, location: Location, data: Dict[str, Any]):
+        point = (location.lat, location.lon)
+        await cache.set_traffic_cache(point, point, data)
+    
+    async def _refreshed(self, cache, location, loader) -> Optional[Dict[str, Any]]:
+        point = (location.lat, location.lon)
+        return await cache.get_traffic_or_refresh(point, point, loader)
+    
+    async def collect_flow_tile(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        priority: Priority = Priority.PREFETCH,
+        timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Flow segments for a whole bounding box in one call (see
+        ``EdgeTraffic`` for the format), with the time they were fetched
+        as ``"fetched_at"`` (epoch seconds); None when unavailable.
+        """
+        params = {"key": settings.TOMTOM_API_KEY, "bbox": f"{west},{south},{east},{north}"}
+        tile = await self._guarded(lambda: self._get("/traffic/flow", params), priority, timeout)
+        if tile is None:
+            return None
+        return {**tile, "fetched_at": time.time()}
 
 class WeatherDataCollector(BaseDataCollector):
     """Collector for weather data from OpenWeather API."""
     
-    async def collect_data(self) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.OPENWEATHER_BASE_URL}/weather",
-                params={"appid": settings.OPENWEATHER_API_KEY}
-            )
-            return response.json()
+    default_base_url = settings.OPENWEATHER_BASE_URL
+    provider = "openweather"
+    # Mild, dry conditions: the same neutral values the emissions model assumes
+    default_data = {"temp": 20, "precipitation": 0, "wind_speed": 0}
+    
+    async def _fetch(self, location: Optional[Location]) -> Dict[str, Any]:
+        params = {"appid": settings.OPENWEATHER_API_KEY}
+        if location is not None:
+            params.update(lat=location.lat, lon=location.lon)
+        return await self._get("/weather", params)
+    
+    async def _cached(self, cache, location: Location, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        return await cache.get_weather_cache(location.lat, location.lon, allow_stale)
+    
+    async def _store(self, cache, location: Location, data: Dict[str, Any]):
+        await cache.set_weather_cache(location.lat, location.lon, data)
+    
+    async def _refreshed(self, cache, location, loader) -> Optional[Dict[str, Any]]:
+        return await cache.get_weather_or_refresh(location.lat, location.lon, loader)
 
 class AirQualityDataCollector(BaseDataCollector):
     """Collector for air quality data from AQICN API."""
     
-    async def collect_data(self) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.AQICN_BASE_URL}/feed/here/",
-                params={"token": settings.AQICN_API_KEY}
-            )
-            return response.json() 
\ No newline at end of file
+    default_base_url = settings.AQICN_BASE_URL
+    provider = "aqicn"
+    default_data = {"data": {"aqi": 50}}
+    
+    async def _fetch(self, location: Optional[Location]) -> Dict[str, Any]:
+        feed = f"geo:{location.lat};{location.lon}" if location is not None else "here"
+        return await self._get(f"/feed/{feed}/", {"token": settings.AQICN_API_KEY})
+    
+    async def _cached(self, cache, location: Location, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        return await cache.get_air_quality_cache(location.lat, location.lon, allow_stale)
+    
+    async def _store(self, cache, location: Location, data: Dict[str, Any]):
+        await cache.set_air_quality_cache(location.lat, location.lon, data)
+    
+    async def _refreshed(self, cache, location, loader) -> Optional[Dict[str, Any]]:
+        return await cache.get_air_quality_or_refresh(location.lat, location.lon, loader)
+
+async def collect_all(
+    location: Location,
+    collectors: Optional[Dict[str, BaseDataCollector]] = None,
+    timeout: Optional[float] = None,
+    priority: Priority = Priority.INTERACTIVE
+) -> Dict[str, Any]:
+    """
+    Collect traffic, weather and air quality for a location concurrently.
+    
+    Each source gets its own ``timeout`` (seconds), including any wait for
+    its rate limit at ``priority``. A source that fails, times out or has
+    its circuit open returns its fallback value instead, so one slow
+    provider does not hold back or fail the others; ``"degraded"`` is set
+    when any source did. Unexpected errors leave the source None with the
+    reason under ``"errors"``.
+    """
+    if collectors is None:
+        collectors = {
+            "traffic": TrafficDataCollector(),
+            "weather": WeatherDataCollector(),
+            "air_quality": AirQualityDataCollector()
+        }
+    
+    results = await asyncio.gather(
+        *[collector.collect_data(location, priority, timeout) for collector in collectors.values()],
+        return_exceptions=True
+    )
+    
+    data: Dict[str, Any] = {"errors": {}}
+    for source, result in zip(collectors, results):
+        if isinstance(result, BaseException):
+            data[source] = None
+            data["errors"][source] = str(result) or type(result).__name__
+        else:
+            data[source] = result
+    data["degraded"] = any(
+        data[source] is None or data[source].get("degraded", False) for source in collectors
+    )
+    return data
@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Union
+import numpy as np
+
+ArrayLike = Union[float, np.ndarray]
+
+# Shape of each vehicle class's emission curve. The speed curve is
+# low_speed / v + 1 + aero * v^2 (stop-and-go losses at low speed,
+# aerodynamic drag at high speed), normalized to 1.0 at REFERENCE_SPEED so
+# the class's flat, empty, free-flowing emission factor is unchanged.
+# ``load`` is the extra share of emissions at full load, ``uphill`` and
+# ``downhill`` the change per degree of gradient.
+CURVE_PARAMETERS: Dict[str, Dict[str, float]] = {
+    "light_duty": {"low_speed": 30.0, "aero": 6e-5, "load": 0.10, "uphill": 0.04, "downhill": 0.03},
+    "medium_duty": {"low_speed": 35.0, "aero": 4e-5, "load": 0.20, "uphill": 0.05, "downhill": 0.03},
+    "heavy_duty": {"low_speed": 40.0, "aero": 3e-5, "load": 0.35, "uphill": 0.07, "downhill": 0.03},
+    "electric": {"low_speed": 5.0, "aero": 6e-5, "load": 0.10, "uphill": 0.04, "downhill": 0.03},
+    "hybrid": {"low_speed": 10.0, "aero": 6e-5, "load": 0.15, "uphill": 0.04, "downhill": 0.03}
+}
+
+REFERENCE_SPEED = 60.0  # km/h
+MIN_DOWNHILL_FACTOR = 0.3  # engine still runs when coasting downhill
+
+# Table grids: speed (km/h), load ratio and gradient (degrees). Inputs
+# outside a grid are clamped to its ends.
+SPEED_GRID = np.arange(5.0, 131.0, 1.0)
+LOAD_GRID = np.linspace(0.0, 1.0, 21)
+GRADIENT_GRID = np.arange(-10.0, 10.5, 0.5)
+
+class EmissionCurveModel:
+    """
+    Per-vehicle-class emissions (g CO2/km) as a function of average speed,
+    load ratio and gradient, precomputed into dense tables so evaluating a
+    segment is a constant-time trilinear interpolation.
+    """
+
+    def __init__(
+        self,
+        emission_factors: Dict[str, float],
+        parameters: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        parameters = parameters or CURVE_PARAMETERS
+        self.tables: Dict[str, np.ndarray] = {
+            name: self._build_table(factor, parameters.get(name, parameters["medium_duty"]))
+            for name, factor in emission_factors.items()
+        }
+
+    @staticmethod
+    def _build_table(emission_factor: float, curve: Dict[str, float]) -> np.ndarray:
+        """g CO2/km over the (speed, load, gradient) grid for one class."""
+        speed = SPEED_GRID[:, None, None]
+        load = LOAD_GRID[None, :, None]
+        gradient = GRADIENT_GRID[None, None, :]
+
+        def speed_curve(v):
+            return curve["low_speed"] / v + 1 + curve["aero"] * v ** 2
+
+        speed_factor = speed_curve(speed) / speed_curve(REFERENCE_SPEED)
+        load_factor = 1 + load * curve["load"]
+        # Climbing costs more the heavier the vehicle is loaded
+        gradient_factor = np.where(
+            gradient >= 0,
+            1 + gradient * curve["uphill"] * (1 + load),
+            np.maximum(MIN_DOWNHILL_FACTOR, 1 + gradient * curve["downhill"])
+        )
+        return emission_factor * speed_factor * load_factor * gradient_factor
+
+    def _table(self, vehicle_class: str) -> np.ndarray:
+        return self.tables.get(vehicle_class, self.tables.get("medium_duty"))
+
+    def emission_factor(
+        self,
+        vehicle_class: str,
+        speed: ArrayLike,
+        load_ratio: ArrayLike = 0.0,
+        gradient: ArrayLike = 0.0
+    ) -> np.ndarray:
+        """g CO2/km for every (speed km/h, load ratio, gradient degrees) entry."""
+        table = self._table(vehicle_class)
+        speed, load_ratio, gradient = np.broadcast_arrays(
+            np.asarray(speed, dtype=np.float64),
+            np.asarray(load_ratio, dtype=np.float64),
+            np.asarray(gradient, dtype=np.float64)
+        )
+
+        def cell(values, grid):
+            step = grid[1] - grid[0]
+            position = np.clip((values - grid[0]) / step, 0, len(grid) - 1)
+            low = np.minimum(position.astype(np.int64), len(grid) - 2)
+            return low, position - low
+
+        s, ds = cell(speed, SPEED_GRID)
+        l, dl = cell(load_ratio, LOAD_GRID)
+        g, dg = cell(gradient, GRADIENT_GRID)
+
+        result = np.zeros(speed.shape)
+        for i, wi in ((0, 1 - ds), (1, ds)):
+            for j, wj in ((0, 1 - dl), (1, dl)):
+                for k, wk in ((0, 1 - dg), (1, dg)):
+                    result += wi * wj * wk * table[s + i, l + j, g + k]
+        return result
+
+    def segment_emissions(
+        self,
+        vehicle_class: str,
+        distance: ArrayLike,
+        speed: ArrayLike,
+        load_ratio: ArrayLike = 0.0,
+        gradient: ArrayLike = 0.0
+    ) -> np.ndarray:
+        """g CO2 for segments of ``distance`` km driven at average ``speed`` km/h."""
+        return np.asarray(distance, dtype=np.float64) * self.emission_factor(
+            vehicle_class, speed, load_ratio, gradient
+        )
+
+_emission_curve_model: Optional[EmissionCurveModel] = None
+
+def get_emission_curve_model() -> EmissionCurveModel:
+    """Build (once per process) the curve tables for the EmissionsCalculator classes."""
+    global _emission_curve_model
+    if _emission_curve_model is None:
+        from app.services.emissions_calculator import EmissionsCalculator
+
+        _emission_curve_model = EmissionCurveModel(EmissionsCalculator().emission_factors)
+    return _emission_curve_model
@@ -1,6 +1,8 @@
-from typing import Dict, List
-from models.vehicle import Vehicle
-from models.route import Route
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.core.vehicle import Vehicle
+from app.core.route import Route
+from app.services.emission_curves import get_emission_curve_model
 
 class EmissionsCalculator:
     def __init__(self):
@@ -18,9 +20,17 @@ class EmissionsCalculator:
         route: Route,
         vehicle: Vehicle,
         weather_conditions: Dict,
-        traffic_conditions: Dict
+        traffic_conditions: Dict,
+        gradient: float = 0.0,
+        load_ratio: float = 0.0
     ) -> Dict:
-        """Calculate total emissions for a given route."""
+        """
+        Calculate total emissions for a given route.
+        
+        ``gradient`` is the average route gradient in degrees and
+        ``load_ratio`` the cargo weight as a fraction of capacity; both
+        default to no impact.
+        """
         base_emissions = self._calculate_base_emissions(route, vehicle)
         
         # Apply weather impact factor
@@ -29,21 +39,114 @@ class EmissionsCalculator:
         # Apply traffic impact factor
         traffic_factor = self._calculate_traffic_impact(traffic_conditions)
         
+        # Same weight and gradient factors as /api/vehicles/estimate-emissions
+        weight_factor = 1 + load_ratio * 0.2
+        gradient_factor = 1 + abs(gradient) * 0.03
+        
         # Calculate total emissions with all factors
-        total_emissions = base_emissions * weather_factor * traffic_factor
+        total_emissions = (
+            base_emissions * weather_factor * traffic_factor * weight_factor * gradient_factor
+        )
         
         return {
             "total_emissions_kg": total_emissions / 1000,  # Convert g to kg
             "base_emissions_kg": base_emissions / 1000,
             "weather_factor": weather_factor,
             "traffic_factor": traffic_factor,
+            "weight_factor": weight_factor,
+            "gradient_factor": gradient_factor,
             "route_length_km": route.total_distance,
-            "vehicle_type": vehicle.type
+            "vehicle_type": vehicle.vehicle_type
         }
 
+    def calculate_batch(
+        self,
+        distance: Sequence[float],
+        vehicle_type: Sequence[str],
+        temperature: Optional[Sequence[float]] = None,
+        rain: Optional[Sequence[float]] = None,
+        snow: Optional[Sequence[float]] = None,
+        congestion_level: Optional[Sequence[float]] = None,
+        gradient: Optional[Sequence[float]] = None,
+        load_ratio: Optional[Sequence[float]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Vectorized :meth:`calculate_route_emissions` over column arrays, one
+        entry per route leg. Missing columns take the scalar defaults
+        (20 C, no precipitation, no congestion, flat, empty).
+        """
+        distance = np.asarray(distance, dtype=np.float64)
+        n = len(distance)
+        
+        def column(values: Optional[Sequence[float]], default: float) -> np.ndarray:
+            if values is None:
+                return np.full(n, default)
+            values = np.asarray(values, dtype=np.float64)
+            if values.shape != (n,):
+                raise ValueError("All batch columns must have the same length")
+            return values
+        
+        temperature = column(temperature, 20.0)
+        rain, snow = column(rain, 0.0), column(snow, 0.0)
+        congestion_level = column(congestion_level, 0.0)
+        gradient, load_ratio = column(gradient, 0.0), column(load_ratio, 0.0)
+        
+        types, codes = np.unique(np.asarray(vehicle_type, dtype=str), return_inverse=True)
+        if codes.shape != (n,):
+            raise ValueError("All batch columns must have the same length")
+        factors = np.array([
+            self.emission_factors.get(name, self.emission_factors["medium_duty"]) for name in types
+        ], dtype=np.float64)
+        base_emissions = distance * factors[codes]
+        
+        weather_factor = (
+            np.select([temperature < 0, temperature > 30], [1.2, 1.1], default=1.0)
+            * np.where(rain > 0, 1.15, 1.0)
+            * np.where(snow > 0, 1.25, 1.0)
+        )
+        traffic_factor = np.select(
+            [congestion_level > 80, congestion_level > 50, congestion_level > 20],
+            [1.5, 1.3, 1.1],
+            default=1.0
+        )
+        weight_factor = 1 + load_ratio * 0.2
+        gradient_factor = 1 + np.abs(gradient) * 0.03
+        
+        total_emissions = (
+            base_emissions * weather_factor * traffic_factor * weight_factor * gradient_factor
+        )
+        
+        return {
+            "total_emissions_kg": total_emissions / 1000,
+            "base_emissions_kg": base_emissions / 1000,
+            "weather_factor": weather_factor,
+            "traffic_factor": traffic_factor,
+            "weight_factor": weight_factor,
+            "gradient_factor": gradient_factor
+        }
+
+    def calculate_segment_emissions(
+        self,
+        vehicle_type: str,
+        distance: Sequence[float],
+        speed: Sequence[float],
+        load_ratio: float = 0.0,
+        gradient: Optional[Sequence[float]] = None
+    ) -> np.ndarray:
+        """
+        Per-segment g CO2 from the speed/load/gradient emission curves, so
+        congested (slow) segments cost more than free-flowing ones.
+        Distances are in km, speeds in km/h and gradients in degrees.
+        """
+        return get_emission_curve_model().segment_emissions(
+            vehicle_type, distance, speed, load_ratio, 0.0 if gradient is None else gradient
+        )
+
     def _calculate_base_emissions(self, route: Route, vehicle: Vehicle) -> float:
         """Calculate base emissions without external factors."""
-        emission_factor = self.emission_factors.get(vehicle.type, self.emission_factors["medium_duty"])
+        emission_factor = self.emission_factors.get(
+            vehicle.vehicle_type, self.emission_factors["medium_duty"]
+        )
         return route.total_distance * emission_factor
 
     def _calculate_weather_impact(self, weather_conditions: Dict) -> float:
@@ -95,9 +198,9 @@ class EmissionsCalculator:
         
         # Check if alternative vehicle type would help
         for vehicle_type, emission_factor in self.emission_factors.items():
-            if vehicle_type != vehicle.type:
+            if vehicle_type != vehicle.vehicle_type:
                 potential_savings = (
-                    (self.emission_factors[vehicle.type] - emission_factor)
+                    (self.emission_factors[vehicle.vehicle_type] - emission_factor)
                     * route.total_distance
                     / 1000  # Convert to kg
                 )
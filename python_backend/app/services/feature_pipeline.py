@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.preprocessing import StandardScaler
+
+# Bump when the encoding or column handling changes; saved pipelines from
+# another version are rejected instead of silently mis-scaling features.
+FEATURE_PIPELINE_VERSION = 1
+
+VEHICLE_TYPE_CODES = {
+    'light_duty': 0,
+    'medium_duty': 1,
+    'heavy_duty': 2,
+    'electric': 3,
+    'hybrid': 4
+}
+
+class FeaturePipeline:
+    """
+    Vehicle-type encoding plus feature scaling for the route prediction
+    models. It is fitted once on the training data and saved with the
+    models; updates and inference only transform, so incremental training
+    never moves the feature space under existing trees.
+    """
+
+    def __init__(self, feature_columns: Sequence[str], vehicle_type_codes: Optional[Dict[str, int]] = None):
+        self.version = FEATURE_PIPELINE_VERSION
+        self.feature_columns: List[str] = list(feature_columns)
+        self.vehicle_type_codes = dict(vehicle_type_codes or VEHICLE_TYPE_CODES)
+        self.scaler = StandardScaler()
+        self.fitted = False
+
+    def encode(
+        self,
+        data: Union[pd.DataFrame, Mapping[str, Sequence]],
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Raw feature matrix from a frame or a mapping of column values,
+        written column by column into ``out`` if given.
+        """
+        if out is None:
+            out = np.empty((len(data[self.feature_columns[0]]), len(self.feature_columns)))
+        for i, column in enumerate(self.feature_columns):
+            values = pd.Series(data[column], copy=False)
+            if column == 'vehicle_type':
+                # Unknown types fall back to code 0, as in encode_row
+                values = values.map(self.vehicle_type_codes).fillna(0)
+            out[:, i] = values.to_numpy(dtype=np.float64)
+        return out
+
+    def encode_row(self, row: Mapping[str, Any]) -> np.ndarray:
+        """Raw feature vector for one record of column values."""
+        return np.array([
+            self.vehicle_type_codes.get(row[column], 0) if column == 'vehicle_type' else row[column]
+            for column in self.feature_columns
+        ], dtype=np.float64)
+
+    def fit(self, data: pd.DataFrame) -> "FeaturePipeline":
+        """Fit the scaler on training data."""
+        self.scaler.fit(self.encode(data))
+        self.fitted = True
+        return self
+
+    def transform(self, data: pd.DataFrame, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Encode and scale a frame with the fitted parameters."""
+        return self.scale(self.encode(data, out))
+
+    def fit_transform(self, data: pd.DataFrame) -> np.ndarray:
+        """Fit on training data and return its scaled features."""
+        features = self.encode(data)
+        self.scaler.fit(features)
+        self.fitted = True
+        return self.scale(features)
+
+    def scale(self, features: np.ndarray) -> np.ndarray:
+        """Scale already encoded rows in place."""
+        if not self.fitted:
+            raise ValueError("Feature pipeline not fitted. Call train_models first.")
+        features -= self.scaler.mean_
+        features /= self.scaler.scale_
+        return features
+
+    def save(self, path: str):
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeaturePipeline":
+        pipeline = joblib.load(path)
+        version = getattr(pipeline, "version", None)
+        if not isinstance(pipeline, cls) or version != FEATURE_PIPELINE_VERSION:
+            raise ValueError(
+                f"Feature pipeline version {version} does not match "
+                f"{FEATURE_PIPELINE_VERSION}; retrain the models"
+            )
+        return pipeline
@@ -0,0 +1,146 @@
+from typing import List, Optional
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# (tree, row) pairs traversed together; keeps the working arrays in cache
+TRAVERSAL_BLOCK = 16384
+
+# Finished pairs are dropped from the working set once fewer than this
+# share of it is still descending; compacting on every level costs more
+# than it saves near the roots, where almost every pair is still moving
+COMPACT_BELOW = 0.75
+
+# From this many rows sklearn's compiled per-tree loop is faster than the
+# stacked traversal, so forests built from sklearn models hand over to it
+PER_TREE_MIN_ROWS = 1000
+
+# One .npy file per array in a forest directory
+FOREST_ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+class StackedForest:
+    """
+    Every tree of a fitted regression forest flattened into shared node
+    arrays, so all trees can be evaluated for a whole batch in one
+    vectorized traversal instead of one ``tree.predict`` call per tree.
+
+    ``children`` holds the (left, right) child of every node, and leaves
+    point to themselves; ``roots`` holds the first node of each tree. Saved
+    forests are plain ``.npy`` files, so :meth:`load` can memory-map them
+    and every worker process shares the same read-only pages.
+
+    A forest built by :meth:`from_sklearn` keeps the source ``estimators``
+    and evaluates batches of ``PER_TREE_MIN_ROWS`` or more with them.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        estimators: Optional[list] = None
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.estimators = estimators
+
+    @property
+    def tree_count(self) -> int:
+        return len(self.roots)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.children[:, 0]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.children[:, 1]
+
+    @classmethod
+    def from_sklearn(cls, forest: RandomForestRegressor) -> "StackedForest":
+        """Flatten the single-output trees of a fitted sklearn forest."""
+        features: List[np.ndarray] = []
+        thresholds: List[np.ndarray] = []
+        lefts: List[np.ndarray] = []
+        rights: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        roots: List[int] = []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            offset += tree.node_count
+        return cls(
+            np.concatenate(features).astype(np.int32),
+            np.concatenate(thresholds).astype(np.float64),
+            np.column_stack([np.concatenate(lefts), np.concatenate(rights)]).astype(np.int32),
+            np.concatenate(values).astype(np.float64),
+            np.asarray(roots, dtype=np.int32),
+            list(forest.estimators_)
+        )
+
+    def save(self, directory: str):
+        """Write each array as ``<directory>/<name>.npy``."""
+        os.makedirs(directory, exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "StackedForest":
+        """Load a saved forest, memory-mapped read-only by default."""
+        return cls(**{
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in FOREST_ARRAYS
+        })
+
+    def tree_predictions(self, X: np.ndarray) -> np.ndarray:
+        """Prediction of every tree for every row, shape ``(tree_count, len(X))``."""
+        # sklearn trees split on float32 features
+        X = np.asarray(X, dtype=np.float32)
+        if self.estimators is not None and len(X) >= PER_TREE_MIN_ROWS:
+            X = np.ascontiguousarray(X)
+            return np.stack([estimator.predict(X, check_input=False) for estimator in self.estimators])
+
+        X = X.astype(np.float64)
+        samples, width = X.shape
+        flat_X = X.ravel()
+        # Flat (left, right) pairs so the branch taken indexes directly
+        children, feature, threshold = self.children.reshape(-1), self.feature, self.threshold
+
+        nodes = np.repeat(self.roots.astype(np.int64), samples)
+        row_offsets = np.tile(np.arange(samples, dtype=np.int64) * width, self.tree_count)
+
+        # Descend (tree, row) pairs together in cache-sized blocks, dropping
+        # pairs from the working set once enough of them reached a leaf
+        for start in range(0, len(nodes), TRAVERSAL_BLOCK):
+            block = nodes[start:start + TRAVERSAL_BLOCK]
+            current = block.copy()
+            offsets = row_offsets[start:start + TRAVERSAL_BLOCK]
+            active = np.arange(len(block))
+            while len(active):
+                go_right = flat_X[offsets + feature[current]] > threshold[current]
+                following = children[2 * current + go_right]
+                moving = following != current
+                descending = np.count_nonzero(moving)
+                if descending >= COMPACT_BELOW * len(active):
+                    current = following
+                    continue
+                block[active] = following
+                active, current, offsets = active[moving], following[moving], offsets[moving]
+        return self.value[nodes].reshape(self.tree_count, samples)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Forest prediction (mean over trees) for every row."""
+        return self.tree_predictions(X).mean(axis=0)
@@ -0,0 +1,192 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+import asyncio
+from app.api.route_engine.traffic import EdgeTraffic, tile_bbox, tiles_covering
+from app.core.location import Location
+from app.core.settings import settings
+from app.db.geocells import cell_center, geohash_encode
+from app.services.collectors import (
+    AirQualityDataCollector,
+    BaseDataCollector,
+    TrafficDataCollector,
+    WeatherDataCollector
+)
+from app.services.rate_limiter import Priority
+
+# Data types warmed by the scheduler and the collector that fetches each
+PREFETCH_COLLECTORS = {
+    "weather": WeatherDataCollector,
+    "air_quality": AirQualityDataCollector,
+    "traffic": TrafficDataCollector
+}
+
+def _points(document: Dict[str, Any]) -> Iterable[Tuple[float, float]]:
+    """(lat, lon) points of a route or vehicle document."""
+    for field in ("start_point", "end_point", "start_location", "end_location", "location"):
+        point = document.get(field)
+        if point and "lat" in point and "lon" in point:
+            yield point["lat"], point["lon"]
+    for point in document.get("waypoints") or ():
+        yield point["lat"], point["lon"]
+
+class PrefetchScheduler:
+    """
+    Keeps weather, AQI and traffic warm in the cache for the geohash cells
+    where recent routes and vehicles are.
+
+    Each data type has its own loop that refreshes every active cell once
+    per ``refresh_fraction`` of the type's cache TTL, so entries are
+    rewritten before they go stale. Requests go through the collectors at
+    prefetch priority, so they back off under the upstream rate limits and
+    write through to the cache. With several workers, a short Redis lock
+    per data type and cycle lets only one of them do the refresh.
+    
+    With ``edge_traffic`` set, traffic flow is also ingested tile by tile
+    over the road graph's extent into its per-edge arrays. Every worker
+    keeps its own arrays, but tiles are read through the cache, so each
+    tile is fetched from the provider once per traffic TTL.
+    """
+
+    def __init__(
+        self,
+        db,
+        cache,
+        collectors: Optional[Dict[str, BaseDataCollector]] = None,
+        route_limit: int = settings.PREFETCH_ROUTE_LIMIT,
+        max_cells: int = settings.PREFETCH_MAX_CELLS,
+        concurrency: int = settings.PREFETCH_CONCURRENCY,
+        refresh_fraction: float = settings.PREFETCH_REFRESH_FRACTION,
+        edge_traffic: Optional[EdgeTraffic] = None,
+        tile_zoom: int = settings.TRAFFIC_TILE_ZOOM
+    ):
+        self.db = db
+        self.cache = cache
+        self.collectors = collectors or {
+            data_type: collector(cache=cache) for data_type, collector in PREFETCH_COLLECTORS.items()
+        }
+        self.route_limit = route_limit
+        self.max_cells = max_cells
+        self.concurrency = concurrency
+        self.refresh_fraction = refresh_fraction
+        self.edge_traffic = edge_traffic
+        self.tile_zoom = tile_zoom
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {data_type: {"cycles": 0, "refreshed": 0, "degraded": 0} for data_type in self.collectors}
+        self.stats["traffic_tiles"] = {"cycles": 0, "tiles": 0, "edges": 0}
+
+    def start(self):
+        """Start one refresh loop per data type, plus tile ingestion with ``edge_traffic``."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run(data_type)) for data_type in self.collectors
+            ]
+            if self.edge_traffic is not None:
+                self._tasks.append(asyncio.create_task(self._run_tiles()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def interval(self, data_type: str) -> float:
+        """Seconds between refreshes of a data type."""
+        return self.cache.ttls[data_type].total_seconds() * self.refresh_fraction
+
+    async def active_cells(self) -> List[str]:
+        """
+        Cells covering the most recent routes and all located vehicles,
+        busiest first and at most ``max_cells``.
+        """
+        counts: Counter = Counter()
+        routes = self.db["routes"].find(
+            {},
+            {"start_point": 1, "end_point": 1, "start_location": 1, "end_location": 1, "waypoints": 1}
+        ).sort("_id", -1).limit(self.route_limit)
+        vehicles = self.db["vehicles"].find({"location.lat": {"$exists": True}}, {"location": 1})
+        for cursor in (routes, vehicles):
+            async for document in cursor:
+                for lat, lon in _points(document):
+                    counts[geohash_encode(lat, lon, self.cache.geohash_precision)] += 1
+        return [cell for cell, _ in counts.most_common(self.max_cells)]
+
+    async def refresh(self, data_type: str, cells: Iterable[str]):
+        """Fetch a data type for every cell centre, a few at a time."""
+        collector = self.collectors[data_type]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stats = self.stats[data_type]
+
+        async def refresh_cell(cell: str):
+            lat, lon = cell_center(cell)
+            async with semaphore:
+                data = await collector.collect_data(Location(lat=lat, lon=lon), Priority.PREFETCH)
+            if data.get("degraded"):
+                stats["degraded"] += 1
+            else:
+                stats["refreshed"] += 1
+
+        await asyncio.gather(*[refresh_cell(cell) for cell in cells])
+        stats["cycles"] += 1
+
+    async def refresh_traffic_tiles(self):
+        """Ingest flow tiles covering the road graph into ``edge_traffic``."""
+        graph = self.edge_traffic.graph
+        tiles = tiles_covering(
+            float(graph.lat.min()), float(graph.lon.min()),
+            float(graph.lat.max()), float(graph.lon.max()),
+            self.tile_zoom
+        )
+        collector = self.collectors["traffic"]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stats = self.stats["traffic_tiles"]
+
+        async def refresh_tile(tile: Tuple[int, int, int]):
+            bbox = tile_bbox(*tile)
+            async with semaphore:
+                flow = await self.cache.get_or_refresh(
+                    "traffic_tile:{}/{}/{}".format(*tile),
+                    "traffic",
+                    lambda: collector.collect_flow_tile(*bbox, priority=Priority.PREFETCH)
+                )
+            if flow:
+                stats["tiles"] += 1
+                # Stamped with the fetch time, so a stale cached tile ages out
+                stats["edges"] += self.edge_traffic.ingest_tile(flow, now=flow.get("fetched_at"))
+
+        await asyncio.gather(*[refresh_tile(tile) for tile in tiles])
+        stats["cycles"] += 1
+
+    async def _run_tiles(self):
+        while True:
+            try:
+                await self.refresh_traffic_tiles()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Prefetch traffic tiles error: {e}")
+            await asyncio.sleep(self.interval("traffic"))
+
+    async def _claim_cycle(self, data_type: str, interval: float) -> bool:
+        """Whether this worker should run the current cycle for a data type."""
+        try:
+            return bool(await self.cache.redis.set(
+                f"prefetch:{data_type}",
+                self.cache.instance_id,
+                nx=True,
+                px=max(1, int(interval * 1000))
+            ))
+        except Exception as e:
+            print(f"Prefetch lock error: {e}")
+            return True
+
+    async def _run(self, data_type: str):
+        while True:
+            interval = self.interval(data_type)
+            try:
+                if await self._claim_cycle(data_type, interval):
+                    await self.refresh(data_type, await self.active_cells())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Prefetch {data_type} error: {e}")
+            await asyncio.sleep(interval)
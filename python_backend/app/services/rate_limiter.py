@@ -0,0 +1,171 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import defaultdict
+from dataclasses import dataclass
+from enum import IntEnum
+import asyncio
+from app.utils.error_handling.exceptions import RateLimitExceededError
+
+class Priority(IntEnum):
+    """Request priority for upstream budgets; lower values are served first."""
+    OPTIMIZE = 0  # on the request path of route optimization
+    INTERACTIVE = 1  # other user-facing lookups
+    PREFETCH = 2  # background cache warming
+
+@dataclass
+class ProviderLimit:
+    """Token bucket for one upstream provider."""
+    rate: float  # tokens refilled per second
+    capacity: float  # burst size
+
+# Share of each bucket a priority may not dip into, so background work
+# backs off while there is still budget left for optimize requests
+PRIORITY_RESERVE = {
+    Priority.OPTIMIZE: 0.0,
+    Priority.INTERACTIVE: 0.2,
+    Priority.PREFETCH: 0.5
+}
+
+# Longest a waiter sleeps before re-checking the bucket
+MAX_WAIT_SECONDS = 1.0
+
+# Atomically refill the bucket from Redis server time and try to take
+# tokens without going below the caller's reserve. Returns whether the
+# tokens were taken, the tokens left and the seconds until enough refill.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local reserve = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens - requested >= reserve then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait = (requested + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+class RateLimiter:
+    """
+    Per-provider token buckets shared by all workers through Redis.
+
+    Within a worker, waiters are served in priority order: a request only
+    tries the bucket while no higher-priority request for the same
+    provider is queued. Across workers, lower priorities keep a reserve
+    of the bucket untouched (see ``PRIORITY_RESERVE``).
+    """
+
+    def __init__(self, redis, limits: Dict[str, ProviderLimit], key_prefix: str = "ratelimit"):
+        self.redis = redis
+        self.limits = limits
+        self.key_prefix = key_prefix
+        self._waiting: Dict[str, Dict[Priority, int]] = defaultdict(lambda: defaultdict(int))
+        self._budget: Dict[str, float] = {provider: limit.capacity for provider, limit in limits.items()}
+        self._denied: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def from_settings(cls, redis, settings) -> "RateLimiter":
+        burst = settings.UPSTREAM_BURST_SECONDS
+        limits = {
+            provider: ProviderLimit(rate=rate, capacity=max(1.0, rate * burst))
+            for provider, rate in (
+                ("tomtom", settings.TOMTOM_RATE_LIMIT),
+                ("openweather", settings.OPENWEATHER_RATE_LIMIT),
+                ("aqicn", settings.AQICN_RATE_LIMIT)
+            )
+        }
+        return cls(redis, limits)
+
+    async def _take(self, provider: str, priority: Priority, tokens: float) -> Tuple[bool, float, float]:
+        limit = self.limits[provider]
+        allowed, remaining, wait = await self.redis.eval(
+            TOKEN_BUCKET_SCRIPT,
+            1,
+            f"{self.key_prefix}:{provider}",
+            limit.rate,
+            limit.capacity,
+            tokens,
+            # A full bucket always admits a request, however small the bucket
+            min(limit.capacity * PRIORITY_RESERVE[priority], limit.capacity - tokens)
+        )
+        return bool(int(allowed)), float(remaining), float(wait)
+
+    def _higher_priority_waiting(self, provider: str, priority: Priority) -> bool:
+        return any(count for queued, count in self._waiting[provider].items() if queued < priority)
+
+    async def acquire(
+        self,
+        provider: str,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None,
+        tokens: float = 1.0
+    ):
+        """
+        Wait for budget to call ``provider``. Raises RateLimitExceededError
+        if none is available within ``timeout`` seconds. Providers without
+        a configured limit, or an unreachable Redis, are not limited.
+        """
+        if provider not in self.limits:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        self._waiting[provider][priority] += 1
+        try:
+            while True:
+                if self._higher_priority_waiting(provider, priority):
+                    wait = 1.0 / self.limits[provider].rate
+                else:
+                    try:
+                        allowed, remaining, wait = await self._take(provider, priority, tokens)
+                    except Exception as e:
+                        print(f"Rate limiter error: {e}")
+                        return
+                    self._budget[provider] = remaining
+                    if allowed:
+                        return
+
+                if deadline is not None and loop.time() + min(wait, MAX_WAIT_SECONDS) > deadline:
+                    self._denied[provider] += 1
+                    raise RateLimitExceededError(
+                        f"{provider} request budget exhausted for {priority.name.lower()} requests"
+                    )
+                await asyncio.sleep(min(wait, MAX_WAIT_SECONDS))
+        finally:
+            self._waiting[provider][priority] -= 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth per priority and last seen budget for each provider."""
+        return {
+            provider: {
+                "budget_remaining": self._budget[provider],
+                "capacity": limit.capacity,
+                "rate_per_second": limit.rate,
+                "queue_depth": {
+                    priority.name.lower(): self._waiting[provider][priority] for priority in Priority
+                },
+                "denied": self._denied[provider]
+            }
+            for provider, limit in self.limits.items()
+        }
+
+# Limiter shared by the collectors; set on application startup
+_rate_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    return _rate_limiter
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    global _rate_limiter
+    _rate_limiter = limiter
@@ -1,28 +1,36 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Union
+import os
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
 import joblib
 import pandas as pd
 from datetime import datetime, time
-from models.route import Route, RoutePoint
-from models.vehicle import Vehicle
+from app.core.route import Route
+from app.core.vehicle import Vehicle
+from app.services.feature_pipeline import FeaturePipeline
+from app.services.forest import StackedForest
+
+MODEL_NAMES = ('traffic', 'emissions', 'duration')
 
 class RoutePredictor:
     def __init__(self):
         self.traffic_model = None
         self.emissions_model = None
         self.duration_model = None
-        self.scaler = StandardScaler()
+        self._stacked_forests: Dict[str, StackedForest] = {}
         self.feature_columns = [
             'hour', 'day_of_week', 'is_holiday', 'distance_km',
             'vehicle_type', 'vehicle_load_ratio', 'temperature',
             'precipitation', 'wind_speed', 'air_quality_index'
         ]
+        self.features = FeaturePipeline(self.feature_columns)
 
     def train_models(self, historical_data: pd.DataFrame):
         """Train prediction models using historical route data."""
-        X = self._prepare_features(historical_data)
+        self._stacked_forests = {}
+        # The pipeline is fitted here only; updates and inference reuse it
+        self.features = FeaturePipeline(self.feature_columns)
+        X = self.features.fit_transform(historical_data)
         
         # Train traffic prediction model
         y_traffic = historical_data['traffic_delay']
@@ -48,30 +56,66 @@ class RoutePredictor:
         current_time: Optional[datetime] = None
     ) -> Dict:
         """Predict traffic, emissions, and duration for a route."""
-        if not all([self.traffic_model, self.emissions_model, self.duration_model]):
-            raise ValueError("Models not trained. Call train_models first.")
+        self._check_trained()
         
         # Prepare features for prediction
         features = self._extract_features(
             route, vehicle, weather_data, aqi_data, current_time or datetime.now()
         )
-        X = self.scaler.transform(features.reshape(1, -1))
+        X = self.features.scale(features.reshape(1, -1))
         
-        # Make predictions
-        traffic_delay = float(self.traffic_model.predict(X)[0])
-        emissions = float(self.emissions_model.predict(X)[0])
-        duration = float(self.duration_model.predict(X)[0])
+        # Make predictions (forest mean) and confidences from one pass over the trees
+        predictions = self._tree_predictions(X)
         
         return {
-            "predicted_traffic_delay": traffic_delay,
-            "predicted_emissions": emissions,
-            "predicted_duration": duration,
-            "confidence_scores": self._calculate_confidence_scores(X)
+            "predicted_traffic_delay": float(predictions["traffic"].mean()),
+            "predicted_emissions": float(predictions["emissions"].mean()),
+            "predicted_duration": float(predictions["duration"].mean()),
+            "confidence_scores": {
+                f"{name}_confidence": float(self._confidence(values)[0])
+                for name, values in predictions.items()
+            }
+        }
+
+    def predict_batch(
+        self,
+        routes: Sequence[Route],
+        vehicles: Union[Vehicle, Sequence[Vehicle]],
+        weather_data: Union[Dict, Sequence[Dict]],
+        aqi_data: Union[Dict, Sequence[Dict]],
+        current_time: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Predict traffic, emissions, and duration for many candidate routes in
+        one pass. ``vehicles``, ``weather_data`` and ``aqi_data`` are either
+        one entry per route or a single entry shared by all routes. Returns
+        one array per metric and per-route confidence scores.
+        """
+        self._check_trained()
+        
+        X = self.features.scale(self._extract_batch_features(
+            routes, vehicles, weather_data, aqi_data, current_time or datetime.now()
+        ))
+        predictions = self._tree_predictions(X)
+        
+        return {
+            "predicted_traffic_delay": predictions["traffic"].mean(axis=0),
+            "predicted_emissions": predictions["emissions"].mean(axis=0),
+            "predicted_duration": predictions["duration"].mean(axis=0),
+            "confidence_scores": {
+                f"{name}_confidence": self._confidence(values) for name, values in predictions.items()
+            }
         }
 
     def update_models(self, new_data: pd.DataFrame):
         """Update models with new route data."""
-        X = self._prepare_features(new_data)
+        if self._stacked_forests and not self.traffic_model:
+            raise ValueError("Compiled models cannot be updated. Load them with compiled=False.")
+        self._stacked_forests = {}
+        if self.features.fitted:
+            X = self.features.transform(new_data)
+        else:
+            X = self.features.fit_transform(new_data)
         
         # Update traffic model
         y_traffic = new_data['traffic_delay']
@@ -114,31 +158,34 @@ class RoutePredictor:
         joblib.dump(self.traffic_model, f"{path}/traffic_model.joblib")
         joblib.dump(self.emissions_model, f"{path}/emissions_model.joblib")
         joblib.dump(self.duration_model, f"{path}/duration_model.joblib")
-        joblib.dump(self.scaler, f"{path}/scaler.joblib")
-
-    def load_models(self, path: str):
-        """Load trained models from disk."""
-        self.traffic_model = joblib.load(f"{path}/traffic_model.joblib")
-        self.emissions_model = joblib.load(f"{path}/emissions_model.joblib")
-        self.duration_model = joblib.load(f"{path}/duration_model.joblib")
-        self.scaler = joblib.load(f"{path}/scaler.joblib")
-
-    def _prepare_features(self, data: pd.DataFrame) -> np.ndarray:
-        """Prepare feature matrix from historical data."""
-        X = data[self.feature_columns].copy()
-        
-        # Convert categorical variables
-        X['vehicle_type'] = X['vehicle_type'].map({
-            'light_duty': 0,
-            'medium_duty': 1,
-            'heavy_duty': 2,
-            'electric': 3,
-            'hybrid': 4
-        })
-        
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X)
-        return X_scaled
+        self.features.save(f"{path}/feature_pipeline.joblib")
+        self.export_forests(path)
+
+    def export_forests(self, path: str):
+        """Write each model as a flat array forest in ``<path>/<name>_forest/``."""
+        models = dict(zip(MODEL_NAMES, (self.traffic_model, self.emissions_model, self.duration_model)))
+        for name, model in models.items():
+            StackedForest.from_sklearn(model).save(f"{path}/{name}_forest")
+
+    def load_models(self, path: str, compiled: bool = True):
+        """
+        Load trained models from disk. With ``compiled`` (the default for
+        serving) the flat array forests are memory-mapped when present, so
+        loading takes milliseconds and worker processes share the pages;
+        such models can predict but not be updated.
+        """
+        self._stacked_forests = {}
+        self.traffic_model = self.emissions_model = self.duration_model = None
+        if compiled and all(os.path.isdir(f"{path}/{name}_forest") for name in MODEL_NAMES):
+            self._stacked_forests = {
+                name: StackedForest.load(f"{path}/{name}_forest") for name in MODEL_NAMES
+            }
+        else:
+            self.traffic_model = joblib.load(f"{path}/traffic_model.joblib")
+            self.emissions_model = joblib.load(f"{path}/emissions_model.joblib")
+            self.duration_model = joblib.load(f"{path}/duration_model.joblib")
+        self.features = FeaturePipeline.load(f"{path}/feature_pipeline.joblib")
+        self.feature_columns = self.features.feature_columns
 
     def _extract_features(
         self,
@@ -148,49 +195,93 @@ class RoutePredictor:
         aqi_data: Dict,
         current_time: datetime
     ) -> np.ndarray:
-        """Extract features for prediction."""
-        features = np.zeros(len(self.feature_columns))
-        
-        # Time-based features
-        features[0] = current_time.hour
-        features[1] = current_time.weekday()
-        features[2] = self._is_holiday(current_time)
-        
-        # Route features
-        features[3] = route.total_distance
-        
-        # Vehicle features
-        vehicle_type_map = {
-            'light_duty': 0,
-            'medium_duty': 1,
-            'heavy_duty': 2,
-            'electric': 3,
-            'hybrid': 4
-        }
-        features[4] = vehicle_type_map.get(vehicle.type, 0)
-        features[5] = (vehicle.current_load or 0) / vehicle.cargo_capacity
+        """Extract features for prediction, encoded by the saved feature pipeline."""
+        return self.features.encode_row({
+            # Time-based features
+            'hour': current_time.hour,
+            'day_of_week': current_time.weekday(),
+            'is_holiday': self._is_holiday(current_time),
+            # Route features
+            'distance_km': route.total_distance,
+            # Vehicle features
+            'vehicle_type': vehicle.vehicle_type,
+            'vehicle_load_ratio': (vehicle.current_load or 0) / vehicle.max_load,
+            # Weather features
+            'temperature': weather_data.get('temp', 20),
+            'precipitation': weather_data.get('precipitation', 0),
+            'wind_speed': weather_data.get('wind_speed', 0),
+            # Air quality features
+            'air_quality_index': aqi_data.get('data', {}).get('aqi', 50)
+        })
+
+    def _extract_batch_features(
+        self,
+        routes: Sequence[Route],
+        vehicles: Union[Vehicle, Sequence[Vehicle]],
+        weather_data: Union[Dict, Sequence[Dict]],
+        aqi_data: Union[Dict, Sequence[Dict]],
+        current_time: datetime
+    ) -> np.ndarray:
+        """
+        Feature matrix with one row per route, in ``feature_columns`` order,
+        encoded by the saved feature pipeline.
+        """
+        n = len(routes)
         
-        # Weather features
-        features[6] = weather_data.get('temp', 20)
-        features[7] = weather_data.get('precipitation', 0)
-        features[8] = weather_data.get('wind_speed', 0)
+        def per_route(entries):
+            return [entries] * n if isinstance(entries, (dict, Vehicle)) else entries
         
-        # Air quality features
-        features[9] = aqi_data.get('data', {}).get('aqi', 50)
+        vehicles, weather_data, aqi_data = (
+            per_route(vehicles), per_route(weather_data), per_route(aqi_data)
+        )
+        if not len(vehicles) == len(weather_data) == len(aqi_data) == n:
+            raise ValueError("Vehicle, weather and AQI inputs must match the number of routes")
         
-        return features
+        return self.features.encode({
+            # Time-based features
+            'hour': [current_time.hour] * n,
+            'day_of_week': [current_time.weekday()] * n,
+            'is_holiday': [self._is_holiday(current_time)] * n,
+            # Route features
+            'distance_km': [route.total_distance for route in routes],
+            # Vehicle features
+            'vehicle_type': [v.vehicle_type for v in vehicles],
+            'vehicle_load_ratio': [(v.current_load or 0) / v.max_load for v in vehicles],
+            # Weather features
+            'temperature': [w.get('temp', 20) for w in weather_data],
+            'precipitation': [w.get('precipitation', 0) for w in weather_data],
+            'wind_speed': [w.get('wind_speed', 0) for w in weather_data],
+            # Air quality features
+            'air_quality_index': [a.get('data', {}).get('aqi', 50) for a in aqi_data]
+        })
+
+    def _check_trained(self):
+        """Raise unless every model is available, as sklearn or compiled forest."""
+        models = (self.traffic_model, self.emissions_model, self.duration_model)
+        if not all(models) and not all(name in self._stacked_forests for name in MODEL_NAMES):
+            raise ValueError("Models not trained. Call train_models first.")
+
+    def _tree_predictions(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Per-tree predictions ``(n_trees, n_rows)`` of each model from one stacked traversal."""
+        models = dict(zip(MODEL_NAMES, (self.traffic_model, self.emissions_model, self.duration_model)))
+        predictions = {}
+        for name, model in models.items():
+            if name not in self._stacked_forests:
+                self._stacked_forests[name] = StackedForest.from_sklearn(model)
+            predictions[name] = self._stacked_forests[name].tree_predictions(X)
+        return predictions
+
+    @staticmethod
+    def _confidence(tree_predictions: np.ndarray) -> np.ndarray:
+        """One minus the coefficient of variation across trees, per row."""
+        return 1 - tree_predictions.std(axis=0) / tree_predictions.mean(axis=0)
 
     def _calculate_confidence_scores(self, X: np.ndarray) -> Dict[str, float]:
         """Calculate confidence scores for predictions."""
         # Use standard deviation of predictions across trees as confidence measure
-        traffic_predictions = np.array([tree.predict(X) for tree in self.traffic_model.estimators_])
-        emissions_predictions = np.array([tree.predict(X) for tree in self.emissions_model.estimators_])
-        duration_predictions = np.array([tree.predict(X) for tree in self.duration_model.estimators_])
-        
         return {
-            "traffic_confidence": 1 - (np.std(traffic_predictions) / np.mean(traffic_predictions)),
-            "emissions_confidence": 1 - (np.std(emissions_predictions) / np.mean(emissions_predictions)),
-            "duration_confidence": 1 - (np.std(duration_predictions) / np.mean(duration_predictions))
+            f"{name}_confidence": float(self._confidence(values.reshape(-1, 1))[0])
+            for name, values in self._tree_predictions(X).items()
         }
 
     def _is_holiday(self, date: datetime) -> int:
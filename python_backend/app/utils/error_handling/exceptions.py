@@ -12,4 +12,9 @@ class AuthenticationError(FedExGreenRouterError):
 
 class ResourceNotFoundError(FedExGreenRouterError):
     """Raised when a requested resource is not found."""
-    pass 
\ No newline at end of file
+    pass 
+
+
+class RateLimitExceededError(FedExGreenRouterError):
+    """Raised when an upstream provider's request budget is exhausted."""
+    pass
@@ -1,27 +1,47 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
-from .exceptions import FedExGreenRouterError, ValidationError, AuthenticationError, ResourceNotFoundError
+from .exceptions import (
+    FedExGreenRouterError,
+    ValidationError,
+    AuthenticationError,
+    ResourceNotFoundError,
+    RateLimitExceededError
+)
+from app.utils.metrics_collector import MetricsCollector
+
+metrics_collector = MetricsCollector()
 
 async def fedex_error_handler(request: Request, exc: FedExGreenRouterError):
+    await metrics_collector.record_error(str(exc), 500)
     return JSONResponse(
         status_code=500,
         content={"message": str(exc)},
     )
 
 async def validation_error_handler(request: Request, exc: ValidationError):
+    await metrics_collector.record_error(str(exc), 400)
     return JSONResponse(
         status_code=400,
         content={"message": str(exc)},
     )
 
 async def authentication_error_handler(request: Request, exc: AuthenticationError):
+    await metrics_collector.record_error(str(exc), 401)
     return JSONResponse(
         status_code=401,
         content={"message": str(exc)},
     )
 
 async def not_found_error_handler(request: Request, exc: ResourceNotFoundError):
+    await metrics_collector.record_error(str(exc), 404)
     return JSONResponse(
         status_code=404,
         content={"message": str(exc)},
-    ) 
\ No newline at end of file
+    ) 
+
+async def rate_limit_error_handler(request: Request, exc: RateLimitExceededError):
+    await metrics_collector.record_error(str(exc), 429)
+    return JSONResponse(
+        status_code=429,
+        content={"message": str(exc)},
+    )
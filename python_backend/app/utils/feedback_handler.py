@@ -1,9 +1,14 @@
 from typing import Dict, List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
-from models.route import Route
-from models.vehicle import Vehicle
-from persistence.db_handler import db
+from app.core.route import Route
+from app.core.vehicle import Vehicle
+from app.db.persistence import db
+from app.core.settings import settings
+from app.db.local_cache import LocalCache
+
+# Recent analytics results keyed by date range
+_analytics_cache = LocalCache(max_entries=256)
 
 class RouteFeedback(BaseModel):
     """Model for route feedback data."""
@@ -37,7 +42,7 @@ class FeedbackHandler:
         try:
             # Store feedback in database
             feedback_dict = feedback.dict()
-            await db.insert_one("route_feedback", feedback_dict)
+            await db["route_feedback"].insert_one(feedback_dict)
             
             # Update route statistics
             await FeedbackHandler._update_route_stats(feedback)
@@ -59,15 +64,28 @@ class FeedbackHandler:
     @staticmethod
     async def get_route_feedback(route_id: str) -> List[RouteFeedback]:
         """Get all feedback for a specific route."""
-        feedback_data = await db.find("route_feedback", {"route_id": route_id})
+        feedback_data = await db["route_feedback"].find({"route_id": route_id}).to_list(None)
         return [RouteFeedback(**data) for data in feedback_data]
 
     @staticmethod
     async def get_analytics(
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        use_cache: bool = True
     ) -> FeedbackAnalytics:
-        """Get analytics for feedback within a date range."""
+        """
+        Get analytics for feedback within a date range.
+        
+        Counts and averages come from one aggregation, so memory use does not
+        grow with the amount of feedback. Results are cached per date range
+        for ``FEEDBACK_ANALYTICS_CACHE_TTL`` seconds unless ``use_cache`` is off.
+        """
+        cache_key = f"{start_date.isoformat() if start_date else ''}:{end_date.isoformat() if end_date else ''}"
+        if use_cache:
+            hit, cached = _analytics_cache.get(cache_key)
+            if hit:
+                return FeedbackAnalytics(**cached)
+        
         query = {}
         if start_date or end_date:
             query["timestamp"] = {}
@@ -76,33 +94,55 @@ class FeedbackHandler:
             if end_date:
                 query["timestamp"]["$lte"] = end_date
         
-        feedback_data = await db.find("route_feedback", query)
-        
-        # Calculate analytics
-        ratings = [f["rating"] for f in feedback_data]
-        traffic_scores = [f["traffic_accuracy"] for f in feedback_data if f.get("traffic_accuracy")]
-        weather_scores = [f["weather_impact"] for f in feedback_data if f.get("weather_impact")]
-        
-        # Calculate rating distribution
-        rating_dist = {i: ratings.count(i) for i in range(1, 6)}
+        # $avg skips missing scores, as the optional ratings may be unset
+        pipeline = [
+            {"$match": query},
+            {"$project": {"_id": 0, "rating": 1, "traffic_accuracy": 1, "weather_impact": 1}},
+            {
+                "$facet": {
+                    "summary": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "count": {"$sum": 1},
+                                "average_rating": {"$avg": "$rating"},
+                                "traffic_accuracy": {"$avg": "$traffic_accuracy"},
+                                "weather_impact": {"$avg": "$weather_impact"}
+                            }
+                        }
+                    ],
+                    "ratings": [{"$group": {"_id": "$rating", "count": {"$sum": 1}}}]
+                }
+            }
+        ]
+        results = await db["route_feedback"].aggregate(pipeline).to_list(None)
+        facets = results[0] if results else {}
+        summary = (facets.get("summary") or [{}])[0]
+        rating_dist = {i: 0 for i in range(1, 6)}
+        for bucket in facets.get("ratings", []):
+            if bucket["_id"] in rating_dist:
+                rating_dist[bucket["_id"]] = bucket["count"]
         
         # Analyze comments for common issues and suggestions
-        issues, suggestions = await FeedbackHandler._analyze_comments(feedback_data)
+        issues, suggestions = await FeedbackHandler._analyze_comments(query)
         
-        return FeedbackAnalytics(
-            average_rating=sum(ratings) / len(ratings) if ratings else 0,
-            total_feedback_count=len(feedback_data),
+        analytics = FeedbackAnalytics(
+            average_rating=summary.get("average_rating") or 0,
+            total_feedback_count=summary.get("count", 0),
             rating_distribution=rating_dist,
-            traffic_accuracy_score=sum(traffic_scores) / len(traffic_scores) if traffic_scores else 0,
-            weather_impact_score=sum(weather_scores) / len(weather_scores) if weather_scores else 0,
+            traffic_accuracy_score=summary.get("traffic_accuracy") or 0,
+            weather_impact_score=summary.get("weather_impact") or 0,
             common_issues=issues,
             improvement_suggestions=suggestions
         )
+        if use_cache and settings.FEEDBACK_ANALYTICS_CACHE_TTL > 0:
+            _analytics_cache.set(cache_key, analytics.dict(), settings.FEEDBACK_ANALYTICS_CACHE_TTL)
+        return analytics
 
     @staticmethod
     async def _update_route_stats(feedback: RouteFeedback):
         """Update route statistics based on feedback."""
-        stats = await db.find_one("route_stats", {"route_id": feedback.route_id})
+        stats = await db["route_stats"].find_one({"route_id": feedback.route_id})
         
         if stats:
             # Update existing stats
@@ -112,8 +152,7 @@ class FeedbackHandler:
                 / total_ratings
             )
             
-            await db.update_one(
-                "route_stats",
+            await db["route_stats"].update_one(
                 {"route_id": feedback.route_id},
                 {
                     "$set": {
@@ -131,8 +170,7 @@ class FeedbackHandler:
             )
         else:
             # Create new stats document
-            await db.insert_one(
-                "route_stats",
+            await db["route_stats"].insert_one(
                 {
                     "route_id": feedback.route_id,
                     "average_rating": feedback.rating,
@@ -146,8 +184,7 @@ class FeedbackHandler:
     async def _check_and_trigger_model_update(feedback: RouteFeedback):
         """Check if ML model update is needed and trigger if necessary."""
         # Get recent feedback count
-        recent_count = await db.count(
-            "route_feedback",
+        recent_count = await db["route_feedback"].count_documents(
             {
                 "timestamp": {
                     "$gte": datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -163,16 +200,15 @@ class FeedbackHandler:
     async def _trigger_model_update():
         """Trigger ML model update based on feedback data."""
         # Get all relevant feedback data
-        feedback_data = await db.find(
-            "route_feedback",
+        feedback_data = await db["route_feedback"].find(
             {"actual_duration": {"$exists": True}, "actual_emissions": {"$exists": True}}
-        )
+        ).to_list(None)
         
         # Prepare training data
         training_data = []
         for feedback in feedback_data:
-            route_data = await db.find_one("routes", {"route_id": feedback["route_id"]})
-            vehicle_data = await db.find_one("vehicles", {"vehicle_id": feedback["vehicle_id"]})
+            route_data = await db["routes"].find_one({"route_id": feedback["route_id"]})
+            vehicle_data = await db["vehicles"].find_one({"vehicle_id": feedback["vehicle_id"]})
             
             if route_data and vehicle_data:
                 training_data.append({
@@ -192,8 +228,8 @@ class FeedbackHandler:
             pass
 
     @staticmethod
-    async def _analyze_comments(feedback_data: List[Dict]) -> tuple[List[str], List[str]]:
-        """Analyze feedback comments for common issues and suggestions."""
+    async def _analyze_comments(query: Dict) -> tuple[List[str], List[str]]:
+        """Analyze comments of the feedback matching ``query`` for common issues and suggestions."""
         # Implement NLP-based analysis here
         # For now, return placeholder data
         return (
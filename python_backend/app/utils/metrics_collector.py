@@ -1,44 +1,195 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime
+import asyncio
+import time
 import uuid
-from persistence.db_handler import db
+from app.core.settings import settings
+from app.db.persistence import db
 
-class MetricsCollector:
-    """Collects and stores application metrics."""
+class MetricsWriter:
+    """
+    Buffers telemetry records (requests, errors) and writes them to Mongo in batches.
+
+    Records go into a bounded queue. A background task writes them with one
+    ``insert_many(ordered=False)`` per ``batch_size`` records, or
+    ``flush_interval`` seconds after the first record of a batch arrived.
+    When the queue is full, new records are dropped and counted instead of
+    blocking the request that produced them.
+    """
+
+    def __init__(
+        self,
+        collection=None,
+        batch_size: int = settings.METRICS_BATCH_SIZE,
+        flush_interval: float = settings.METRICS_FLUSH_INTERVAL,
+        max_queue: int = settings.METRICS_QUEUE_SIZE
+    ):
+        self.collection = collection if collection is not None else db.metrics
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    def record(self, record: Dict[str, Any]) -> bool:
+        """Queue a record without waiting; False if it was dropped."""
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    async def _get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next queued record; None on timeout or once ``close`` was called."""
+        getter = asyncio.ensure_future(self.queue.get())
+        closing = asyncio.ensure_future(self._closing.wait())
+        try:
+            await asyncio.wait({getter, closing}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closing.cancel()
+            if not getter.done():
+                getter.cancel()
+        return getter.result() if getter.done() and not getter.cancelled() else None
     
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """Up to ``batch_size`` records; shorter once the interval passes or on close."""
+        first = await self._get()
+        if first is None:
+            return []
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            record = await self._get(remaining)
+            if record is None:
+                break
+            batch.append(record)
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            # Records inserted before a failure stay written; count the batch as failed
+            self.stats["failed"] += len(batch)
+            print(f"Metrics write error: {e}")
+        self.stats["batches"] += 1
+
+    async def _run(self):
+        # Stopped by close() setting _closing, never cancelled, so a batch
+        # already taken off the queue is always written
+        while not self._closing.is_set():
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def flush(self):
+        """Write every queued record now."""
+        batch: List[Dict[str, Any]] = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+            if len(batch) == self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def close(self):
+        """Stop the background task and write what is left (called on shutdown)."""
+        self._closing.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        self._closing.clear()
+
+# Writers shared by every MetricsCollector in the worker, per collection
+_metrics_writers: Dict[str, MetricsWriter] = {}
+
+def get_metrics_writer(collection: str = "metrics") -> MetricsWriter:
+    writer = _metrics_writers.get(collection)
+    if writer is None:
+        writer = _metrics_writers[collection] = MetricsWriter(db[collection])
+    return writer
+
+async def close_metrics_writer():
+    """Flush and stop the shared writers (called on application shutdown)."""
+    for writer in list(_metrics_writers.values()):
+        await writer.close()
+    _metrics_writers.clear()
+
+class MetricsCollector:
+    """
+    Collects and stores application metrics.
+
+    Start times are kept in memory and completed requests are handed to a
+    ``MetricsWriter``, so tracking a request does no database round trip.
+    At most ``max_in_flight`` started requests are remembered; the oldest
+    are forgotten first, e.g. when a handler never ends its request.
+    """
+
+    def __init__(
+        self,
+        writer: Optional[MetricsWriter] = None,
+        error_writer: Optional[MetricsWriter] = None,
+        max_in_flight: int = settings.METRICS_MAX_IN_FLIGHT
+    ):
+        self._writer = writer
+        self._error_writer = error_writer
+        self.max_in_flight = max_in_flight
+        self._in_flight: "OrderedDict[str, Tuple[str, datetime, float]]" = OrderedDict()
+
+    @property
+    def writer(self) -> MetricsWriter:
+        return self._writer or get_metrics_writer()
+
+    @property
+    def error_writer(self) -> MetricsWriter:
+        return self._error_writer or get_metrics_writer("errors")
+
     async def start_request(self, endpoint: str) -> str:
         """Start tracking a request."""
         request_id = str(uuid.uuid4())
-        
-        await db.metrics.insert_one({
-            "request_id": request_id,
-            "endpoint": endpoint,
-            "start_time": datetime.utcnow(),
-            "status": "in_progress"
-        })
-        
+        if len(self._in_flight) >= self.max_in_flight:
+            self._in_flight.popitem(last=False)
+        self._in_flight[request_id] = (endpoint, datetime.utcnow(), time.perf_counter())
         return request_id
-    
+
     async def end_request(self, request_id: str, data: Dict[str, Any]):
-        """End request tracking and store metrics."""
-        end_time = datetime.utcnow()
-        
-        # Get start time
-        request = await db.metrics.find_one({"request_id": request_id})
-        if not request:
+        """End request tracking and queue its metrics for writing."""
+        started = self._in_flight.pop(request_id, None)
+        if started is None:
             return
-            
-        duration = (end_time - request["start_time"]).total_seconds()
-        
-        # Update metrics
-        await db.metrics.update_one(
-            {"request_id": request_id},
-            {
-                "$set": {
-                    "end_time": end_time,
-                    "duration": duration,
-                    "status": "completed",
-                    **data
-                }
-            }
-        ) 
\ No newline at end of file
+
+        endpoint, start_time, start = started
+        self.writer.record({
+            "request_id": request_id,
+            "endpoint": endpoint,
+            "start_time": start_time,
+            "end_time": datetime.utcnow(),
+            "duration": time.perf_counter() - start,
+            "status": "completed",
+            **data
+        })
+
+    async def record_error(self, message: str, status_code: int):
+        """Queue an error event for writing."""
+        self.error_writer.record({
+            "timestamp": datetime.utcnow(),
+            "status_code": status_code,
+            "error_message": message
+        })
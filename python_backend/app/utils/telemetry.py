@@ -0,0 +1,256 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager
+import asyncio
+import glob
+import json
+import math
+import os
+import time
+
+# Log-spaced latency bucket bounds (seconds): four per doubling from 0.5 ms
+# to about a minute, so any quantile is within ~19% of the true value
+LATENCY_BUCKETS = tuple(0.0005 * 2 ** (i / 4) for i in range(68))
+
+METRIC_HELP = {
+    "http_requests_total": "HTTP requests by method, route and status.",
+    "http_request_duration_seconds": "HTTP request latency by method and route.",
+    "pipeline_stage_duration_seconds": "Latency of request pipeline stages."
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Histogram:
+    """Counts of observations per bucket; ``counts[-1]`` holds those above the last bound."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated ``q`` quantile, interpolating within its bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """
+    In-process counters and latency histograms keyed by name and labels.
+
+    Updates are plain increments with no await in between, so they are
+    atomic on the event loop and need no locks. ``snapshot`` and ``merge``
+    move the data between workers (see ``MultiprocessExporter``) and
+    ``render`` writes the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get((name, _label_key(labels)))
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """Record the duration of a block under ``pipeline_stage_duration_seconds``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("pipeline_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def snapshot(self) -> Dict[str, List]:
+        """JSON-serializable copy of every metric."""
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+            "histograms": [
+                [name, list(labels), histogram.counts, histogram.sum]
+                for (name, labels), histogram in self.histograms.items()
+            ]
+        }
+
+    def merge(self, snapshot: Dict[str, List]):
+        """Add another registry's snapshot into this one."""
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        for name, labels, counts, total in snapshot.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            for index, count in enumerate(counts):
+                histogram.counts[index] += count
+            histogram.sum += total
+            histogram.count += sum(counts)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else f"{bound:.6g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+class MultiprocessExporter:
+    """
+    Shares a worker's registry with the other uvicorn workers.
+
+    Each worker periodically writes its snapshot to ``directory`` as
+    ``worker-<pid>.json``; a scrape served by any worker merges every
+    snapshot file with its own live registry. Files of exited workers are
+    kept so totals do not go backwards; clear the directory when the
+    server (re)starts.
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.json")
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self):
+        """Atomically replace this worker's snapshot file."""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(temporary, self.path)
+
+    def collect(self) -> MetricsRegistry:
+        """Merged registry of this worker and every snapshot file."""
+        merged = MetricsRegistry(self.registry.buckets)
+        merged.merge(self.registry.snapshot())
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            if path == self.path:
+                continue
+            try:
+                with open(path) as f:
+                    merged.merge(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Metrics snapshot error: {e}")
+        return merged
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.write()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Metrics snapshot error: {e}")
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording ``http_requests_total`` and
+    ``http_request_duration_seconds`` per method, route template and status.
+    Requests matching no route are labelled ``unmatched`` to bound the
+    number of series.
+    """
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        self.registry = registry or get_metrics_registry()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            self.registry.observe(
+                "http_request_duration_seconds", time.perf_counter() - start, method=method, route=route
+            )
+            self.registry.inc("http_requests_total", method=method, route=route, status=status)
+
+# Registry of this worker, shared by the middleware and pipeline stages
+_registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
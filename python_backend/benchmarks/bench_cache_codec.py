@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare size and encode/decode latency of cache value codecs against the
+plain JSON text CacheManager used to store.
+
+    python benchmarks/bench_cache_codec.py --segments 500 --rounds 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, List, Tuple
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db.codec import CacheCodec, _compressors, _serializers
+
+def route_payload(segments: int, seed: int = 42) -> dict:
+    """Route cache entry with full per-segment geometry and conditions."""
+    rng = np.random.default_rng(seed)
+    lat = 40.7128 + np.cumsum(rng.normal(0, 0.001, segments + 1))
+    lon = -74.0060 + np.cumsum(rng.normal(0, 0.001, segments + 1))
+    return {
+        "route_id": "route_benchmark",
+        "total_distance": float(rng.uniform(10, 200)),
+        "total_duration": float(rng.uniform(20, 300)),
+        "segments": [
+            {
+                "start": {"lat": float(lat[i]), "lon": float(lon[i])},
+                "end": {"lat": float(lat[i + 1]), "lon": float(lon[i + 1])},
+                "geometry": [[float(a), float(b)] for a, b in zip(
+                    np.linspace(lat[i], lat[i + 1], 8), np.linspace(lon[i], lon[i + 1], 8)
+                )],
+                "distance": float(rng.uniform(0.05, 1.0)),
+                "duration": float(rng.uniform(0.1, 2.0)),
+                "congestion_level": int(rng.integers(0, 100)),
+                "weather": {"temp": float(rng.uniform(-5, 30)), "condition": "clear"},
+                "emissions": float(rng.uniform(10, 500))
+            }
+            for i in range(segments)
+        ]
+    }
+
+def time_codec(
+    name: str,
+    encode: Callable[[Any], Any],
+    decode: Callable[[Any], Any],
+    value: Any,
+    rounds: int
+) -> Tuple[int, float, float]:
+    """Report encoded size and mean encode/decode latency in ms."""
+    encoded = encode(value)
+    assert decode(encoded) == value, f"{name} does not round-trip"
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode(value)
+    encode_ms = (time.perf_counter() - start) / rounds * 1000
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode(encoded)
+    decode_ms = (time.perf_counter() - start) / rounds * 1000
+
+    size = len(encoded)
+    print(f"{name:<18} {size / 1024:9.1f} KiB   encode {encode_ms:8.3f} ms   decode {decode_ms:8.3f} ms")
+    return size, encode_ms, decode_ms
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark cache value codecs")
+    parser.add_argument("--segments", type=int, default=500, help="Segments in the synthetic route")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=1024, help="Compression threshold in bytes")
+    args = parser.parse_args()
+
+    value = route_payload(args.segments)
+    serializers, compressors = _serializers(), _compressors(3)
+    print(f"Serializers: {', '.join(serializers)}   compressors: {', '.join(compressors)}")
+
+    results: List[Tuple[str, Tuple[int, float, float]]] = [(
+        "json (legacy)",
+        time_codec("json (legacy)", json.dumps, json.loads, value, args.rounds)
+    )]
+    for serializer in serializers:
+        for compression in compressors:
+            codec = CacheCodec(serializer, compression, args.threshold)
+            name = f"{serializer}+{compression}"
+            results.append((name, time_codec(name, codec.encode, codec.decode, value, args.rounds)))
+
+    baseline_size, baseline_encode, baseline_decode = results[0][1]
+    print()
+    for name, (size, encode_ms, decode_ms) in results[1:]:
+        print(
+            f"{name:<18} size {size / baseline_size:6.2f}x   "
+            f"round trip {(encode_ms + decode_ms) / (baseline_encode + baseline_decode):6.2f}x of legacy JSON"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
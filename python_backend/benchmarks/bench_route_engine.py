@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Compare point-to-point query latency of the route engine searches.
+
+    python benchmarks/bench_route_engine.py --grid 150 --queries 200
+    python benchmarks/bench_route_engine.py --graph data/road_graph.npz --hierarchy data/road_graph.ch.npz
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.api.route_engine.contraction import ContractionHierarchy, build_contraction_hierarchy
+from app.api.route_engine.graph import RoadGraph
+from app.api.route_engine.search import bidirectional_astar, dijkstra
+
+def grid_graph(size: int, seed: int = 42) -> RoadGraph:
+    """Synthetic metro-like grid with a mix of residential streets and arterials."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lat = 40.60 + rows * 0.002 + rng.normal(0, 0.0002, size * size)
+    lon = -74.05 + cols * 0.0026 + rng.normal(0, 0.0002, size * size)
+
+    right = np.flatnonzero(cols < size - 1)
+    below = np.flatnonzero(rows < size - 1)
+    sources = np.concatenate([right, right + 1, below, below + size])
+    targets = np.concatenate([right + 1, right, below + size, below])
+
+    straight = np.hypot((lat[sources] - lat[targets]) * 111_000, (lon[sources] - lon[targets]) * 84_000)
+    distances = straight * rng.uniform(1.0, 1.2, len(sources))
+    arterial = (rows[sources] % 10 == 0) | (cols[sources] % 10 == 0)
+    speeds = np.where(arterial, 16.0, 8.0) * rng.uniform(0.8, 1.2, len(sources))
+    return RoadGraph.from_edges(lat, lon, sources, targets, distances, distances / speeds)
+
+def time_queries(name: str, search: Callable[[int, int], object], pairs: np.ndarray) -> List[float]:
+    """Run every pair through ``search`` and report latency percentiles in ms."""
+    timings, costs = [], []
+    for source, target in pairs:
+        start = time.perf_counter()
+        path = search(int(source), int(target))
+        timings.append((time.perf_counter() - start) * 1000)
+        costs.append(path.cost if path else np.inf)
+    timings = np.array(timings)
+    print(
+        f"{name:<22} mean {timings.mean():9.3f} ms   p50 {np.percentile(timings, 50):9.3f} ms   "
+        f"p99 {np.percentile(timings, 99):9.3f} ms"
+    )
+    return costs
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark route engine queries")
+    parser.add_argument("--graph", help="Road graph file; a synthetic grid is used when omitted")
+    parser.add_argument("--hierarchy", help="Prebuilt contraction hierarchy for --graph")
+    parser.add_argument("--grid", type=int, default=100, help="Side length of the synthetic grid")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--skip-dijkstra", action="store_true", help="Skip the slow unidirectional baseline")
+    args = parser.parse_args()
+
+    graph = RoadGraph.load(args.graph) if args.graph else grid_graph(args.grid)
+    print(f"Graph: {graph.node_count} nodes, {graph.edge_count} edges")
+
+    if args.hierarchy:
+        hierarchy = ContractionHierarchy.load(args.hierarchy)
+    else:
+        start = time.perf_counter()
+        hierarchy = build_contraction_hierarchy(graph, "duration")
+        print(f"CH build: {time.perf_counter() - start:.1f}s, {hierarchy.shortcut_count} shortcuts")
+
+    pairs = np.random.default_rng(0).integers(0, graph.node_count, size=(args.queries, 2))
+    # Warm up lazily built reverse graph and heuristic bounds
+    bidirectional_astar(graph, 0, graph.node_count - 1)
+
+    results = {}
+    if not args.skip_dijkstra:
+        results["dijkstra"] = time_queries("dijkstra", lambda s, t: dijkstra(graph, s, t), pairs)
+    results["bidirectional A*"] = time_queries(
+        "bidirectional A*", lambda s, t: bidirectional_astar(graph, s, t), pairs
+    )
+    results["contraction hierarchy"] = time_queries("contraction hierarchy", hierarchy.query, pairs)
+
+    baseline = results["bidirectional A*"]
+    mismatches = sum(
+        not np.isclose(a, b, rtol=1e-5) for a, b in zip(baseline, results["contraction hierarchy"])
+    )
+    print(f"Cost mismatches between A* and CH: {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
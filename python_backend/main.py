@@ -1,23 +1,45 @@
 ﻿from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pymongo.errors import OperationFailure
 from app.api.route_engine import router as route_router
-from app.api.vehicle import router as vehicle_router
+from app.api.route_engine.costs import vehicle_curve_model
+from app.api.route_engine.fleet import shutdown_solver_pool
+from app.api.route_engine.traffic import get_edge_traffic
+from app.api.vehicle import PREDEFINED_VEHICLES, router as vehicle_router
 from app.api.metrics import router as metrics_router
+from app.api.metrics.rollups import create_rollup_indexes
+from app.core.settings import settings
+from app.db.cache_manager import CacheManager
+from app.services.collectors import close_http_client, set_fallback_cache
+from app.services.prefetch import PrefetchScheduler
+from app.services.rate_limiter import RateLimiter, set_rate_limiter
+from app.services.emission_curves import get_emission_curve_model
+from app.utils.metrics_collector import close_metrics_writer
+from app.utils.telemetry import MultiprocessExporter, RequestMetricsMiddleware, get_metrics_registry
 from app.api.security import router as auth_router
 from app.utils.error_handling.exceptions import (
     FedExGreenRouterError,
     ValidationError,
     AuthenticationError,
-    ResourceNotFoundError
+    ResourceNotFoundError,
+    RateLimitExceededError
 )
 from app.utils.error_handling.handlers import (
     fedex_error_handler,
     validation_error_handler,
     authentication_error_handler,
-    not_found_error_handler
+    not_found_error_handler,
+    rate_limit_error_handler
+)
+from app.db.persistence import MIN_MONGODB_VERSION, db, server_version
+
+cache = CacheManager(settings)
+prefetcher = PrefetchScheduler(db, cache)
+metrics_exporter = (
+    MultiprocessExporter(get_metrics_registry(), settings.METRICS_MULTIPROC_DIR, settings.METRICS_SNAPSHOT_INTERVAL)
+    if settings.METRICS_MULTIPROC_DIR else None
 )
-from app.db.persistence import db
 
 app = FastAPI(
     title="FedEx Green Router",
@@ -34,6 +56,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request counts and latency histograms, scraped from /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router)  # Auth router doesn't require API key verification
 app.include_router(route_router)
@@ -45,6 +70,7 @@ app.add_exception_handler(FedExGreenRouterError, fedex_error_handler)
 app.add_exception_handler(ValidationError, validation_error_handler)
 app.add_exception_handler(AuthenticationError, authentication_error_handler)
 app.add_exception_handler(ResourceNotFoundError, not_found_error_handler)
+app.add_exception_handler(RateLimitExceededError, rate_limit_error_handler)
 
 @app.on_event("startup")
 async def startup_event():
@@ -55,9 +81,52 @@ async def startup_event():
     await db["api_keys"].create_index("key", unique=True)
     await db["api_keys"].create_index("client_id")
     await db["vehicles"].create_index("id", unique=True)
-    await db["metrics"].create_index("request_id", unique=True)
-    await db["metrics"].create_index("start_time")
-    await db["errors"].create_index("timestamp")
+    # metrics and errors are time-series collections (see init_db), which
+    # are ordered by time already and support no unique indexes; secondary
+    # indexes on their measurements need MongoDB 6.0
+    if await server_version() >= MIN_MONGODB_VERSION:
+        try:
+            await db["metrics"].create_index("request_id")
+        except OperationFailure as e:
+            print(f"Metrics request_id index unavailable: {e}")
+    await db["route_metrics"].create_index("route_id", unique=True)
+    await db["route_feedback"].create_index("timestamp")
+    await create_rollup_indexes(db)
+    
+    # Precompute the emission curve lookup tables
+    get_emission_curve_model()
+    for vehicle in PREDEFINED_VEHICLES.values():
+        vehicle_curve_model(vehicle)
+    
+    # Shared cache; collectors fall back to its last known values
+    await cache.start()
+    set_fallback_cache(cache)
+    
+    # Upstream API budgets, shared with the other workers through Redis
+    set_rate_limiter(RateLimiter.from_settings(cache.redis, settings))
+    
+    # Keep weather, AQI and traffic warm for areas with recent activity
+    if settings.PREFETCH_ENABLED:
+        try:
+            prefetcher.edge_traffic = get_edge_traffic()
+        except FileNotFoundError as e:
+            print(f"Live traffic ingestion disabled: {e}")
+        prefetcher.start()
+    
+    # Share this worker's request metrics with the other workers
+    if metrics_exporter is not None:
+        metrics_exporter.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and close pooled connections."""
+    await prefetcher.stop()
+    shutdown_solver_pool()
+    await close_http_client()
+    await cache.close()
+    await close_metrics_writer()
+    if metrics_exporter is not None:
+        await metrics_exporter.stop()
 
 @app.get("/")
 async def root():
@@ -78,3 +147,9 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request and pipeline metrics in the Prometheus text format, merged across workers."""
+    registry = metrics_exporter.collect() if metrics_exporter is not None else get_metrics_registry()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,442 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+import pytest
+from fnmatch import fnmatchcase
+from app.core.settings import Settings
+from app.db.codec import CODEC_VERSION, CacheCodec
+from app.db.geocells import geohash_encode
+from app.db.local_cache import LocalCache
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands CacheManager uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.published = []
+        self.calls = 0
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    async def get(self, key):
+        self.calls += 1
+        return self.data[key] if self._alive(key) else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        self.calls += 1
+        if nx and self._alive(key):
+            return None
+        self.data[key] = value
+        if ex or px:
+            self.expiry[key] = time.monotonic() + (ex if ex else px / 1000)
+        else:
+            self.expiry.pop(key, None)
+        return True
+
+    async def pttl(self, key):
+        self.calls += 1
+        if not self._alive(key):
+            return -2
+        if key not in self.expiry:
+            return -1
+        return int((self.expiry[key] - time.monotonic()) * 1000)
+
+    async def delete(self, *keys):
+        self.calls += 1
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return removed
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        """Runs the lock release script (compare-and-delete) only."""
+        self.calls += 1
+        key, token = keys_and_args
+        if self._alive(key) and self.data[key] == token:
+            return await self.delete(key)
+        return 0
+
+    async def setex(self, key, seconds, value):
+        return await self.set(key, value, ex=seconds)
+
+    async def zadd(self, key, mapping):
+        self.calls += 1
+        self._alive(key)
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        self.calls += 1
+        if not self._alive(key):
+            return 0
+        members = self.data[key]
+        removed = [m for m, score in members.items() if float(low) <= score <= float(high)]
+        for member in removed:
+            del members[member]
+        return len(removed)
+
+    async def zrangebyscore(self, key, low, high):
+        self.calls += 1
+        if not self._alive(key):
+            return []
+        return sorted(m for m, score in self.data[key].items() if float(low) <= score <= float(high))
+
+    async def expire(self, key, seconds):
+        self.calls += 1
+        if self._alive(key):
+            self.expiry[key] = time.monotonic() + seconds
+            return True
+        return False
+
+    async def scan_iter(self, match="*", count=None):
+        self.calls += 1
+        for key in list(self.data):
+            if self._alive(key) and fnmatchcase(key, match):
+                yield key
+
+    async def mget(self, keys):
+        self.calls += 1
+        return [self.data[key] if self._alive(key) else None for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    async def flushdb(self):
+        self.data.clear()
+        self.expiry.clear()
+
+class FakePipeline:
+    """Buffers commands and runs them against FakeRedis as one call."""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls = self.redis.calls
+        results = [await command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.redis.calls = calls + 1
+        self.commands = []
+        return results
+
+@pytest.fixture
+def manager():
+    cache_manager = pytest.importorskip("app.db.cache_manager")
+    manager = cache_manager.CacheManager(Settings())
+    manager.redis = FakeRedis()
+    return manager
+
+def test_local_cache_lru_and_expiry():
+    """Test the L1 cache evicts least recently used entries and expires by TTL."""
+    cache = LocalCache(max_entries=2)
+    cache.set("a", "1", 60)
+    cache.set("b", "2", 60)
+    assert cache.get("a") == (True, "1")
+    cache.set("c", "3", 60)  # evicts b, the least recently used
+    assert cache.get("b") == (False, None)
+    assert len(cache) == 2
+
+    cache.set("short", "x", 0.01)
+    time.sleep(0.02)
+    assert cache.get("short") == (False, None)
+
+    cache.set("weather:1", "w", 60)
+    cache.delete_pattern("weather:*")
+    assert cache.get("weather:1") == (False, None)
+    assert cache.get("c") == (True, "3")
+
+def test_codec_round_trip_and_legacy_json():
+    """Test every codec configuration round-trips, compresses large values, and reads legacy JSON."""
+    route = {"id": "r1", "segments": [{"lat": 40.0 + i / 1000, "lon": -74.0, "congestion": i % 7} for i in range(200)]}
+    for serializer in ("json", "orjson", "msgpack"):
+        for compression in ("none", "zlib", "zstd", "lz4"):
+            codec = CacheCodec(serializer, compression, compress_threshold=256)
+            small, large = codec.encode({"temp": 18}), codec.encode(route)
+            assert small[0] == CODEC_VERSION and small[2] == 0  # below the threshold
+            assert codec.decode(small) == {"temp": 18}
+            assert codec.decode(large) == route
+            if codec.compression != "none":
+                assert large[2] != 0
+            # Values written with one configuration read with another
+            assert CacheCodec("json", "none").decode(large) == route
+
+    legacy = json.dumps(route)
+    assert CacheCodec().decode(legacy) == route
+    assert CacheCodec().decode(legacy.encode()) == route
+    with pytest.raises(ValueError):
+        CacheCodec(compression="brotli")
+    with pytest.raises(ValueError):
+        CacheCodec().decode(bytes((CODEC_VERSION, 9, 0)) + b"payload")
+
+def test_two_tier_get_serves_hot_keys_locally(manager):
+    """Test typed keys are served from L1 after the first Redis read, with per-tier counters."""
+    async def scenario():
+        await manager.set("vehicle:v1", {"id": "v1"}, "vehicle")
+        redis_calls = manager.redis.calls
+        for _ in range(5):
+            assert await manager.get("vehicle:v1", "vehicle") == {"id": "v1"}
+        assert manager.redis.calls == redis_calls
+
+        manager.local.clear()
+        assert await manager.get("vehicle:v1", "vehicle") == {"id": "v1"}
+        assert await manager.get("vehicle:missing", "vehicle") is None
+        assert await manager.get("untyped") is None
+
+    asyncio.run(scenario())
+    tiers = manager.get_tier_stats()
+    assert tiers["l1"]["hits"] == 5
+    assert tiers["l1"]["misses"] == 2
+    assert tiers["l2"] == {"hits": 1, "misses": 2, "hit_rate": pytest.approx(100 / 3)}
+
+def test_invalidation_messages_from_other_workers(manager):
+    """Test writes publish invalidations and messages from other workers evict L1 entries."""
+    async def scenario():
+        await manager.set("preferences:u1", {"eco": 1}, "user_preferences")
+        channel, message = manager.redis.published[-1]
+        assert channel == "cache:invalidate"
+
+        # Our own message is ignored, another worker's evicts the entry
+        manager._apply_invalidation(message)
+        assert manager.local.get("preferences:u1")[0]
+        manager._apply_invalidation('{"origin": "other", "key": "preferences:u1"}')
+        assert not manager.local.get("preferences:u1")[0]
+
+        await manager.get("preferences:u1", "user_preferences")
+        manager._apply_invalidation('{"origin": "other", "pattern": "preferences:*"}')
+        assert len(manager.local) == 0
+
+    asyncio.run(scenario())
+
+def test_bulk_lookups_use_one_round_trip(manager):
+    """Test bulk helpers read and write a whole route's points with one Redis call each."""
+    points = [(40.0 + i * 0.01, -74.0) for i in range(200)]  # one geohash cell each
+
+    async def scenario():
+        await manager.set_weather_cache_bulk(points[:150], [{"temp": i} for i in range(150)])
+        assert manager.redis.calls == 1
+        assert manager.redis.expiry  # SETEX with the weather TTL
+
+        manager.local.clear()
+        calls = manager.redis.calls
+        weather = await manager.get_weather_cache_bulk(points)
+        assert manager.redis.calls == calls + 1
+        assert weather[10] == {"temp": 10}
+        assert weather[150:] == [None] * 50
+
+        # Warm keys now come from L1; only the misses go to Redis
+        calls = manager.redis.calls
+        assert (await manager.get_weather_cache_bulk(points))[:150] == weather[:150]
+        assert manager.redis.calls == calls + 1
+
+        segments = [(points[i], points[i + 1]) for i in range(3)]
+        await manager.set_many(
+            {manager._traffic_key(*segments[0]): {"congestion_level": 40}},
+            "traffic",
+            key_ttls={manager._traffic_key(*segments[0]): timedelta(seconds=30)}
+        )
+        traffic = await manager.get_traffic_cache_bulk(segments)
+        assert traffic == [{"congestion_level": 40}, None, None]
+
+    asyncio.run(scenario())
+
+def test_geohash_cells_and_area_invalidation(manager):
+    """Test nearby points share cell keys and area invalidation deletes only indexed cells."""
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    here, nearby, far = (40.71280, -74.00600), (40.71285, -74.00610), (41.8781, -87.6298)
+    assert manager._weather_key(*here) == manager._weather_key(*nearby)
+    assert manager._weather_key(*here) != manager._weather_key(*far)
+
+    async def scenario():
+        await manager.set_weather_cache(*here, {"temp": 18})
+        assert await manager.get_weather_cache(*nearby) == {"temp": 18}
+        await manager.set_air_quality_cache_bulk([here, far], [{"aqi": 40}, {"aqi": 90}])
+        await manager.set_traffic_cache(here, nearby, {"congestion_level": 70})
+        await manager.set_route_cache(here, far, {"distance": 1150})
+        await manager.set_vehicle_cache("v1", {"id": "v1"})
+
+        await manager.invalidate_area_cache(*here, radius=2)
+        manager.local.clear()
+        assert await manager.get_weather_cache(*here) is None
+        assert await manager.get_air_quality_cache(*here) is None
+        assert await manager.get_traffic_cache(here, nearby) is None
+        assert await manager.get_route_cache(here, far) is None
+        assert await manager.get_air_quality_cache(*far) == {"aqi": 90}
+        assert await manager.get_vehicle_cache("v1") == {"id": "v1"}
+
+        # Large areas switch to the coarse cells but stay bounded
+        await manager.set_weather_cache(*far, {"temp": 5})
+        await manager.invalidate_area_cache(*far, radius=100)
+        manager.local.clear()
+        assert await manager.get_weather_cache(*far) is None
+
+        await manager.set_vehicle_cache("v2", {"id": "v2"})
+        await manager.clear_pattern("vehicle:*")
+        assert await manager.get_vehicle_cache("v2") is None
+
+    asyncio.run(scenario())
+
+def test_cell_indexes_drop_expired_keys(manager):
+    """Test cell indexes only keep keys that have not expired yet."""
+    here = (40.71280, -74.00600)
+    index = manager._cell_indexes(here)[0]
+
+    async def scenario():
+        for i in range(50):
+            key = f"route:{i}"
+            await manager.set(key, {"i": i}, "route", ttl=timedelta(seconds=0.01), cell_indexes=[index])
+        await asyncio.sleep(0.02)
+        await manager.set_weather_cache(*here, {"temp": 18})
+        assert set(manager.redis.data[index]) == {manager._weather_key(*here)}
+
+        await manager.set("route:late", {"i": -1}, "route", ttl=timedelta(seconds=0.01), cell_indexes=[index])
+        await asyncio.sleep(0.02)
+        members = await manager.redis.zrangebyscore(index, time.time(), "+inf")
+        assert members == [manager._weather_key(*here)]
+
+    asyncio.run(scenario())
+
+def test_concurrent_misses_load_once(manager):
+    """Test concurrent misses on one key share a single loader call."""
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"temp": 21}
+
+    async def scenario():
+        results = await asyncio.gather(
+            *[manager.get_weather_or_refresh(40.7128, -74.0060, loader) for _ in range(20)]
+        )
+        assert results == [{"temp": 21}] * 20
+        assert len(loads) == 1
+        assert await manager.get_weather_cache(40.7128, -74.0060) == {"temp": 21}
+        assert not manager._inflight
+        assert not [key for key in manager.redis.data if key.startswith("lock:")]
+
+    asyncio.run(scenario())
+
+def test_stale_entries_served_while_refreshing(manager):
+    """Test entries past the soft TTL are returned at once and refreshed in the background."""
+    key = manager._traffic_key((40.0, -74.0), (40.1, -74.0))
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        return {"congestion_level": 80}
+
+    async def scenario():
+        # Within the hard TTL but past the soft one
+        stale_seconds = manager.stale_ttls["traffic"].total_seconds() / 2
+        await manager.set(key, {"congestion_level": 10}, "traffic", ttl=timedelta(seconds=stale_seconds))
+        manager.local.clear()
+
+        value = await manager.get_traffic_or_refresh((40.0, -74.0), (40.1, -74.0), loader)
+        assert value == {"congestion_level": 10}
+        assert key in manager._inflight
+        await manager._inflight[key]
+
+        manager.local.clear()
+        assert await manager.get_traffic_or_refresh((40.0, -74.0), (40.1, -74.0), loader) == {"congestion_level": 80}
+        assert manager.redis.expiry[key] - time.monotonic() > manager.ttls["traffic"].total_seconds()
+
+    asyncio.run(scenario())
+
+def test_plain_getters_miss_past_the_soft_ttl(manager):
+    """Test entries kept for the stale window are misses for the plain and bulk getters."""
+    here, other = (40.0, -74.0), (41.0, -74.0)
+
+    async def scenario():
+        stale_seconds = manager.stale_ttls["weather"].total_seconds() / 2
+        await manager.set(manager._weather_key(*here), {"temp": 3}, "weather", ttl=timedelta(seconds=stale_seconds))
+        await manager.set_weather_cache(*other, {"temp": 12})
+        manager.local.clear()
+
+        assert await manager.get_weather_cache(*here) is None
+        assert await manager.get_weather_cache(*other) == {"temp": 12}
+        manager.local.clear()
+        calls = manager.redis.calls
+        assert await manager.get_weather_cache_bulk([here, other]) == [None, {"temp": 12}]
+        assert manager.redis.calls == calls + 1
+        assert manager.local.get(manager._weather_key(*here))[0] is False
+        assert await manager.get_weather_cache(*here, allow_stale=True) == {"temp": 3}
+        assert manager.local.get(manager._weather_key(*here))[0] is False
+
+    asyncio.run(scenario())
+
+def test_refresh_waits_for_lock_holder(manager):
+    """Test a worker that loses the refresh lock waits for the holder's value instead of loading."""
+    key = manager._weather_key(51.5, -0.12)
+
+    async def loader():
+        raise AssertionError("another worker holds the lock")
+
+    async def other_worker():
+        await asyncio.sleep(0.02)
+        await manager.redis.set(key, '{"temp": 9}')
+
+    async def scenario():
+        await manager.redis.set(f"lock:{key}", "other-token", px=10_000)
+        writer = asyncio.create_task(other_worker())
+        assert await manager.get_weather_or_refresh(51.5, -0.12, loader) == {"temp": 9}
+        await writer
+        assert await manager.redis.get(f"lock:{key}") == "other-token"
+
+    asyncio.run(scenario())
+
+def test_refresh_keeps_a_lock_taken_over_by_another_worker(manager):
+    """Test the refresh lock is only released while it still holds this worker's token."""
+    key = manager._weather_key(51.5, -0.12)
+
+    async def loader():
+        # The lock expired during a slow load and another worker took it
+        await manager.redis.set(f"lock:{key}", "other-token", px=10_000)
+        return {"temp": 4}
+
+    async def scenario():
+        assert await manager.get_weather_or_refresh(51.5, -0.12, loader) == {"temp": 4}
+        assert await manager.redis.get(f"lock:{key}") == "other-token"
+
+    asyncio.run(scenario())
+
+def test_manager_stores_binary_values(manager):
+    """Test CacheManager writes codec-encoded bytes and still reads entries stored as JSON text."""
+    async def scenario():
+        route = {"segments": [[40.0 + i / 1000, -74.0] for i in range(500)]}
+        await manager.set_route_cache((40.0, -74.0), (41.0, -74.0), route)
+        stored = manager.redis.data[manager._route_key((40.0, -74.0), (41.0, -74.0))]
+        assert isinstance(stored, bytes) and stored[0] == CODEC_VERSION
+        assert len(stored) < len(json.dumps(route))
+        manager.local.clear()
+        assert await manager.get_route_cache((40.0, -74.0), (41.0, -74.0)) == route
+
+        await manager.redis.set("vehicle:legacy", json.dumps({"id": "legacy"}))
+        assert await manager.get_vehicle_cache("legacy") == {"id": "legacy"}
+
+    asyncio.run(scenario())
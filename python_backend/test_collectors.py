@@ -0,0 +1,259 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.core.settings import Settings
+from app.core.location import Location
+from app.services.circuit_breaker import CircuitBreaker, CircuitState
+from app.services.collectors import (
+    AirQualityDataCollector,
+    TrafficDataCollector,
+    WeatherDataCollector,
+    close_http_client,
+    collect_all,
+    get_http_client
+)
+
+def stub_client(delays: dict, requests: list) -> httpx.AsyncClient:
+    """Client answering every provider path locally after a per-path delay."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        for path, delay in delays.items():
+            if request.url.path.startswith(path):
+                await asyncio.sleep(delay)
+        if request.url.path.startswith("/error"):
+            return httpx.Response(503)
+        return httpx.Response(200, json={"path": request.url.path, "params": dict(request.url.params)})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def test_collectors_use_base_url_and_location():
+    """Test collectors query the given base URL with the location's coordinates."""
+    requests = []
+
+    async def scenario():
+        async with stub_client({}, requests) as client:
+            location = Location(lat=40.7128, lon=-74.0060)
+            weather = await WeatherDataCollector("http://stub/weather-api/", client).collect_data(location)
+            aqi = await AirQualityDataCollector("http://stub/aqi", client).collect_data(location)
+            traffic = await TrafficDataCollector("http://stub/tomtom", client).collect_data()
+        assert weather["path"] == "/weather-api/weather"
+        assert weather["params"]["lat"] == "40.7128"
+        assert aqi["path"] == "/aqi/feed/geo:40.7128;-74.006/"
+        assert traffic["path"] == "/tomtom/traffic" and "point" not in traffic["params"]
+
+    asyncio.run(scenario())
+
+def test_collect_all_runs_sources_concurrently():
+    """Test collect_all fans out in parallel and isolates slow or failing sources."""
+    requests = []
+    location = Location(lat=51.5, lon=-0.12)
+
+    async def scenario():
+        async with stub_client({"/traffic": 0.1, "/weather": 0.1, "/slow": 1.0}, requests) as client:
+            collectors = {
+                "traffic": TrafficDataCollector("http://stub", client),
+                "weather": WeatherDataCollector("http://stub", client),
+                "air_quality": AirQualityDataCollector("http://stub", client)
+            }
+            start = time.perf_counter()
+            data = await collect_all(location, collectors, timeout=1.0)
+            assert time.perf_counter() - start < 0.19
+            assert data["errors"] == {}
+            assert data["weather"]["params"]["lon"] == "-0.12"
+
+            assert data["degraded"] is False
+
+            collectors["traffic"] = TrafficDataCollector("http://stub/slow", client, circuit_breaker=CircuitBreaker("t"))
+            collectors["air_quality"] = AirQualityDataCollector("http://stub/error", client, circuit_breaker=CircuitBreaker("a"))
+            start = time.perf_counter()
+            data = await collect_all(location, collectors, timeout=0.2)
+            assert time.perf_counter() - start < 0.5
+            assert data["traffic"] == {"congestion_level": 0, "degraded": True}
+            assert data["air_quality"] == {"data": {"aqi": 50}, "degraded": True}
+            assert data["weather"]["path"] == "/weather"
+            assert data["degraded"] is True and data["errors"] == {}
+
+    asyncio.run(scenario())
+
+def test_shared_client_reused_until_closed():
+    """Test collectors share one pooled client for the app's lifetime."""
+    async def scenario():
+        client = get_http_client()
+        assert get_http_client() is client
+        assert WeatherDataCollector().client is client
+        await close_http_client()
+        assert client.is_closed
+        assert get_http_client() is not client
+        await close_http_client()
+
+    asyncio.run(scenario())
+
+def make_cache():
+    """A CacheManager over the in-memory Redis of the cache tests."""
+    cache_manager = pytest.importorskip("app.db.cache_manager")
+    from test_cache import FakeRedis
+    cache = cache_manager.CacheManager(Settings())
+    cache.redis = FakeRedis()
+    return cache
+
+def expire(cache):
+    """Move every entry past its soft TTL, into the stale window."""
+    cache.local.clear()
+    for key in cache.redis.expiry:
+        cache.redis.expiry[key] = time.monotonic() + 60
+
+def test_circuit_breaker_opens_and_probes():
+    """Test the breaker opens on errors or slow calls and closes after a successful probe."""
+    now = [0.0]
+    breaker = CircuitBreaker("aqicn", failure_threshold=3, latency_threshold=1.0, reset_timeout=30, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_success(0.1)  # a success resets the consecutive count
+    breaker.record_failure()
+    breaker.record_success(5.0)  # too slow, counts as a failure
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN and not breaker.allow_request()
+
+    now[0] = 31.0
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request() and not breaker.allow_request()  # a single probe
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+
+    now[0] = 62.0
+    assert breaker.allow_request()
+    breaker.record_success(0.2)
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.get_stats()["opened"] == 2
+
+def test_open_circuit_serves_last_known_value():
+    """Test stale values are served while a failing provider opens the circuit, then refreshed via a probe."""
+    now = [0.0]
+    breaker = CircuitBreaker("openweather", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    temps = [7]
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        if temps[0] is None:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"temp": temps[0]})
+
+    async def refreshed(cache):
+        await asyncio.gather(*cache._inflight.values())
+
+    async def scenario():
+        cache = make_cache()
+        location = Location(lat=48.85, lon=2.35)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            collector = WeatherDataCollector("http://stub", client, circuit_breaker=breaker, cache=cache)
+            assert await collector.collect_data(location) == {"temp": 7}
+            calls = len(requests)
+            assert await collector.collect_data(location) == {"temp": 7}
+            assert len(requests) == calls  # fresh in the cache, provider not called
+
+            temps[0] = None
+            for _ in range(2):
+                expire(cache)
+                assert await collector.collect_data(location) == {"temp": 7}
+                await refreshed(cache)
+            assert breaker.state == CircuitState.OPEN
+            calls = len(requests)
+            expire(cache)
+            assert await collector.collect_data(location) == {"temp": 7}
+            await refreshed(cache)
+            assert len(requests) == calls  # short-circuited, provider not called
+
+            other = Location(lat=0.0, lon=0.0)
+            assert await collector.collect_data(other) == {"temp": 20, "precipitation": 0, "wind_speed": 0, "degraded": True}
+
+            temps[0] = 9
+            now[0] = 11.0
+            assert await collector.collect_data(location) == {"temp": 7}
+            await refreshed(cache)
+            assert breaker.state == CircuitState.CLOSED
+            assert await collector.collect_data(location) == {"temp": 9}
+
+    asyncio.run(scenario())
+
+def test_concurrent_requests_on_an_expired_key_fetch_once():
+    """Test concurrent collect_data calls on a missing key share one upstream call."""
+    requests = []
+
+    async def scenario():
+        cache = make_cache()
+        location = Location(lat=48.85, lon=2.35)
+        async with stub_client({"/weather": 0.05}, requests) as client:
+            collector = WeatherDataCollector("http://stub", client, circuit_breaker=CircuitBreaker("w"), cache=cache)
+            await collector.collect_data(location)
+            cache.local.clear()
+            cache.redis.data.clear()  # past the hard TTL
+            results = await asyncio.gather(*[collector.collect_data(location) for _ in range(20)])
+            return results
+
+    results = asyncio.run(scenario())
+    assert len(requests) == 2
+    assert len({str(result) for result in results}) == 1 and "degraded" not in results[0]
+
+def test_wait_for_another_workers_refresh_is_bounded():
+    """Test a caller waiting on another worker's refresh lock falls back once its timeout passes."""
+    async def scenario():
+        cache = make_cache()
+        location = Location(lat=48.85, lon=2.35)
+        key = cache._weather_key(location.lat, location.lon)
+        await cache.redis.set(f"lock:{key}", "other-token", px=10_000)
+        async with stub_client({}, []) as client:
+            collector = WeatherDataCollector("http://stub", client, circuit_breaker=CircuitBreaker("w"), cache=cache)
+            start = time.perf_counter()
+            data = await collector.collect_data(location, timeout=0.1)
+            return data, time.perf_counter() - start
+
+    data, elapsed = asyncio.run(scenario())
+    assert data == {"temp": 20, "precipitation": 0, "wind_speed": 0, "degraded": True}
+    assert elapsed < 0.5
+
+class SlowRateLimiter:
+    """A rate limiter whose budget takes ``delay`` seconds to arrive."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def acquire(self, provider, priority, timeout=None):
+        await asyncio.sleep(self.delay)
+
+def test_cancelled_probe_is_released():
+    """Test a half-open probe cancelled while waiting for budget does not wedge the breaker."""
+    now = [0.0]
+    breaker = CircuitBreaker("tomtom", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 11.0
+
+    async def scenario():
+        async with stub_client({}, []) as client:
+            collector = TrafficDataCollector(
+                "http://stub", client, rate_limiter=SlowRateLimiter(1.0), circuit_breaker=breaker
+            )
+            task = asyncio.create_task(collector.collect_data(Location(lat=1.0, lon=2.0)))
+            await asyncio.sleep(0.05)
+            assert breaker.state == CircuitState.HALF_OPEN and not breaker.allow_request()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    now[0] = 1000.0
+    assert breaker.state == CircuitState.HALF_OPEN and breaker.allow_request()
+
+def test_budget_wait_counts_against_the_timeout():
+    """Test the time spent waiting for request budget is taken off the call's timeout."""
+    async def scenario():
+        async with stub_client({"/traffic": 0.2}, []) as client:
+            collector = TrafficDataCollector(
+                "http://stub", client, rate_limiter=SlowRateLimiter(0.2), circuit_breaker=CircuitBreaker("t")
+            )
+            start = time.perf_counter()
+            data = await collector.collect_data(Location(lat=1.0, lon=2.0), timeout=0.3)
+            return data, time.perf_counter() - start
+
+    data, elapsed = asyncio.run(scenario())
+    assert data == {"congestion_level": 0, "degraded": True}
+    assert elapsed < 0.38
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import numpy as np
+from datetime import datetime
+from app.api.vehicle import BatchEmissionsRequest, estimate_emissions_batch
+from app.core.location import Location
+from app.core.route import Route
+from app.core.vehicle import Vehicle
+from app.services.emission_curves import CURVE_PARAMETERS, REFERENCE_SPEED, EmissionCurveModel
+from app.services.emissions_calculator import EmissionsCalculator
+
+def make_legs(count: int = 500, seed: int = 3) -> dict:
+    """Random route legs covering every weather, traffic and vehicle branch."""
+    rng = np.random.default_rng(seed)
+    return {
+        "distance": rng.uniform(0.5, 300, count),
+        "vehicle_type": rng.choice(
+            ["light_duty", "medium_duty", "heavy_duty", "electric", "hybrid", "unknown"], count
+        ),
+        "temperature": rng.choice([-10.0, 0.0, 15.0, 30.0, 35.0], count),
+        "rain": rng.choice([0.0, 2.5], count),
+        "snow": rng.choice([0.0, 1.0], count),
+        "congestion_level": rng.choice([0.0, 20.0, 35.0, 50.0, 65.0, 80.0, 95.0], count),
+        "gradient": rng.uniform(-6, 6, count),
+        "load_ratio": rng.uniform(0, 1, count)
+    }
+
+def test_batch_matches_scalar_path():
+    """Test that every batch row equals calculate_route_emissions for the same leg."""
+    calculator = EmissionsCalculator()
+    legs = make_legs()
+    batch = calculator.calculate_batch(**legs)
+
+    location = Location(lat=40.7128, lon=-74.0060)
+    for i in range(len(legs["distance"])):
+        route = Route(
+            id=f"leg_{i}",
+            start_location=location,
+            end_location=location,
+            vehicle_id="v1",
+            load_weight=1.0,
+            departure_time=datetime(2024, 1, 1),
+            total_distance=legs["distance"][i],
+            total_duration=60.0
+        )
+        vehicle = Vehicle(
+            vehicle_type=str(legs["vehicle_type"][i]),
+            registration_number="TEST-1",
+            max_load=1000,
+            fuel_type="diesel",
+            fuel_efficiency=10,
+            emissions_factor=0
+        )
+        scalar = calculator.calculate_route_emissions(
+            route,
+            vehicle,
+            {"temp": legs["temperature"][i], "rain": legs["rain"][i], "snow": legs["snow"][i]},
+            {"congestion_level": legs["congestion_level"][i]},
+            gradient=legs["gradient"][i],
+            load_ratio=legs["load_ratio"][i]
+        )
+        for key, values in batch.items():
+            assert values[i] == pytest.approx(scalar[key], rel=1e-12)
+
+def test_batch_defaults_and_length_check():
+    """Test omitted columns are neutral and mismatched columns are rejected."""
+    calculator = EmissionsCalculator()
+    result = calculator.calculate_batch([10.0, 20.0], ["heavy_duty", "electric"])
+    assert np.allclose(result["total_emissions_kg"], [8.57, 0.0])
+    assert np.all(result["weather_factor"] == 1.0)
+
+    with pytest.raises(ValueError):
+        calculator.calculate_batch([10.0, 20.0], ["heavy_duty", "electric"], rain=[1.0])
+
+def test_batch_endpoint():
+    """Test the bulk endpoint returns per-leg columns and the batch total."""
+    request = BatchEmissionsRequest(
+        distance=[100.0, 50.0],
+        vehicle_type=["medium_duty", "hybrid"],
+        congestion_level=[90.0, 0.0]
+    )
+    response = asyncio.run(estimate_emissions_batch(request))
+    assert response.traffic_factor == [1.5, 1.0]
+    assert response.batch_total_emissions_kg == pytest.approx(27.1 * 1.5 + 4.6)
+
+def test_emission_curves_table_lookup():
+    """Test the curve tables: reference point, congestion, load, gradient and interpolation."""
+    calculator = EmissionsCalculator()
+    model = EmissionCurveModel(calculator.emission_factors)
+
+    # Flat, empty and free-flowing at the reference speed equals the base factor
+    for name, factor in calculator.emission_factors.items():
+        assert model.emission_factor(name, REFERENCE_SPEED) == pytest.approx(factor)
+
+    congested, free_flow = model.emission_factor("heavy_duty", [10.0, 60.0])
+    assert congested > 2 * free_flow
+    assert model.emission_factor("heavy_duty", 60.0, load_ratio=1.0) > free_flow
+    assert model.emission_factor("heavy_duty", 60.0, gradient=4.0) > free_flow
+    assert model.emission_factor("heavy_duty", 60.0, gradient=-4.0) < free_flow
+    assert np.all(model.emission_factor("electric", [10.0, 80.0], 1.0, 5.0) == 0)
+
+    # Interpolation between grid points stays close to the exact curve
+    exact = EmissionCurveModel._build_table(857, CURVE_PARAMETERS["heavy_duty"])
+    between = model.emission_factor("heavy_duty", 42.5, 0.525, 1.25)
+    assert exact[37:39, 10:12, 22:24].min() <= between <= exact[37:39, 10:12, 22:24].max()
+
+    rng = np.random.default_rng(0)
+    distances = rng.uniform(0.05, 0.5, 500)
+    speeds = rng.uniform(5, 110, 500)
+    segments = calculator.calculate_segment_emissions("medium_duty", distances, speeds, 0.5)
+    assert segments.shape == (500,)
+    assert np.allclose(segments, distances * model.emission_factor("medium_duty", speeds, 0.5))
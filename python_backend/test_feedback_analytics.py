@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+import pytest
+import app.utils.feedback_handler as feedback_handler
+from app.utils.feedback_handler import FeedbackHandler
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return self.documents
+
+class FakeFeedback:
+    """aggregate of a Motor collection, answering the analytics $facet pipeline."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        bounds = pipeline[0]["$match"].get("timestamp", {})
+        matched = [
+            d for d in self.documents
+            if bounds.get("$gte", datetime.min) <= d["timestamp"] <= bounds.get("$lte", datetime.max)
+        ]
+        assert set(pipeline[-1]["$facet"]) == {"summary", "ratings"}
+
+        def average(field):
+            values = [d[field] for d in matched if d.get(field) is not None]
+            return sum(values) / len(values) if values else None
+
+        summary = [{
+            "_id": None,
+            "count": len(matched),
+            "average_rating": average("rating"),
+            "traffic_accuracy": average("traffic_accuracy"),
+            "weather_impact": average("weather_impact")
+        }] if matched else []
+        ratings = {}
+        for d in matched:
+            ratings[d["rating"]] = ratings.get(d["rating"], 0) + 1
+        # $facet always yields one document, with empty facets when nothing matched
+        return FakeCursor([{
+            "summary": summary,
+            "ratings": [{"_id": rating, "count": count} for rating, count in ratings.items()]
+        }])
+
+@pytest.fixture
+def feedback(monkeypatch):
+    collection = FakeFeedback([
+        {"timestamp": datetime(2024, 5, 1), "rating": 5, "traffic_accuracy": 4, "weather_impact": None},
+        {"timestamp": datetime(2024, 5, 2), "rating": 3, "traffic_accuracy": 2, "weather_impact": 3},
+        {"timestamp": datetime(2024, 5, 3), "rating": 5, "traffic_accuracy": None, "weather_impact": 5},
+        {"timestamp": datetime(2024, 6, 1), "rating": 1, "traffic_accuracy": 1, "weather_impact": 1}
+    ])
+    monkeypatch.setattr(feedback_handler, "db", {"route_feedback": collection})
+    feedback_handler._analytics_cache.clear()
+    return collection
+
+def test_analytics_from_facet_result(feedback):
+    """Test counts, averages and the rating distribution are read from the $facet document."""
+    analytics = asyncio.run(FeedbackHandler.get_analytics(datetime(2024, 5, 1), datetime(2024, 5, 31)))
+    assert analytics.total_feedback_count == 3
+    assert analytics.average_rating == pytest.approx(13 / 3)
+    assert analytics.traffic_accuracy_score == pytest.approx(3.0)
+    assert analytics.weather_impact_score == pytest.approx(4.0)
+    assert analytics.rating_distribution == {1: 0, 2: 0, 3: 1, 4: 0, 5: 2}
+
+def test_analytics_without_matching_feedback(feedback):
+    """Test an empty range gives zero counts and scores instead of failing on empty facets."""
+    analytics = asyncio.run(FeedbackHandler.get_analytics(datetime(2023, 1, 1), datetime(2023, 2, 1)))
+    assert analytics.total_feedback_count == 0
+    assert analytics.average_rating == 0 and analytics.traffic_accuracy_score == 0
+    assert analytics.rating_distribution == {i: 0 for i in range(1, 6)}
+
+def test_analytics_cached_per_date_range(feedback):
+    """Test results are cached by date range, and use_cache=False always aggregates."""
+    may = (datetime(2024, 5, 1), datetime(2024, 5, 31))
+
+    async def scenario():
+        first = await FeedbackHandler.get_analytics(*may)
+        assert await FeedbackHandler.get_analytics(*may) == first
+        assert len(feedback.pipelines) == 1
+
+        everything = await FeedbackHandler.get_analytics()
+        assert everything.total_feedback_count == 4 and len(feedback.pipelines) == 2
+        assert feedback.pipelines[-1][0] == {"$match": {}}
+
+        await FeedbackHandler.get_analytics(*may, use_cache=False)
+        assert len(feedback.pipelines) == 3
+
+    asyncio.run(scenario())
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+import app.api.metrics as metrics_api
+from app.api.metrics import RouteMetrics
+from app.api.metrics.rollups import ROLLUP_COLLECTIONS, bucket_start, record_route
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return self.documents
+
+class FakeRollups:
+    """update_one with $inc upserts and range finds of a Motor collection."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def update_one(self, query, update, upsert=False):
+        assert upsert
+        key = (query["bucket"], query["vehicle_type"])
+        document = self.documents.setdefault(key, dict(query))
+        for path, amount in update["$inc"].items():
+            *parents, name = path.split(".")
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[name] = target.get(name, 0) + amount
+
+    def find(self, query, projection=None):
+        bucket = query["bucket"]
+        return FakeCursor([
+            dict(document) for (start, vehicle_type), document in sorted(self.documents.items())
+            if bucket["$gte"] <= start < bucket["$lt"]
+            and query.get("vehicle_type", vehicle_type) == vehicle_type
+        ])
+
+class FakeRouteMetrics:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.documents if d["route_id"] == query["route_id"]), None)
+
+def make_db():
+    db = {collection: FakeRollups() for collection in ROLLUP_COLLECTIONS.values()}
+    db["route_metrics"] = FakeRouteMetrics()
+    return db
+
+def route(route_id, vehicle_type, end_time, distance=10.0, duration=20.0, weather="clear", traffic="free_flow"):
+    return RouteMetrics(
+        route_id=route_id,
+        vehicle_type=vehicle_type,
+        start_time=end_time - timedelta(minutes=duration),
+        end_time=end_time,
+        distance=distance,
+        duration=duration,
+        fuel_consumption=distance / 10,
+        emissions=distance * 200,
+        efficiency_score=0.8,
+        weather_conditions={"condition": weather},
+        traffic_conditions={"level": traffic},
+        air_quality_data={"aqi": 40},
+        baseline_emissions=distance * 250,
+        baseline_fuel=distance / 8
+    )
+
+def test_routes_roll_up_into_hourly_and_daily_buckets():
+    """Test each route adds to one hourly and one daily document per vehicle type."""
+    db = make_db()
+    now = datetime(2024, 5, 1, 9, 30)
+
+    async def scenario():
+        for i, vehicle_type in enumerate(["sprinter_van", "sprinter_van", "electric_van"]):
+            await record_route(db, route(f"r{i}", vehicle_type, now + timedelta(minutes=i * 40)))
+
+    asyncio.run(scenario())
+    hourly = db[ROLLUP_COLLECTIONS["hour"]].documents
+    daily = db[ROLLUP_COLLECTIONS["day"]].documents
+    assert sorted(start.hour for start, _ in hourly) == [9, 10, 10]
+    assert len(daily) == 2
+    vans = daily[(bucket_start(now, "day"), "sprinter_van")]
+    assert vans["routes"] == 2 and vans["distance"] == pytest.approx(20.0)
+    assert vans["emissions_saved"] == pytest.approx(1000.0)
+    assert vans["by_hour"]["9"]["routes"] == 1 and vans["by_hour"]["10"]["routes"] == 1
+    assert vans["by_weather"]["clear"]["routes"] == 2
+
+def test_dashboard_endpoints_read_rollups(monkeypatch):
+    """Test the aggregate and traffic endpoints are computed from the rolled-up buckets."""
+    db = make_db()
+    monkeypatch.setattr(metrics_api, "db", db)
+    day = datetime(2024, 5, 1)
+
+    async def scenario():
+        await metrics_api.record_route_metrics(route("r1", "sprinter_van", day + timedelta(hours=8), 30, 60, traffic="heavy"))
+        await metrics_api.record_route_metrics(route("r2", "sprinter_van", day + timedelta(hours=8, minutes=30), 30, 60))
+        await metrics_api.record_route_metrics(route("r3", "electric_van", day + timedelta(hours=14), 40, 40, weather="rain"))
+        start, end = day, day + timedelta(days=7)
+        return (
+            await metrics_api.get_aggregate_metrics(start, end),
+            await metrics_api.get_aggregate_metrics(start, end, "electric_van"),
+            await metrics_api.get_traffic_patterns(start, end),
+            await metrics_api.get_weather_impact(start, end),
+            await metrics_api.get_route_metrics("r3")
+        )
+
+    aggregate, electric, traffic, weather, single = asyncio.run(scenario())
+    assert aggregate.total_routes == 3
+    assert aggregate.total_distance == pytest.approx(100.0)
+    assert aggregate.emissions_saved == pytest.approx(100 * 50)
+    assert aggregate.vehicle_utilization["sprinter_van"] == pytest.approx(120 / 160)
+    assert aggregate.peak_hours[0] == 8
+    assert electric.total_routes == 1 and electric.vehicle_utilization == {"electric_van": 1.0}
+
+    assert traffic["average_speeds"]["heavy"] == pytest.approx(30.0)
+    assert traffic["optimal_departure_times"]["all"] == 14
+    assert traffic["congestion_zones"] == ["heavy"]
+    assert weather["seasonal_patterns"] == {"2024-05": {"routes": 3, "average_efficiency": pytest.approx(0.8)}}
+    assert weather["weather_delays"]["rain"] < 0
+    assert single.route_id == "r3"
+
+def test_invalid_window():
+    """Test a start after the end is rejected."""
+    with pytest.raises(HTTPException):
+        metrics_api._window(datetime(2024, 5, 2), datetime(2024, 5, 1))
+
+def test_aware_timestamps_are_normalized_to_utc():
+    """Test offset-aware dates are compared and bucketed as naive UTC."""
+    start, end = metrics_api._window(datetime(2024, 5, 1, tzinfo=timezone.utc), None)
+    assert start.tzinfo is None and end.tzinfo is None and start < end
+    start, end = metrics_api._window(
+        datetime(2024, 5, 1, 2, tzinfo=timezone(timedelta(hours=2))), datetime(2024, 5, 1, 1)
+    )
+    assert start == datetime(2024, 5, 1, 0)
+
+    db = make_db()
+    late = datetime(2024, 5, 2, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+    asyncio.run(record_route(db, route("r1", "sprinter_van", late)))
+    [(bucket, _)] = db[ROLLUP_COLLECTIONS["day"]].documents
+    assert bucket == datetime(2024, 5, 1)
+    [document] = db[ROLLUP_COLLECTIONS["hour"]].documents.values()
+    assert document["by_hour"]["22"]["routes"] == 1
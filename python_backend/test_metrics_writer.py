@@ -0,0 +1,112 @@
+import asyncio
+from app.utils.metrics_collector import MetricsCollector, MetricsWriter
+
+class FakeMetrics:
+    """insert_many of a Motor collection, recording each batch."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    async def insert_many(self, documents, ordered=True):
+        assert ordered is False
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.batches.append(list(documents))
+
+def test_requests_are_written_in_batches():
+    """Test completed requests are buffered and written by size, then by interval."""
+    collection = FakeMetrics()
+
+    async def scenario():
+        writer = MetricsWriter(collection, batch_size=10, flush_interval=0.05, max_queue=100)
+        collector = MetricsCollector(writer)
+        for i in range(25):
+            request_id = await collector.start_request("optimize_route")
+            await collector.end_request(request_id, {"status": "success", "route_id": f"r{i}"})
+        assert collection.batches == []  # nothing written on the request path
+        await asyncio.sleep(0.2)
+        sizes = [len(batch) for batch in collection.batches]
+        await writer.close()
+        return sizes
+
+    sizes = asyncio.run(scenario())
+    assert sizes == [10, 10, 5]
+    records = [record for batch in collection.batches for record in batch]
+    assert [record["route_id"] for record in records] == [f"r{i}" for i in range(25)]
+    record = records[0]
+    assert record["endpoint"] == "optimize_route" and record["status"] == "success"
+    assert record["end_time"] >= record["start_time"] and record["duration"] >= 0
+
+def test_writer_drops_records_under_backpressure():
+    """Test a full queue drops new records instead of blocking, and close flushes the rest."""
+    collection = FakeMetrics(delay=0.1)
+
+    async def scenario():
+        writer = MetricsWriter(collection, batch_size=2, flush_interval=0.01, max_queue=4)
+        accepted = [writer.record({"n": i}) for i in range(10)]
+        await writer.close()
+        return writer, accepted
+
+    writer, accepted = asyncio.run(scenario())
+    assert accepted == [True] * 4 + [False] * 6
+    assert writer.stats["dropped"] == 6 and writer.stats["written"] == 4
+    assert sorted(record["n"] for batch in collection.batches for record in batch) == [0, 1, 2, 3]
+
+def test_unknown_requests_and_failed_writes():
+    """Test unknown request ids are ignored, the in-flight map is bounded and write errors are counted."""
+    collection = FakeMetrics(fail=True)
+
+    async def scenario():
+        writer = MetricsWriter(collection, batch_size=5, flush_interval=0.01)
+        collector = MetricsCollector(writer, max_in_flight=2)
+        await collector.end_request("missing", {"status": "success"})
+        first = await collector.start_request("get_route")
+        for _ in range(2):
+            await collector.start_request("get_route")
+        await collector.end_request(first, {"status": "success"})  # forgotten as the oldest
+        assert writer.queue.empty()
+
+        request_id = await collector.start_request("get_route")
+        await collector.end_request(request_id, {"status": "error", "error": "boom"})
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.stats["failed"] == 1 and writer.stats["written"] == 0
+
+def test_errors_are_queued_for_the_errors_collection():
+    """Test error events go through their own writer with the time-series fields."""
+    metrics, errors = FakeMetrics(), FakeMetrics()
+
+    async def scenario():
+        collector = MetricsCollector(MetricsWriter(metrics), MetricsWriter(errors, flush_interval=0.01))
+        await collector.record_error("Vehicle not found", 404)
+        await collector.record_error("Validation Error", 400)
+        await collector.error_writer.close()
+
+    asyncio.run(scenario())
+    assert metrics.batches == []
+    [batch] = errors.batches
+    assert [(error["status_code"], error["error_message"]) for error in batch] == [
+        (404, "Vehicle not found"), (400, "Validation Error")
+    ]
+    assert all("timestamp" in error for error in batch)
+
+def test_close_writes_the_batch_being_collected():
+    """Test records already taken off the queue for a batch are written on close."""
+    collection = FakeMetrics()
+
+    async def scenario():
+        writer = MetricsWriter(collection, batch_size=100, flush_interval=60)
+        for i in range(5):
+            writer.record({"n": i})
+        await asyncio.sleep(0.01)  # the background task is now collecting a batch
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.stats["written"] == 5 and writer.stats["dropped"] == 0
+    assert [record["n"] for batch in collection.batches for record in batch] == [0, 1, 2, 3, 4]
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import timedelta
+import httpx
+from app.db.geocells import cell_center, geohash_encode
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.collectors import AirQualityDataCollector, TrafficDataCollector, WeatherDataCollector
+from app.services.prefetch import PrefetchScheduler
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.documents:
+                yield document
+        return iterate()
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query=None, projection=None):
+        documents = self.documents
+        if query and "location.lat" in query:
+            documents = [document for document in documents if "lat" in document.get("location", {})]
+        return FakeCursor(documents)
+
+class FakeLock:
+    def __init__(self):
+        self.keys = set()
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.keys:
+            return None
+        self.keys.add(key)
+        return True
+
+class FakeCache:
+    """Attributes and typed helpers of CacheManager the scheduler and collectors use."""
+
+    def __init__(self):
+        self.ttls = {
+            "weather": timedelta(minutes=30),
+            "traffic": timedelta(minutes=5),
+            "air_quality": timedelta(minutes=15)
+        }
+        self.geohash_precision = 6
+        self.instance_id = "worker-1"
+        self.redis = FakeLock()
+        self.values = {}
+
+    async def set_weather_cache(self, lat, lon, data):
+        self.values[("weather", geohash_encode(lat, lon, 6))] = data
+
+    async def set_air_quality_cache(self, lat, lon, data):
+        self.values[("air_quality", geohash_encode(lat, lon, 6))] = data
+
+    async def set_traffic_cache(self, start, end, data):
+        self.values[("traffic", geohash_encode(*start, 6))] = data
+
+def make_db():
+    routes = [
+        {"_id": i, "start_point": {"lat": 40.7128, "lon": -74.0060}, "end_point": {"lat": 40.73 + i * 0.05, "lon": -73.99}}
+        for i in range(5)
+    ]
+    routes[4]["waypoints"] = [{"lat": 40.7128, "lon": -74.0060}]
+    vehicles = [{"id": "v1", "location": {"lat": 41.8781, "lon": -87.6298}}, {"id": "v2"}]
+    return {"routes": FakeCollection(routes), "vehicles": FakeCollection(vehicles)}
+
+def test_active_cells_from_recent_routes_and_vehicles():
+    """Test active cells come from the newest routes and located vehicles, busiest first."""
+    scheduler = PrefetchScheduler(make_db(), FakeCache(), collectors={}, route_limit=3, max_cells=10)
+    cells = asyncio.run(scheduler.active_cells())
+    depot = geohash_encode(40.7128, -74.0060, 6)
+    assert cells[0] == depot  # start of every route plus a waypoint
+    assert geohash_encode(41.8781, -87.6298, 6) in cells
+    assert geohash_encode(40.73, -73.99, 6) not in cells  # older than the 3 newest routes
+    assert len(cells) == 5
+    lat, lon = cell_center(depot)
+    assert geohash_encode(lat, lon, 6) == depot
+
+def test_refresh_warms_cache_through_collectors():
+    """Test a cycle fetches every active cell at prefetch priority and writes through to the cache."""
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"temp": 15})
+
+    async def scenario():
+        cache = FakeCache()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            collectors = {
+                "weather": WeatherDataCollector("http://stub", client, circuit_breaker=CircuitBreaker("w"), cache=cache),
+                "air_quality": AirQualityDataCollector("http://stub", client, circuit_breaker=CircuitBreaker("a"), cache=cache),
+                "traffic": TrafficDataCollector("http://stub", client, circuit_breaker=CircuitBreaker("t"), cache=cache)
+            }
+            scheduler = PrefetchScheduler(make_db(), cache, collectors=collectors, concurrency=2)
+            assert scheduler.interval("traffic") == 240
+            cells = await scheduler.active_cells()
+            await scheduler.refresh("weather", cells)
+            assert {cell for kind, cell in cache.values if kind == "weather"} == set(cells)
+            assert scheduler.stats["weather"] == {"cycles": 1, "refreshed": len(cells), "degraded": 0}
+
+            # Only one worker claims a cycle while its lock is held
+            assert await scheduler._claim_cycle("weather", 60)
+            assert not await scheduler._claim_cycle("weather", 60)
+
+            scheduler.start()
+            await asyncio.sleep(0.05)
+            await scheduler.stop()
+            assert {kind for kind, _ in cache.values} == {"weather", "air_quality", "traffic"}
+
+    asyncio.run(scenario())
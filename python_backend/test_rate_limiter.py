@@ -0,0 +1,106 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.core.location import Location
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.collectors import WeatherDataCollector
+from app.services.rate_limiter import Priority, ProviderLimit, RateLimiter
+from app.utils.error_handling.exceptions import RateLimitExceededError
+
+class FakeBucketRedis:
+    """Runs the token bucket script's logic in Python against in-memory state."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    async def eval(self, script, numkeys, key, rate, capacity, requested, reserve):
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        if tokens - requested >= reserve:
+            self.buckets[key] = (tokens - requested, now)
+            return [1, str(tokens - requested), "0"]
+        self.buckets[key] = (tokens, now)
+        return [0, str(tokens), str((requested + reserve - tokens) / rate)]
+
+def make_limiter(rate: float = 10.0, capacity: float = 10.0) -> RateLimiter:
+    return RateLimiter(FakeBucketRedis(), {"openweather": ProviderLimit(rate=rate, capacity=capacity)})
+
+def test_budget_exhaustion_and_refill():
+    """Test requests beyond the bucket wait for refill or fail after their timeout."""
+    limiter = make_limiter(rate=20.0, capacity=3.0)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.acquire("openweather", Priority.OPTIMIZE, timeout=0)
+        with pytest.raises(RateLimitExceededError):
+            await limiter.acquire("openweather", Priority.OPTIMIZE, timeout=0)
+        start = time.perf_counter()
+        await limiter.acquire("openweather", Priority.OPTIMIZE, timeout=1.0)
+        assert 0.02 < time.perf_counter() - start < 0.5
+        await limiter.acquire("unlimited-provider", Priority.PREFETCH, timeout=0)
+
+    asyncio.run(scenario())
+    stats = limiter.get_stats()["openweather"]
+    assert stats["denied"] == 1
+    assert stats["budget_remaining"] < 1
+
+def test_prefetch_leaves_reserve_for_optimize():
+    """Test background requests stop at the reserve while optimize requests use the whole bucket."""
+    limiter = make_limiter(rate=0.01, capacity=10.0)
+
+    async def scenario():
+        taken = 0
+        with pytest.raises(RateLimitExceededError):
+            while True:
+                await limiter.acquire("openweather", Priority.PREFETCH, timeout=0)
+                taken += 1
+        assert taken == 5
+        for _ in range(5):
+            await limiter.acquire("openweather", Priority.OPTIMIZE, timeout=0)
+
+    asyncio.run(scenario())
+
+def test_waiters_served_by_priority_with_queue_depth():
+    """Test a queued optimize request goes before prefetch requests that queued earlier."""
+    limiter = make_limiter(rate=20.0, capacity=1.0)
+    order = []
+
+    async def request(name, priority):
+        await limiter.acquire("openweather", priority)
+        order.append(name)
+
+    async def scenario():
+        await limiter.acquire("openweather", Priority.OPTIMIZE)
+        background = [asyncio.create_task(request(f"prefetch-{i}", Priority.PREFETCH)) for i in range(2)]
+        await asyncio.sleep(0)
+        urgent = asyncio.create_task(request("optimize", Priority.OPTIMIZE))
+        await asyncio.sleep(0)
+        depth = limiter.get_stats()["openweather"]["queue_depth"]
+        assert depth == {"optimize": 1, "interactive": 0, "prefetch": 2}
+        await asyncio.gather(urgent, *background)
+
+    asyncio.run(scenario())
+    assert order[0] == "optimize"
+    assert limiter.get_stats()["openweather"]["queue_depth"]["prefetch"] == 0
+
+def test_collectors_acquire_provider_budget():
+    """Test collectors take a token from their provider's bucket before each call."""
+    limiter = make_limiter(rate=0.01, capacity=2.0)
+
+    async def handler(request):
+        return httpx.Response(200, json={"temp": 20})
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            collector = WeatherDataCollector("http://stub", client, limiter, CircuitBreaker("openweather"))
+            location = Location(lat=40.0, lon=-74.0)
+            assert await collector.collect_data(location, Priority.OPTIMIZE) == {"temp": 20}
+            await collector.collect_data(location, Priority.OPTIMIZE)
+            # Budget gone: the collector answers with its degraded default instead of waiting
+            degraded = await collector.collect_data(location, Priority.OPTIMIZE, timeout=0.05)
+            assert degraded["degraded"] is True and degraded["temp"] == 20
+        assert limiter.get_stats()["openweather"]["queue_depth"]["optimize"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,246 @@
+import pytest
+import numpy as np
+from app.api.vehicle import PREDEFINED_VEHICLES
+from app.api.route_engine.contraction import ContractionHierarchy, build_contraction_hierarchy
+from app.api.route_engine.costs import CRITERIA, edge_criteria, edge_emissions
+from app.api.route_engine.fleet import solve_vrptw
+from app.api.route_engine.graph import RoadGraph
+from app.api.route_engine.matrix import emissions_matrices, travel_matrices
+from app.api.route_engine.pareto import pareto_routes, rank_routes
+from app.api.route_engine.search import dijkstra, bidirectional_astar, route_through
+
+def make_grid_graph(size: int = 12, seed: int = 7) -> RoadGraph:
+    """Build a bidirectional grid road network with randomized travel times."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lat = 40.70 + rows * 0.005
+    lon = -74.00 + cols * 0.005
+
+    sources, targets = [], []
+    for node in range(size * size):
+        r, c = divmod(node, size)
+        if c + 1 < size:
+            sources += [node, node + 1]
+            targets += [node + 1, node]
+        if r + 1 < size:
+            sources += [node, node + size]
+            targets += [node + size, node]
+    sources, targets = np.array(sources), np.array(targets)
+
+    straight = np.hypot(
+        (lat[sources] - lat[targets]) * 111_000,
+        (lon[sources] - lon[targets]) * 84_000
+    )
+    distances = straight * rng.uniform(1.0, 1.3, len(sources))
+    speeds = rng.choice([8.0, 14.0, 22.0], len(sources))  # m/s
+    gradients = rng.uniform(-3, 3, len(sources))
+    return RoadGraph.from_edges(lat, lon, sources, targets, distances, distances / speeds, gradients)
+
+def test_csr_layout():
+    """Test that edges are grouped by source node."""
+    graph = make_grid_graph(4)
+    assert graph.offsets[0] == 0
+    assert graph.offsets[-1] == graph.edge_count
+    for node in range(graph.node_count):
+        assert np.all(graph.sources[graph.offsets[node]:graph.offsets[node + 1]] == node)
+
+@pytest.mark.parametrize("weight", ["duration", "distance"])
+def test_bidirectional_astar_matches_dijkstra(weight):
+    """Test that bidirectional A* returns optimal paths."""
+    graph = make_grid_graph()
+    rng = np.random.default_rng(0)
+    for source, target in rng.integers(0, graph.node_count, size=(25, 2)):
+        expected = dijkstra(graph, int(source), int(target), weight)
+        result = bidirectional_astar(graph, int(source), int(target), weight)
+        assert result.cost == pytest.approx(expected.cost, rel=1e-5)
+        assert result.nodes[0] == source and result.nodes[-1] == target
+        weights = graph.edge_weights(weight)
+        assert float(weights[result.edges].sum()) == pytest.approx(result.cost, rel=1e-5)
+        for u, v, edge in zip(result.nodes, result.nodes[1:], result.edges):
+            assert graph.sources[edge] == u and graph.targets[edge] == v
+
+def test_graph_round_trip(tmp_path):
+    """Test saving and loading the CSR arrays."""
+    graph = make_grid_graph(5)
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    loaded = RoadGraph.load(path)
+    assert np.array_equal(loaded.offsets, graph.offsets)
+    assert np.array_equal(loaded.targets, graph.targets)
+    assert np.allclose(loaded.durations, graph.durations)
+
+def test_route_through_waypoints():
+    """Test chaining legs through snapped waypoints."""
+    graph = make_grid_graph()
+    points = [(40.7001, -73.9999), (40.7251, -73.9801), (40.7549, -73.9451)]
+    path = route_through(graph, points)
+    assert path.nodes[0] == graph.nearest_node(*points[0])
+    assert path.nodes[-1] == graph.nearest_node(*points[-1])
+    assert graph.nearest_node(*points[1]) in path.nodes
+
+    with pytest.raises(ValueError):
+        route_through(graph, [(40.7, -74.0), (10.0, 10.0)])
+
+def test_contraction_hierarchy_matches_dijkstra(tmp_path):
+    """Test that CH queries return the same optimal paths after a save/load round trip."""
+    graph = make_grid_graph()
+    build_contraction_hierarchy(graph, "duration").save(str(tmp_path / "graph.ch.npz"))
+    hierarchy = ContractionHierarchy.load(str(tmp_path / "graph.ch.npz"))
+    assert hierarchy.weight == "duration"
+
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(0, graph.node_count, size=(25, 2)):
+        expected = dijkstra(graph, int(source), int(target))
+        result = hierarchy.query(int(source), int(target))
+        assert result.cost == pytest.approx(expected.cost, rel=1e-5)
+        assert float(graph.durations[result.edges].sum()) == pytest.approx(result.cost, rel=1e-5)
+        for u, v, edge in zip(result.nodes, result.nodes[1:], result.edges):
+            assert graph.sources[edge] == u and graph.targets[edge] == v
+
+def test_stale_contraction_hierarchy_is_ignored(tmp_path, monkeypatch):
+    """Test a saved hierarchy is only served for the graph it was built from."""
+    from app.api.route_engine import contraction, graph as graph_module
+    from app.core.settings import settings
+
+    graph = make_grid_graph()
+    path = str(tmp_path / "graph.ch.npz")
+    build_contraction_hierarchy(graph, "duration").save(path)
+    assert ContractionHierarchy.load(path).matches(graph)
+    rebuilt = make_grid_graph(seed=8)
+    assert not ContractionHierarchy.load(path).matches(rebuilt)
+    assert not ContractionHierarchy.load(path).matches(make_grid_graph(size=11))
+
+    monkeypatch.setattr(settings, "ROAD_CH_PATH", path)
+    for road_graph, expected in ((graph, True), (rebuilt, False)):
+        monkeypatch.setattr(graph_module, "_road_graph", road_graph)
+        monkeypatch.setattr(contraction, "_contraction_hierarchy", None)
+        monkeypatch.setattr(contraction, "_contraction_hierarchy_loaded", False)
+        assert (contraction.get_contraction_hierarchy() is not None) == expected
+
+def test_pareto_frontier_extremes_and_ranking():
+    """Test that the Pareto search finds the single-criterion optima and ranks by weights."""
+    graph = make_grid_graph(8)
+    vehicle = PREDEFINED_VEHICLES["box_truck"]
+    criteria = edge_criteria(graph, vehicle, cargo_weight=2500)
+    dims = [CRITERIA.index(name) for name in ("time", "emissions", "cost")]
+    routes = pareto_routes(graph, 0, 63, criteria, dims, max_labels_per_node=50, epsilon=0.0)
+
+    assert routes
+    for column in dims:
+        expected = dijkstra(graph, 0, 63, criteria[:, column])
+        assert min(route.totals[column] for route in routes) == pytest.approx(expected.cost, rel=1e-6)
+    for a in routes:
+        assert not any(
+            b is not a and all(b.totals[i] <= a.totals[i] for i in dims) for b in routes
+        )
+        assert np.allclose(criteria[a.edges].sum(axis=0), a.totals)
+
+    eco = rank_routes(routes, CRITERIA, {"emissions": 2.0, "time": 0.1}, limit=2)
+    assert len(eco) == min(2, len(routes))
+    assert eco[0].totals[CRITERIA.index("emissions")] == min(
+        route.totals[CRITERIA.index("emissions")] for route in routes
+    )
+
+def test_edge_emissions_follow_speed():
+    """Test congested (slower) edges emit more per km than free-flowing ones."""
+    graph = make_grid_graph(6)
+    vehicle = PREDEFINED_VEHICLES["sprinter_van"]
+    free_flow = edge_emissions(graph, vehicle, cargo_weight=500)
+    congested = edge_emissions(graph, vehicle, 500, durations=graph.durations * 4)
+    assert np.all(congested > free_flow)
+
+    edges = np.array([3, 0, 17])
+    assert np.allclose(edge_emissions(graph, vehicle, 500, edges=edges), free_flow[edges])
+    assert np.all(edge_emissions(graph, PREDEFINED_VEHICLES["electric_van"], 500) == 0)
+    assert np.allclose(edge_criteria(graph, vehicle, 500)[:, CRITERIA.index("emissions")], free_flow)
+
+def test_matrix_buckets_match_one_to_many():
+    """Test the CH bucket many-to-many matrix against plain one-to-many searches."""
+    graph = make_grid_graph(10)
+    hierarchy = build_contraction_hierarchy(graph, "duration")
+    sources, targets = [0, 5, 33, 99, 42], [9, 90, 55, 0, 42, 71]
+
+    durations, distances = travel_matrices(graph, sources, targets, hierarchy=hierarchy)
+    expected_durations, expected_distances = travel_matrices(graph, sources, targets)
+    assert durations.shape == (len(sources), len(targets))
+    assert np.allclose(durations, expected_durations, rtol=1e-5)
+    assert np.allclose(distances, expected_distances, rtol=1e-4)
+    assert durations[1, 0] == pytest.approx(dijkstra(graph, 5, 9).cost, rel=1e-5)
+
+    emissions = emissions_matrices(distances, {"medium_duty": 271, "electric": 0})
+    assert np.allclose(emissions["medium_duty"], distances / 1000 * 271)
+    assert np.all(emissions["electric"] == 0)
+
+def test_vrptw_respects_capacity_and_time_windows():
+    """Test the fleet solver on travel matrices from the road graph."""
+    graph = make_grid_graph(8)
+    nodes = [0, 7, 56, 63, 27, 36]
+    durations, distances = travel_matrices(graph, nodes)
+    assert np.all(np.diag(durations) == 0)
+    expected = dijkstra(graph, 7, 56)
+    assert durations[1, 2] == pytest.approx(expected.cost, rel=1e-5)
+
+    demands = [0, 400, 400, 400, 300, 300]
+    windows = [(0, 36000)] + [(0, 36000)] * 5
+    windows[3] = (0, 1)  # impossible to reach in time
+    solution = solve_vrptw(
+        durations, distances, demands, windows, [0] + [60] * 5,
+        capacities=[800, 800], emission_factors=[271, 0],
+        time_limit_seconds=1, horizon=36000
+    )
+
+    assert solution["status"] == "success"
+    assert solution["unassigned"] == [3]
+    assert sorted(stop for route in solution["routes"] for stop in route["stops"]) == [1, 2, 4, 5]
+    for route in solution["routes"]:
+        assert route["load"] <= 800
+        for stop, arrival in zip(route["stops"], route["arrival_times"]):
+            assert windows[stop][0] <= arrival <= windows[stop][1]
+
+def test_fleet_vehicle_capacity_and_emission_factor():
+    """Test plan-fleet reads vehicles stored per the Vehicle model or the migration schema."""
+    from app.api.route_engine import _fleet_vehicle
+    from app.utils.error_handling.exceptions import ValidationError
+    factors = {"medium_duty": 271, "heavy_duty": 857, "electric": 0}
+    assert _fleet_vehicle({"vehicle_type": "heavy_duty", "max_load": 900, "emissions_factor": 640}, factors) == (900, 640)
+    assert _fleet_vehicle({"type": "electric", "cargo_capacity": 500}, factors) == (500, 0)
+    assert _fleet_vehicle({"vehicle_type": "heavy_duty", "max_load": 900}, factors) == (900, 857)
+    with pytest.raises(ValidationError):
+        _fleet_vehicle({"id": "v1", "vehicle_type": "heavy_duty"}, factors)
+
+def test_segments_use_collected_conditions():
+    """Test segments take the weather, AQI and traffic collected at the nearer end of the route."""
+    from app.api.route_engine import build_segments
+    graph = make_grid_graph(6)
+    path = dijkstra(graph, 0, 35)
+    environment = [
+        {"weather": {"weather": [{"main": "Rain"}]}, "air_quality": {"data": {"aqi": "-"}}, "traffic": {"congestion_level": 90}},
+        {"weather": {"temp": 20, "precipitation": 0}, "air_quality": {"data": {"aqi": 120}}, "traffic": None}
+    ]
+    segments = build_segments(graph, path, environment=environment)
+    first, last = segments[0], segments[-1]
+    assert (first.weather_condition, first.air_quality_index, first.traffic_level) == ("rain", 50, "heavy")
+    assert (last.weather_condition, last.air_quality_index, last.traffic_level) == ("clear", 120, "free_flow")
+    assert all(segment.emissions is None for segment in segments)  # no vehicle given
+
+def test_matrix_endpoint_snaps_off_the_event_loop(monkeypatch):
+    """Test /matrix snaps its points in the threadpool together with the matrix computation."""
+    import asyncio
+    import threading
+    import app.api.route_engine as route_engine
+
+    graph = make_grid_graph(6)
+    monkeypatch.setattr(route_engine, "get_road_graph", lambda: graph)
+    monkeypatch.setattr(route_engine, "get_contraction_hierarchy", lambda: None)
+    snapped_on = set()
+    original = route_engine.snap_to_graph
+    monkeypatch.setattr(
+        route_engine, "snap_to_graph",
+        lambda *args: snapped_on.add(threading.current_thread()) or original(*args)
+    )
+    points = [route_engine.RoutePoint(lat=float(graph.lat[n]), lon=float(graph.lon[n])) for n in (0, 35)]
+
+    response = asyncio.run(route_engine.travel_matrix(route_engine.MatrixRequest(sources=points)))
+    assert snapped_on and threading.main_thread() not in snapped_on
+    expected, _ = travel_matrices(graph, [0, 35])
+    assert response.durations[0][1] == pytest.approx(expected[0][1] / 60)
@@ -0,0 +1,178 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from app.core.location import Location
+from app.core.route import Route
+from app.core.vehicle import Vehicle
+from app.services.forest import StackedForest
+from app.services.route_predictor import RoutePredictor
+
+def make_history(rows: int = 400, seed: int = 11) -> pd.DataFrame:
+    """Synthetic historical route data with all predictor columns and targets."""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'hour': rng.integers(0, 24, rows),
+        'day_of_week': rng.integers(0, 7, rows),
+        'is_holiday': rng.integers(0, 2, rows),
+        'distance_km': rng.uniform(1, 200, rows),
+        'vehicle_type': rng.choice(['light_duty', 'medium_duty', 'heavy_duty', 'electric', 'hybrid'], rows),
+        'vehicle_load_ratio': rng.uniform(0, 1, rows),
+        'temperature': rng.uniform(-10, 35, rows),
+        'precipitation': rng.uniform(0, 10, rows),
+        'wind_speed': rng.uniform(0, 20, rows),
+        'air_quality_index': rng.integers(10, 200, rows)
+    })
+    data['traffic_delay'] = data['distance_km'] * 0.1 + data['hour'] % 8 + rng.uniform(0, 2, rows)
+    data['total_emissions'] = data['distance_km'] * (1 + data['vehicle_load_ratio']) * 100
+    data['total_duration'] = data['distance_km'] * 1.2 + data['traffic_delay']
+    return data
+
+def make_route(distance: float) -> Route:
+    location = Location(lat=40.7128, lon=-74.0060)
+    return Route(
+        id=f"route_{distance}",
+        start_location=location,
+        end_location=location,
+        vehicle_id="v1",
+        load_weight=100.0,
+        departure_time=datetime(2024, 3, 4, 9),
+        total_distance=distance,
+        total_duration=60.0
+    )
+
+@pytest.fixture(scope="module")
+def predictor() -> RoutePredictor:
+    predictor = RoutePredictor()
+    predictor.train_models(make_history())
+    return predictor
+
+def test_stacked_forest_matches_sklearn(predictor):
+    """Test the flattened forest reproduces every tree and the forest mean."""
+    X = np.random.default_rng(5).normal(size=(300, len(predictor.feature_columns)))
+    stacked = StackedForest.from_sklearn(predictor.emissions_model)
+    per_tree = stacked.tree_predictions(X)
+    expected = np.array([tree.predict(X) for tree in predictor.emissions_model.estimators_])
+    assert per_tree.shape == (100, 300)
+    assert np.allclose(per_tree, expected)
+    assert np.allclose(stacked.predict(X), predictor.emissions_model.predict(X))
+
+def test_large_batches_use_the_sklearn_trees(predictor, monkeypatch):
+    """Test batches past the row threshold go through the source trees with the same result."""
+    X = np.random.default_rng(6).normal(size=(300, len(predictor.feature_columns)))
+    stacked = StackedForest.from_sklearn(predictor.emissions_model)
+    arrays_only = StackedForest(stacked.feature, stacked.threshold, stacked.children, stacked.value, stacked.roots)
+    calls = []
+    original = type(predictor.emissions_model.estimators_[0]).predict
+    monkeypatch.setattr(
+        type(predictor.emissions_model.estimators_[0]), "predict",
+        lambda self, X, check_input=True: calls.append(len(X)) or original(self, X, check_input)
+    )
+    monkeypatch.setattr("app.services.forest.PER_TREE_MIN_ROWS", 300)
+    assert np.allclose(stacked.tree_predictions(X), arrays_only.tree_predictions(X))
+    assert calls == [300] * 100
+    stacked.tree_predictions(X[:299])
+    assert len(calls) == 100
+
+def test_predict_batch_matches_single_predictions(predictor):
+    """Test a batch of candidate routes against row-by-row predict_route_metrics."""
+    vehicle = Vehicle(
+        vehicle_type='heavy_duty',
+        registration_number='TEST-1',
+        max_load=1000,
+        current_load=400,
+        fuel_type='diesel',
+        fuel_efficiency=8,
+        emissions_factor=857
+    )
+    weather = {'temp': 12, 'precipitation': 1.5, 'wind_speed': 4}
+    aqi = {'data': {'aqi': 80}}
+    now = datetime(2024, 3, 4, 9)
+    routes = [make_route(distance) for distance in np.linspace(5, 150, 40)]
+
+    batch = predictor.predict_batch(routes, vehicle, weather, aqi, now)
+    assert batch['predicted_emissions'].shape == (40,)
+    for i in (0, 17, 39):
+        single = predictor.predict_route_metrics(routes[i], vehicle, weather, aqi, now)
+        assert batch['predicted_traffic_delay'][i] == pytest.approx(single['predicted_traffic_delay'])
+        assert batch['predicted_emissions'][i] == pytest.approx(single['predicted_emissions'])
+        assert batch['predicted_duration'][i] == pytest.approx(single['predicted_duration'])
+        for key, value in single['confidence_scores'].items():
+            assert batch['confidence_scores'][key][i] == pytest.approx(value)
+
+    with pytest.raises(ValueError):
+        predictor.predict_batch(routes, [vehicle], weather, aqi, now)
+
+def test_feature_pipeline_fitted_once_and_saved(tmp_path):
+    """Test updates reuse the training scaling and the pipeline round-trips with the models."""
+    history = make_history()
+    predictor = RoutePredictor()
+    predictor.train_models(history)
+    mean, scale = predictor.features.scaler.mean_.copy(), predictor.features.scaler.scale_.copy()
+    expected = predictor.features.transform(history.iloc[:5])
+
+    shifted = make_history(rows=50, seed=12)
+    shifted['distance_km'] *= 10
+    predictor.update_models(shifted)
+    assert np.array_equal(predictor.features.scaler.mean_, mean)
+    assert np.array_equal(predictor.features.scaler.scale_, scale)
+    assert len(predictor.traffic_model.estimators_) == 110
+
+    predictor.save_models(str(tmp_path))
+    loaded = RoutePredictor()
+    loaded.load_models(str(tmp_path))
+    assert np.allclose(loaded.features.transform(history.iloc[:5]), expected)
+
+    loaded.features.version = -1
+    loaded.features.save(str(tmp_path / "feature_pipeline.joblib"))
+    with pytest.raises(ValueError):
+        RoutePredictor().load_models(str(tmp_path))
+
+def test_compiled_forests_memory_mapped(predictor, tmp_path):
+    """Test exported array forests load memory-mapped and predict like the sklearn models."""
+    predictor.save_models(str(tmp_path))
+    forest = StackedForest.load(str(tmp_path / "duration_forest"))
+    assert isinstance(forest.threshold, np.memmap)
+    assert not forest.children.flags.writeable
+
+    X = np.random.default_rng(8).normal(size=(50, len(predictor.feature_columns)))
+    assert np.allclose(forest.predict(X), predictor.duration_model.predict(X))
+
+    served = RoutePredictor()
+    served.load_models(str(tmp_path))
+    assert served.duration_model is None
+    route = make_route(42.0)
+    vehicle = Vehicle(
+        vehicle_type='electric',
+        registration_number='TEST-2',
+        max_load=800,
+        fuel_type='electric',
+        fuel_efficiency=0,
+        emissions_factor=0
+    )
+    now = datetime(2024, 3, 4, 17)
+    compiled = served.predict_route_metrics(route, vehicle, {}, {}, now)
+    expected = predictor.predict_route_metrics(route, vehicle, {}, {}, now)
+    assert compiled['predicted_duration'] == pytest.approx(expected['predicted_duration'])
+    assert compiled['confidence_scores'] == pytest.approx(expected['confidence_scores'])
+    with pytest.raises(ValueError):
+        served.update_models(make_history(rows=20))
+
+def test_inference_encodes_with_the_saved_pipeline():
+    """Test single and batch feature rows use the pipeline's own vehicle type codes."""
+    predictor = RoutePredictor()
+    predictor.features.vehicle_type_codes = {'heavy_duty': 7}
+    vehicle = Vehicle(
+        vehicle_type='heavy_duty', registration_number='X1', max_load=1000, current_load=250,
+        fuel_type='diesel', fuel_efficiency=8.0, emissions_factor=857
+    )
+    other = vehicle.model_copy(update={'vehicle_type': 'electric'})
+    now = datetime(2024, 3, 4, 9)
+    column = predictor.feature_columns.index('vehicle_type')
+
+    row = predictor._extract_features(make_route(10.0), vehicle, {'temp': 5}, {'data': {'aqi': 80}}, now)
+    batch = predictor._extract_batch_features(
+        [make_route(10.0), make_route(20.0)], [vehicle, other], {'temp': 5}, {'data': {'aqi': 80}}, now
+    )
+    assert row[column] == 7 and list(batch[:, column]) == [7, 0]
+    assert np.array_equal(batch[0], row)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.utils.telemetry import Histogram, MetricsRegistry, MultiprocessExporter, RequestMetricsMiddleware
+
+def test_histogram_quantiles():
+    """Test bucketed quantiles stay within the bucket resolution of the exact ones."""
+    latencies = np.random.default_rng(3).lognormal(mean=-3, sigma=1, size=20000)
+    histogram = Histogram()
+    for latency in latencies:
+        histogram.observe(float(latency))
+    assert histogram.count == len(latencies)
+    assert histogram.sum == pytest.approx(latencies.sum())
+    for q in (0.5, 0.9, 0.99):
+        assert histogram.quantile(q) == pytest.approx(np.quantile(latencies, q), rel=0.2)
+    assert Histogram().quantile(0.5) is None
+
+def test_render_exposition_format():
+    """Test counters and histograms render as Prometheus text with cumulative buckets."""
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("http_requests_total", method="GET", route="/health", status=200)
+    registry.inc("http_requests_total", method="GET", route="/health", status=200)
+    for value in (0.05, 0.5, 5.0):
+        registry.observe("http_request_duration_seconds", value, method="GET", route="/health")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE http_requests_total counter" in lines
+    assert 'http_requests_total{method="GET",route="/health",status="200"} 2' in lines
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="0.1"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="1"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"} 3' in lines
+    assert 'http_request_duration_seconds_sum{method="GET",route="/health"} 5.55' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/health"} 3' in lines
+
+def test_worker_snapshots_merge(tmp_path):
+    """Test a scrape merges the snapshot files of the other workers with the live registry."""
+    other = MetricsRegistry()
+    other.inc("http_requests_total", method="GET", route="/health", status=200)
+    other.observe("pipeline_stage_duration_seconds", 0.2, stage="route_search")
+    other_exporter = MultiprocessExporter(other, str(tmp_path))
+    other_exporter.path = str(tmp_path / "worker-1.json")
+    other_exporter.write()
+
+    local = MetricsRegistry()
+    local.inc("http_requests_total", 2, method="GET", route="/health", status=200)
+    local.observe("pipeline_stage_duration_seconds", 0.4, stage="route_search")
+    merged = MultiprocessExporter(local, str(tmp_path)).collect()
+
+    assert merged.counters[("http_requests_total", (("method", "GET"), ("route", "/health"), ("status", "200")))] == 3
+    histogram = merged.histogram("pipeline_stage_duration_seconds", stage="route_search")
+    assert histogram.count == 2 and histogram.sum == pytest.approx(0.6)
+    assert local.histogram("pipeline_stage_duration_seconds", stage="route_search").count == 1
+
+def test_middleware_records_route_templates():
+    """Test requests are labelled by route template and status, and stages are timed."""
+    registry = MetricsRegistry()
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware, registry=registry)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with registry.time_stage("lookup"):
+            if item_id == 0:
+                raise HTTPException(status_code=404, detail="Not found")
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for item_id in (1, 2, 0):
+        client.get(f"/items/{item_id}")
+    client.get("/nowhere")
+
+    def requests(route, status):
+        return registry.counters.get(
+            ("http_requests_total", (("method", "GET"), ("route", route), ("status", status))), 0
+        )
+
+    assert requests("/items/{item_id}", "200") == 2
+    assert requests("/items/{item_id}", "404") == 1
+    assert requests("unmatched", "404") == 1
+    assert registry.histogram("http_request_duration_seconds", method="GET", route="/items/{item_id}").count == 3
+    assert registry.histogram("pipeline_stage_duration_seconds", stage="lookup").count == 3
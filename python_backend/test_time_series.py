@@ -0,0 +1,81 @@
+import asyncio
+from pymongo.errors import OperationFailure
+import app.db.persistence as persistence
+
+class FakeCollection:
+    def __init__(self, options=None, indexes=None):
+        self._options = options or {}
+        self.indexes = indexes or {}
+
+    async def options(self):
+        return self._options
+
+    async def index_information(self):
+        return self.indexes
+
+    async def create_index(self, field, expireAfterSeconds=None):
+        self.indexes[f"{field}_1"] = {"expireAfterSeconds": expireAfterSeconds}
+
+class FakeDatabase:
+    """create_collection, collMod and collections of a Motor database."""
+
+    def __init__(self, collections=None, time_series=True):
+        self.collections = collections or {}
+        self.time_series = time_series
+        self.commands = []
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    async def create_collection(self, name, timeseries=None, expireAfterSeconds=None):
+        if timeseries is not None and not self.time_series:
+            raise OperationFailure("time-series collections are not supported")
+        self.collections[name] = FakeCollection(
+            {"timeseries": timeseries, "expireAfterSeconds": expireAfterSeconds} if timeseries else {}
+        )
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+def test_time_series_collections_with_retention(monkeypatch):
+    """Test metrics and errors are created as expiring time-series collections."""
+    db = FakeDatabase()
+    monkeypatch.setattr(persistence, "db", db)
+    asyncio.run(persistence.ensure_time_series("errors", []))
+    options = db.collections["errors"]._options
+    assert options["timeseries"] == {"timeField": "timestamp", "metaField": "status_code", "granularity": "minutes"}
+    assert options["expireAfterSeconds"] == int(persistence.settings.ERRORS_RETENTION_DAYS * 86400)
+
+    # Existing time-series collections get the configured retention
+    asyncio.run(persistence.ensure_time_series("errors", ["errors"]))
+    assert db.commands == [(("collMod", "errors"), {"expireAfterSeconds": options["expireAfterSeconds"]})]
+
+def test_plain_collections_get_ttl_index(monkeypatch):
+    """Test servers without time-series support, and old collections, fall back to a TTL index."""
+    db = FakeDatabase(time_series=False)
+    monkeypatch.setattr(persistence, "db", db)
+    asyncio.run(persistence.ensure_time_series("metrics", []))
+    expire_after = int(persistence.settings.METRICS_RETENTION_DAYS * 86400)
+    assert db.collections["metrics"].indexes == {"start_time_1": {"expireAfterSeconds": expire_after}}
+
+    db = FakeDatabase({"metrics": FakeCollection(indexes={"start_time_1": {}})})
+    monkeypatch.setattr(persistence, "db", db)
+    asyncio.run(persistence.ensure_time_series("metrics", ["metrics"]))
+    [(args, _)] = db.commands
+    assert args[0]["index"] == {"keyPattern": {"start_time": 1}, "expireAfterSeconds": expire_after}
+
+def test_server_version_is_queried_once(monkeypatch):
+    """Test the server version is read from buildInfo once and compares against the minimum."""
+    class BuildInfo:
+        calls = 0
+
+        async def command(self, name):
+            assert name == "buildInfo"
+            BuildInfo.calls += 1
+            return {"version": "5.0.14", "versionArray": [5, 0, 14, 0]}
+
+    monkeypatch.setattr(persistence, "db", BuildInfo())
+    monkeypatch.setattr(persistence, "_server_version", None)
+    assert asyncio.run(persistence.server_version()) == (5, 0, 14)
+    assert asyncio.run(persistence.server_version()) < persistence.MIN_MONGODB_VERSION
+    assert BuildInfo.calls == 1
@@ -0,0 +1,244 @@
+import asyncio
+import time
+from datetime import timedelta
+import httpx
+import numpy as np
+import pytest
+from app.api.route_engine.graph import RoadGraph
+from app.api.route_engine.search import route_through
+from app.api.route_engine.traffic import EdgeTraffic, tile_bbox, tiles_covering
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.collectors import TrafficDataCollector
+from app.services.prefetch import PrefetchScheduler
+
+SIZE = 4
+STEP = 0.005
+
+def make_grid_graph() -> RoadGraph:
+    """Bidirectional grid where every edge takes 60 seconds at free flow."""
+    rows, cols = np.divmod(np.arange(SIZE * SIZE), SIZE)
+    lat = 40.70 + rows * STEP
+    lon = -74.00 + cols * STEP
+    sources, targets = [], []
+    for node in range(SIZE * SIZE):
+        r, c = divmod(node, SIZE)
+        if c + 1 < SIZE:
+            sources += [node, node + 1]
+            targets += [node + 1, node]
+        if r + 1 < SIZE:
+            sources += [node, node + SIZE]
+            targets += [node + SIZE, node]
+    sources, targets = np.array(sources), np.array(targets)
+    distances = np.full(len(sources), 500.0)
+    return RoadGraph.from_edges(lat, lon, sources, targets, distances, distances / 500.0 * 60.0)
+
+def point(graph: RoadGraph, node: int, offset: float = 0.0):
+    return {"latitude": float(graph.lat[node]) + offset, "longitude": float(graph.lon[node])}
+
+def make_tile(graph: RoadGraph):
+    """Bottom row eastbound at a quarter of free flow, one westbound edge at half."""
+    return {
+        "segments": [
+            {
+                "currentSpeed": 10,
+                "freeFlowSpeed": 40,
+                # Points a few meters off the nodes still snap to them
+                "coordinates": [point(graph, 0, 0.00002), point(graph, 1), point(graph, 2), point(graph, 3)]
+            },
+            {"currentSpeed": 20, "freeFlowSpeed": 40, "coordinates": [point(graph, 2), point(graph, 1)]},
+            # Far from the network: ignored
+            {"currentSpeed": 5, "freeFlowSpeed": 40, "coordinates": [{"latitude": 41.5, "longitude": -73.0}] * 2},
+            # No free-flow speed: ignored
+            {"currentSpeed": 5, "freeFlowSpeed": 0, "coordinates": [point(graph, 4), point(graph, 5)]}
+        ]
+    }
+
+def edge(graph: RoadGraph, u: int, v: int) -> int:
+    return int(np.flatnonzero((graph.sources == u) & (graph.targets == v))[0])
+
+def test_tiles_covering_matches_tile_bbox():
+    """Test the tiles covering a box contain it and each tile's bbox overlaps it."""
+    south, west, north, east = 40.70, -74.02, 40.76, -73.95
+    tiles = tiles_covering(south, west, north, east, 12)
+    assert tiles and all(z == 12 for z, _, _ in tiles)
+    boxes = [tile_bbox(*tile) for tile in tiles]
+    assert min(b[0] for b in boxes) <= south and max(b[2] for b in boxes) >= north
+    assert min(b[1] for b in boxes) <= west and max(b[3] for b in boxes) >= east
+    for s, w, n, e in boxes:
+        assert s < north and n > south and w < east and e > west
+
+def test_ingest_tile_updates_matched_edges():
+    """Test flow segments map onto the graph edges they follow, in their direction."""
+    graph = make_grid_graph()
+    traffic = EdgeTraffic(graph, max_age_seconds=600)
+    assert not traffic.has_live_data(now=1000.0)
+
+    assert traffic.ingest_tile(make_tile(graph), now=1000.0) == 4
+    for u, v in ((0, 1), (1, 2), (2, 3)):
+        assert traffic.speed_ratio[edge(graph, u, v)] == pytest.approx(0.25)
+    assert traffic.speed_ratio[edge(graph, 2, 1)] == pytest.approx(0.5)
+    assert traffic.speed_ratio[edge(graph, 1, 0)] == 1.0
+    assert traffic.speed_ratio[edge(graph, 4, 5)] == 1.0
+    assert traffic.has_live_data(now=1000.0)
+
+    congestion = traffic.congestion(now=1000.0)
+    assert congestion[edge(graph, 0, 1)] == pytest.approx(0.75)
+    assert np.count_nonzero(congestion) == 4
+
+def test_live_durations_expire():
+    """Test observed speeds scale durations until the readings go stale."""
+    graph = make_grid_graph()
+    traffic = EdgeTraffic(graph, max_age_seconds=600)
+    traffic.ingest_tile(make_tile(graph), now=1000.0)
+
+    durations = traffic.live_durations(now=1200.0)
+    assert durations[edge(graph, 0, 1)] == pytest.approx(240.0)
+    assert durations[edge(graph, 4, 5)] == pytest.approx(60.0)
+
+    assert np.allclose(traffic.live_durations(now=1601.0), graph.durations)
+    assert not traffic.has_live_data(now=1601.0)
+
+def test_live_durations_reroute():
+    """Test a congested row makes routing take the parallel one."""
+    graph = make_grid_graph()
+    start, end = (float(graph.lat[0]), float(graph.lon[0])), (float(graph.lat[3]), float(graph.lon[3]))
+    assert route_through(graph, [start, end]).nodes == [0, 1, 2, 3]
+
+    traffic = EdgeTraffic(graph)
+    traffic.ingest_tile(make_tile(graph))
+    path = route_through(graph, [start, end], weight=traffic.live_durations())
+    assert not {edge(graph, 0, 1), edge(graph, 1, 2), edge(graph, 2, 3)} & set(path.edges)
+
+class TileCache:
+    """get_or_refresh of CacheManager, counting provider loads per key."""
+
+    def __init__(self):
+        self.ttls = {
+            "weather": timedelta(minutes=30),
+            "traffic": timedelta(minutes=5),
+            "air_quality": timedelta(minutes=15)
+        }
+        self.values = {}
+        self.loads = 0
+
+    async def get_or_refresh(self, key, data_type, loader, cell_indexes=()):
+        if key not in self.values:
+            self.loads += 1
+            self.values[key] = await loader()
+        return self.values[key]
+
+def test_prefetch_ingests_flow_tiles():
+    """Test the scheduler fetches each covering tile once through the cache and ingests it."""
+    graph = make_grid_graph()
+    tile = make_tile(graph)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        assert request.url.path == "/traffic/flow"
+        west, south, east, north = map(float, request.url.params["bbox"].split(","))
+        assert south < north and west < east
+        return httpx.Response(200, json=tile)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            collector = TrafficDataCollector(
+                base_url="http://traffic.test", client=client, circuit_breaker=CircuitBreaker("tomtom")
+            )
+            cache = TileCache()
+            traffic = EdgeTraffic(graph)
+            scheduler = PrefetchScheduler(
+                db=None, cache=cache, collectors={"traffic": collector}, edge_traffic=traffic, tile_zoom=14
+            )
+            await scheduler.refresh_traffic_tiles()
+            await scheduler.refresh_traffic_tiles()
+            return cache, traffic, scheduler.stats["traffic_tiles"]
+
+    cache, traffic, stats = asyncio.run(scenario())
+    tiles = tiles_covering(
+        float(graph.lat.min()), float(graph.lon.min()), float(graph.lat.max()), float(graph.lon.max()), 14
+    )
+    assert len(requests) == cache.loads == len(tiles)
+    assert stats["cycles"] == 2 and stats["tiles"] == 2 * len(tiles)
+    assert traffic.speed_ratio[edge(graph, 0, 1)] == pytest.approx(0.25)
+
+def test_cached_tiles_keep_their_fetch_time():
+    """Test a tile served again from the cache ages out from when it was fetched, not re-ingested."""
+    graph = make_grid_graph()
+
+    async def scenario():
+        cache = TileCache()
+        traffic = EdgeTraffic(graph, max_age_seconds=600)
+        scheduler = PrefetchScheduler(
+            db=None, cache=cache, collectors={"traffic": None}, edge_traffic=traffic, tile_zoom=14
+        )
+        for key in ("traffic_tile:{}/{}/{}".format(*tile) for tile in tiles_covering(
+            float(graph.lat.min()), float(graph.lon.min()), float(graph.lat.max()), float(graph.lon.max()), 14
+        )):
+            cache.values[key] = {**make_tile(graph), "fetched_at": time.time() - 700}
+        await scheduler.refresh_traffic_tiles()
+        return traffic
+
+    traffic = asyncio.run(scenario())
+    assert traffic.speed_ratio[edge(graph, 0, 1)] == pytest.approx(0.25)
+    assert not traffic.has_live_data()
+
+    # An older tile does not overwrite a newer reading
+    traffic.ingest_tile(make_tile(graph), now=time.time())
+    assert traffic.ingest_tile({"segments": [
+        {"currentSpeed": 40, "freeFlowSpeed": 40, "coordinates": [point(graph, 0), point(graph, 1)]}
+    ]}, now=time.time() - 60) == 0
+    assert traffic.speed_ratio[edge(graph, 0, 1)] == pytest.approx(0.25)
+
+def test_live_arrays_are_reused_until_they_change(monkeypatch):
+    """Test live durations are computed once per ingest and reading expiry, with their search bounds."""
+    graph = make_grid_graph()
+    traffic = EdgeTraffic(graph, max_age_seconds=600)
+    traffic.ingest_tile(make_tile(graph), now=1000.0)
+
+    durations = traffic.live_durations(now=1100.0)
+    assert not durations.flags.writeable
+    assert traffic.live_durations(now=1500.0) is durations
+    assert traffic.congestion(now=1500.0) is traffic.congestion(now=1100.0)
+
+    calls = []
+    original = graph.edge_weights
+    monkeypatch.setattr(graph, "edge_weights", lambda weight: calls.append(1) or original(weight))
+    assert graph.lower_bound_scale(durations) == graph.lower_bound_scale(durations)
+    assert graph.reverse_weights(durations) is graph.reverse_weights(durations)
+    assert len(calls) == 2
+
+    assert traffic.live_durations(now=1601.0) is not durations  # the readings aged out
+    traffic.ingest_tile(make_tile(graph), now=1700.0)
+    assert traffic.live_durations(now=1700.0)[edge(graph, 0, 1)] == pytest.approx(240.0)
+
+def test_fastest_path_keeps_the_hierarchy_route_within_tolerance(monkeypatch):
+    """Test the CH route is kept under light traffic and searched again on live speeds under heavy traffic."""
+    import app.api.route_engine as route_engine
+    from app.api.route_engine.contraction import build_contraction_hierarchy
+
+    graph = make_grid_graph()
+    hierarchy = build_contraction_hierarchy(graph, "duration")
+    monkeypatch.setattr(route_engine, "get_contraction_hierarchy", lambda: hierarchy)
+    monkeypatch.setattr(route_engine.settings, "LIVE_TRAFFIC_CH_TOLERANCE", 0.05)
+    searches = []
+    original = route_engine.route_through
+    monkeypatch.setattr(
+        route_engine, "route_through", lambda *args, **kwargs: searches.append(kwargs["weight"]) or original(*args, **kwargs)
+    )
+    start, end = (float(graph.lat[0]), float(graph.lon[0])), (float(graph.lat[3]), float(graph.lon[3]))
+
+    light = EdgeTraffic(graph)
+    light.ingest_tile({"segments": [
+        {"currentSpeed": 39, "freeFlowSpeed": 40, "coordinates": [point(graph, 0), point(graph, 1)]}
+    ]})
+    path = route_engine.fastest_path(graph, [start, end], light)
+    assert path.nodes == [0, 1, 2, 3] and searches == ["duration"]
+    assert path.cost == pytest.approx(60 * 40 / 39 + 120, rel=1e-5)
+
+    searches.clear()
+    heavy = EdgeTraffic(graph)
+    heavy.ingest_tile(make_tile(graph))
+    path = route_engine.fastest_path(graph, [start, end], heavy)
+    assert len(searches) == 2 and searches[1] is heavy.live_durations()
+    assert not {edge(graph, 0, 1), edge(graph, 1, 2), edge(graph, 2, 3)} & set(path.edges)